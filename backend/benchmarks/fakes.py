@@ -0,0 +1,298 @@
+"""
+In-process stand-ins for Microsoft Graph and the OpenAI API.
+
+Both are small Starlette apps that the benchmark mounts behind
+httpx.ASGITransport, so the real GraphClient and AsyncOpenAI code paths run
+without network access. Latency and error rates are configurable; errors
+are returned the way the real services throttle (429 with Retry-After).
+"""
+import asyncio
+import json
+import random
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+
+@dataclass
+class FakeServiceConfig:
+    latency_ms: float = 50.0
+    jitter: float = 0.3 # Latency varies uniformly by +/- this fraction
+    error_rate: float = 0.0 # Share of requests answered with 429
+    retry_after_seconds: float = 0.05
+
+    async def delay(self, rng: random.Random):
+        if self.latency_ms > 0:
+            factor = 1 + rng.uniform(-self.jitter, self.jitter)
+            await asyncio.sleep(self.latency_ms * factor / 1000)
+
+    def throttled(self, rng: random.Random) -> bool:
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+
+RFQ_BODIES = [
+    "Hi,\n\nPlease quote qty 5 CESS-{n:06d}-001 and qty 2 CESS-{n:06d}-002.\n\nThanks,\nBob",
+    "Hello team,\n\nCould you send pricing and lead time for 250 pcs of LM317T and 100 pcs SN74HC595N? "
+    "We also need some blue enclosures, around 40 units.\n\nBest regards,\nAlice",
+    "<html><body><p>Hi,</p><p>RFQ attached, plus:</p><table><tr><td>Part</td><td>Qty</td></tr>"
+    "<tr><td>CESS-{n:06d}-010</td><td>12</td></tr></table><p>Regards,<br>Procurement</p></body></html>",
+]
+OTHER_BODIES = [
+    "Our monthly newsletter is here! Read about the latest product launches. Unsubscribe at any time.",
+    "Hi all, reminder that the team meeting moved to 3pm tomorrow. Agenda to follow.",
+    "Your invoice INV-{n:05d} is available in the portal. No action required.",
+]
+
+
+def build_mailbox(size: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Deterministic Graph-shaped messages; roughly half are RFQs."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    messages = []
+    for n in range(size):
+        is_rfq = n % 2 == 0
+        template = rng.choice(RFQ_BODIES if is_rfq else OTHER_BODIES)
+        body = template.format(n=n)
+        received = (now - timedelta(minutes=17 * n)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        domain = rng.choice(["acme.com", "globex.co.uk", "initech.de", "gmail.com"])
+        messages.append({
+            "id": f"msg-{n:05d}",
+            "subject": f"RFQ {n}" if is_rfq else f"Update {n}",
+            "bodyPreview": re.sub(r"<[^>]+>", " ", body)[:255],
+            "body": {"contentType": "html" if body.startswith("<html") else "text", "content": body},
+            "from": {"emailAddress": {"name": f"Sender {n}", "address": f"sender{n}@{domain}"}},
+            "toRecipients": [{"emailAddress": {"name": "Sales", "address": "sales@example.com"}}],
+            "ccRecipients": [],
+            "receivedDateTime": received,
+            "sentDateTime": received,
+            "isRead": n % 3 == 0,
+            "isDraft": False,
+            "importance": "normal",
+            "hasAttachments": n % 10 == 0,
+            "conversationId": f"conv-{n // 3:05d}",
+            "webLink": f"https://outlook.example.com/msg-{n:05d}",
+        })
+    return messages
+
+
+ATTACHMENT_CSV = b"part,qty\nCESS-000001-001,5\nLM317T,20\n"
+
+
+class FakeGraph:
+    """The slice of Graph the API uses: messages, conversations, delta, attachments, $batch and /me."""
+
+    def __init__(self, config: FakeServiceConfig, mailbox_size: int = 200, seed: int = 7):
+        self.config = config
+        self.rng = random.Random(seed)
+        self.messages = build_mailbox(mailbox_size, seed)
+        self.by_id = {m["id"]: m for m in self.messages}
+        self.requests = 0
+        self.throttled = 0
+        self.app = Starlette(routes=[
+            Route("/v1.0/$batch", self.batch, methods=["POST"]),
+            Route("/v1.0/me", self.me),
+            Route("/v1.0/me/messages", self.conversation_messages),
+            Route("/v1.0/me/mailFolders/{folder}/messages/delta", self.delta),
+            Route("/v1.0/me/mailFolders/{folder}/messages", self.list_messages),
+            Route("/v1.0/me/messages/{message_id}", self.get_message),
+            Route("/v1.0/me/messages/{message_id}/attachments", self.list_attachments),
+            Route("/v1.0/me/messages/{message_id}/attachments/{attachment_id}/$value", self.attachment_value),
+        ])
+
+    def attachments(self, message: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if not message.get("hasAttachments"):
+            return []
+        return [{
+            "id": f"{message['id']}-att",
+            "name": "rfq.csv",
+            "contentType": "text/csv",
+            "size": len(ATTACHMENT_CSV),
+            "isInline": False,
+        }]
+
+    async def _gate(self) -> Optional[Response]:
+        """Latency for every call; a 429 for the configured share of them."""
+        self.requests += 1
+        await self.config.delay(self.rng)
+        if self.config.throttled(self.rng):
+            self.throttled += 1
+            return JSONResponse(
+                {"error": {"code": "TooManyRequests", "message": "Throttled"}},
+                status_code=429,
+                headers={"Retry-After": str(self.config.retry_after_seconds)}
+            )
+        return None
+
+    def _message_response(self, message_id: str) -> Dict[str, Any]:
+        message = self.by_id.get(message_id)
+        if message is None:
+            return {"status": 404, "body": {"error": {"code": "ErrorItemNotFound"}}}
+        return {"status": 200, "body": dict(message, attachments=self.attachments(message))}
+
+    async def me(self, request: Request):
+        return await self._gate() or JSONResponse({"displayName": "Benchmark User", "mail": "sales@example.com"})
+
+    async def list_messages(self, request: Request):
+        throttled = await self._gate()
+        if throttled:
+            return throttled
+        top = int(request.query_params.get("$top", 25))
+        skip = int(request.query_params.get("$skip", 0))
+        page = [dict(m, attachments=self.attachments(m)) for m in self.messages[skip:skip + top]]
+        select = request.query_params.get("$select")
+        if select:
+            keep = set(select.split(",")) | {"id"}
+            if "attachments" in request.query_params.get("$expand", ""):
+                keep.add("attachments")
+            page = [{k: v for k, v in m.items() if k in keep} for m in page]
+        result = {"value": page}
+        if skip + top < len(self.messages):
+            result["@odata.nextLink"] = str(request.url.include_query_params(**{"$skip": skip + top}))
+        return JSONResponse(result)
+
+    async def conversation_messages(self, request: Request):
+        """Only the `$filter=conversationId eq '...'` form thread analysis sends."""
+        throttled = await self._gate()
+        if throttled:
+            return throttled
+        match = re.fullmatch(r"conversationId eq '((?:[^']|'')*)'", request.query_params.get("$filter", ""))
+        if not match:
+            return JSONResponse({"error": {"code": "BadRequest"}}, status_code=400)
+        conversation_id = match.group(1).replace("''", "'")
+        top = int(request.query_params.get("$top", 10))
+        page = [m for m in self.messages if m["conversationId"] == conversation_id][:top]
+        select = request.query_params.get("$select")
+        if select:
+            keep = set(select.split(",")) | {"id"}
+            page = [{k: v for k, v in m.items() if k in keep} for m in page]
+        return JSONResponse({"value": page})
+
+    async def delta(self, request: Request):
+        throttled = await self._gate()
+        if throttled:
+            return throttled
+        delta_link = str(request.url.replace(query="$deltatoken=latest"))
+        if request.query_params.get("$deltatoken"):
+            # Nothing changes in the fake mailbox after the initial sync
+            return JSONResponse({"value": [], "@odata.deltaLink": delta_link})
+        return JSONResponse({"value": self.messages, "@odata.deltaLink": delta_link})
+
+    async def get_message(self, request: Request):
+        throttled = await self._gate()
+        if throttled:
+            return throttled
+        result = self._message_response(request.path_params["message_id"])
+        return JSONResponse(result["body"], status_code=result["status"])
+
+    async def list_attachments(self, request: Request):
+        throttled = await self._gate()
+        if throttled:
+            return throttled
+        message = self.by_id.get(request.path_params["message_id"])
+        if message is None:
+            return JSONResponse({"error": {"code": "ErrorItemNotFound"}}, status_code=404)
+        return JSONResponse({"value": self.attachments(message)})
+
+    async def attachment_value(self, request: Request):
+        throttled = await self._gate()
+        if throttled:
+            return throttled
+        return Response(ATTACHMENT_CSV, media_type="text/csv")
+
+    async def batch(self, request: Request):
+        throttled = await self._gate()
+        if throttled:
+            return throttled
+        payload = await request.json()
+        responses = []
+        for item in payload.get("requests", []):
+            path = item["url"].split("?")[0].rstrip("/")
+            match = re.match(r"^/?me/messages/([^/]+)(/attachments)?$", path)
+            if not match:
+                responses.append({"id": item["id"], "status": 400, "body": {"error": {"code": "BadRequest"}}})
+            elif match.group(2):
+                message = self.by_id.get(match.group(1))
+                body = {"value": self.attachments(message)} if message else {"error": {"code": "ErrorItemNotFound"}}
+                responses.append({"id": item["id"], "status": 200 if message else 404, "body": body})
+            elif item["method"] == "GET":
+                responses.append(dict(self._message_response(match.group(1)), id=item["id"]))
+            else:
+                responses.append({"id": item["id"], "status": 204, "body": None})
+        return JSONResponse({"responses": responses})
+
+
+class FakeOpenAI:
+    """`/v1/chat/completions` answering the intent and extraction prompts with plausible JSON."""
+
+    QUOTE_RE = re.compile(r"\b(?:quote|rfq|pricing|price|lead time)\b", re.IGNORECASE)
+    PART_RE = re.compile(r"\b(?:CESS-[\d-]+|[A-Z]{2,}\d+[A-Z0-9]*)\b")
+
+    def __init__(self, config: FakeServiceConfig, seed: int = 11):
+        self.config = config
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.throttled = 0
+        self.app = Starlette(routes=[Route("/v1/chat/completions", self.completions, methods=["POST"])])
+
+    def _answer(self, system: str, user: str) -> Dict[str, Any]:
+        if "product list of an ongoing" in system:
+            # Thread update: keep the current products, add parts named in the newest message
+            current = json.loads(user.split("Current Products (JSON): ", 1)[1].split("\n", 1)[0])
+            known = {product.get("partNumber") for product in current}
+            newest = user.split("Newest Message Body: ", 1)[-1]
+            added = [part for part in dict.fromkeys(self.PART_RE.findall(newest)) if part not in known]
+            return {
+                "opportunity_name": None,
+                "products": current + [{"quantity": 1, "partNumber": part, "partNumberType": "MPN"} for part in added]
+            }
+        if "extract" in system.lower():
+            parts = list(dict.fromkeys(self.PART_RE.findall(user)))[:10]
+            return {
+                "opportunity_name": f"Quote for {parts[0]}" if parts else "Quote request",
+                "products": [
+                    {"quantity": 1, "partNumber": part, "partNumberType": "CESS" if part.startswith("CESS") else "MPN"}
+                    for part in parts
+                ]
+            }
+        is_request = bool(self.QUOTE_RE.search(user))
+        return {
+            "is_customer_request": is_request,
+            "confidence": 0.92 if is_request else 0.88,
+            "reasoning": "Asks for a quote." if is_request else "No product request."
+        }
+
+    async def completions(self, request: Request):
+        self.requests += 1
+        payload = await request.json()
+        await self.config.delay(self.rng)
+        if self.config.throttled(self.rng):
+            self.throttled += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                status_code=429,
+                headers={"retry-after-ms": str(int(self.config.retry_after_seconds * 1000))}
+            )
+        messages = payload.get("messages", [])
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = next((m["content"] for m in messages if m["role"] == "user"), "")
+        content = json.dumps(self._answer(system, user))
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+        completion_tokens = len(content) // 4
+        return JSONResponse({
+            "id": f"chatcmpl-{self.requests}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": payload.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
@@ -0,0 +1,318 @@
+"""
+Throughput benchmark for the FastAPI app against local Graph/OpenAI fakes.
+
+Drives the real app in-process (httpx.ASGITransport) through the main
+endpoints at increasing concurrency and reports throughput, latency
+percentiles and memory. Nothing touches the network.
+
+    cd backend
+    python -m benchmarks.run --concurrency 1,8,32 --requests 200
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --max-regression 0.2
+
+With --baseline the run exits with status 1 when any scenario's p95 or
+throughput is worse than the baseline by more than --max-regression.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+SESSION_ID = "benchmark-session"
+SCENARIOS = ["list", "detail", "analyze", "crm"]
+
+
+def configure_environment(args: argparse.Namespace, data_dir: str):
+    """Settings are read at import time, so this runs before anything from src is imported."""
+    for key, value in {
+        "MS_CLIENT_ID": "benchmark",
+        "MS_TENANT_ID": "common",
+        "MS_CLIENT_SECRET": "benchmark",
+        "MS_REDIRECT_URI": "http://localhost:8000/auth/callback",
+        "OPENAI_API_KEY": "sk-benchmark",
+    }.items():
+        os.environ.setdefault(key, value)
+    os.environ.update({
+        "SESSION_STORE_PATH": os.path.join(data_dir, "sessions.sqlite3"),
+        "LLM_CACHE_PATH": os.path.join(data_dir, "llm_cache.sqlite3"),
+        "MAIL_STORE_PATH": os.path.join(data_dir, "mail_store.sqlite3"),
+        "NOTIFICATION_STORE_PATH": os.path.join(data_dir, "subscriptions.sqlite3"),
+        "OPPORTUNITY_STORE_PATH": os.path.join(data_dir, "opportunities.sqlite3"),
+        "THREAD_STATE_PATH": os.path.join(data_dir, "threads.sqlite3"),
+        "CLASSIFIER_MODEL_PATH": os.path.join(data_dir, "intent_classifier.json"),
+        "CLASSIFIER_LABEL_STORE_PATH": os.path.join(data_dir, "intent_labels.sqlite3"),
+        "LEGACY_TOKEN_FILE": os.path.join(data_dir, "tokens.json"),
+        "NOTIFICATION_URL": "",
+        "TRACING_EXPORT_PATH": "",
+        "LLM_CACHE_ENABLED": "true" if args.llm_cache else "false",
+        "THREAD_ANALYSIS_ENABLED": "true" if args.thread_analysis else "false",
+        "MAIL_SYNC_ENABLED": "false" if args.no_sync else "true",
+    })
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def rss_mb() -> float:
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Benchmark:
+    def __init__(self, args: argparse.Namespace):
+        import httpx
+        from openai import AsyncOpenAI
+        from src.main import app
+        from src.services.email.graph_client import graph_client
+        from src.services.email.service import email_service
+        from src.services.llm.clients.openai_client import openai_client
+        from src.core.config import settings
+        from benchmarks.fakes import FakeGraph, FakeOpenAI, FakeServiceConfig
+
+        self.args = args
+        self.app = app
+        self.fake_graph = FakeGraph(
+            FakeServiceConfig(args.graph_latency_ms, args.jitter, args.graph_error_rate),
+            mailbox_size=args.mailbox_size
+        )
+        self.fake_openai = FakeOpenAI(FakeServiceConfig(args.llm_latency_ms, args.jitter, args.llm_error_rate))
+
+        # Point the real clients at the fakes; everything above the transport is unchanged
+        graph_client._transport = httpx.ASGITransport(app=self.fake_graph.app)
+        openai_client._async_client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url="http://fake-openai/v1",
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=self.fake_openai.app))
+        )
+        email_service.sessions.set(SESSION_ID, {
+            "access_token": "benchmark-token",
+            "refresh_token": "benchmark-refresh",
+            "expires_at": time.time() + 24 * 3600
+        })
+
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://benchmark",
+            headers={"X-Session-Id": SESSION_ID},
+            timeout=120
+        )
+        self.message_ids = [m["id"] for m in self.fake_graph.messages]
+
+    def request_for(self, scenario: str, n: int):
+        email_id = self.message_ids[n % len(self.message_ids)]
+        if scenario == "list":
+            return self.client.get("/emails", params={"limit": 25, "skip": (n * 25) % max(len(self.message_ids), 1)})
+        if scenario == "detail":
+            return self.client.get(f"/emails/{email_id}")
+        if scenario == "analyze":
+            return self.client.post(f"/emails/{email_id}/analyze")
+        if scenario == "crm":
+            return self.client.post("/crm/opportunity", json={
+                "opportunityName": f"Quote {n}",
+                "accountName": "Acme",
+                "keyContact": "Bob",
+                "products": [{"partNumber": f"CESS-{n:06d}-001", "quantity": 5}]
+            })
+        raise ValueError(f"Unknown scenario {scenario}")
+
+    async def run_level(self, scenario: str, concurrency: int, total: int) -> Dict[str, Any]:
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+        counter = iter(range(total))
+
+        async def worker():
+            for n in counter:
+                started = time.perf_counter()
+                try:
+                    response = await self.request_for(scenario, n)
+                    status = str(response.status_code)
+                except Exception as e:
+                    status = type(e).__name__
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        if scenario == "analyze" and self.args.thread_analysis:
+            # Repeat analyses would otherwise be answered from the stored thread state
+            from src.services.analysis.threads import thread_store
+            thread_store.clear(SESSION_ID)
+        gc.collect()
+        graph_before, llm_before = self.fake_graph.requests, self.fake_openai.requests
+        if self.args.tracemalloc:
+            tracemalloc.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        peak_traced = None
+        if self.args.tracemalloc:
+            peak_traced = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+
+        latencies.sort()
+        errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+        return {
+            "scenario": scenario,
+            "concurrency": concurrency,
+            "requests": len(latencies),
+            "errors": errors,
+            "statuses": statuses,
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+            "rss_mb": round(rss_mb(), 1),
+            "traced_peak_mb": round(peak_traced, 1) if peak_traced is not None else None,
+            "graph_calls": self.fake_graph.requests - graph_before,
+            "llm_calls": self.fake_openai.requests - llm_before,
+        }
+
+    async def run(self) -> List[Dict[str, Any]]:
+        results = []
+        async with self.app.router.lifespan_context(self.app):
+            for scenario in self.args.scenarios:
+                # Warm-up: initial mail sync, pools, SQLite files, imports
+                await self.run_level(scenario, 1, self.args.warmup)
+                for concurrency in self.args.concurrency:
+                    result = await self.run_level(scenario, concurrency, self.args.requests)
+                    results.append(result)
+                    print_row(result)
+            await self.client.aclose()
+        return results
+
+
+HEADER = f"{'scenario':<9} {'conc':>5} {'reqs':>6} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>8}"
+
+
+def print_row(result: Dict[str, Any]):
+    print(
+        f"{result['scenario']:<9} {result['concurrency']:>5} {result['requests']:>6} {result['errors']:>5} "
+        f"{result['throughput_rps']:>9.1f} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+        f"{result['p99_ms']:>9.1f} {result['rss_mb']:>8.1f}",
+        flush=True
+    )
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Regressions against a previous --output file, as human readable lines."""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+        label = f"{result['scenario']} @ {result['concurrency']}"
+        if before["p95_ms"] and result["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{label}: p95 {before['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+        if before["throughput_rps"] and result["throughput_rps"] < before["throughput_rps"] * (1 - max_regression):
+            regressions.append(
+                f"{label}: throughput {before['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} rps"
+            )
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    int_list = lambda value: [int(v) for v in value.split(",") if v]
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=SCENARIOS,
+                        help=f"Comma separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 4, 16, 64],
+                        help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and level")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests before each scenario")
+    parser.add_argument("--mailbox-size", type=int, default=200)
+    parser.add_argument("--graph-latency-ms", type=float, default=40.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--jitter", type=float, default=0.3, help="Latency varies by +/- this fraction")
+    parser.add_argument("--graph-error-rate", type=float, default=0.0, help="Share of Graph calls answered with 429")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of OpenAI calls answered with 429")
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the LLM response cache enabled")
+    parser.add_argument("--thread-analysis", action="store_true",
+                        help="Analyze messages as part of their conversation (state is reset before each level)")
+    parser.add_argument("--no-sync", action="store_true", help="List mail from Graph instead of the synced store")
+    parser.add_argument("--tracemalloc", action="store_true", help="Report peak Python allocations (slower)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --output file")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed relative p95/throughput regression against --baseline")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="quotable-bench-") as data_dir:
+        configure_environment(args, data_dir)
+        benchmark = Benchmark(args)
+        print(HEADER)
+        results = asyncio.run(benchmark.run())
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline (only matching scenario/concurrency pairs are compared).")
+    return 0
+
+
+if __name__ == "__main__":
+    # Attachment extraction spawns worker processes that re-import this module
+    sys.exit(main())
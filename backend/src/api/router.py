@@ -1,9 +1,11 @@
 from fastapi import APIRouter
-from src.api.v1 import auth_routes, email_routes, crm_routes
+from src.api.v1 import auth_routes, email_routes, crm_routes, notification_routes, metrics_routes, catalog_routes
 
 api_router = APIRouter()
 
 api_router.include_router(auth_routes.router)
 api_router.include_router(email_routes.router)
 api_router.include_router(crm_routes.router)
-
+api_router.include_router(catalog_routes.router)
+api_router.include_router(notification_routes.router)
+api_router.include_router(metrics_routes.router)
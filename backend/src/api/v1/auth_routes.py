@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Header, HTTPException, Body
 from src.services.email.service import email_service
+from src.services.notifications.service import notification_service
 from src.schemas.email import AuthUrlResponse, AuthCallbackRequest, AuthStatusResponse
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -13,21 +14,21 @@ def initiate_auth():
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/callback", response_model=AuthStatusResponse)
-def auth_callback(request: AuthCallbackRequest):
+async def auth_callback(request: AuthCallbackRequest):
     """Complete the auth code authentication flow."""
     try:
-        return email_service.complete_auth(request.code, request.session_id)
+        return await email_service.complete_auth(request.code, request.session_id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/status", response_model=AuthStatusResponse)
-def auth_status(x_session_id: str = Header(..., alias="X-Session-Id")):
+async def auth_status(x_session_id: str = Header(..., alias="X-Session-Id")):
     """Check current authentication status."""
     try:
         # Just try to get user profile to verify token
-        user = email_service.get_user_profile(x_session_id)
+        user = await email_service.get_user_profile(x_session_id)
         return {
             "is_authenticated": True,
             "user_email": user.get("mail") or user.get("userPrincipalName"),
@@ -45,6 +46,12 @@ def auth_status(x_session_id: str = Header(..., alias="X-Session-Id")):
         }
 
 @router.post("/logout")
-def logout(x_session_id: str = Header(..., alias="X-Session-Id")):
+async def logout(x_session_id: str = Header(..., alias="X-Session-Id")):
+    try:
+        # Needs the session's token, so runs before the session is removed
+        await notification_service.subscriptions.unsubscribe(x_session_id)
+    except Exception:
+        pass
+    notification_service.forget_session(x_session_id)
     email_service.logout(x_session_id)
     return {"message": "Logged out successfully"}
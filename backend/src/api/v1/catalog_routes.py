@@ -0,0 +1,53 @@
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from src.schemas.products import CatalogMatch, Product
+from src.services.catalog.service import catalog_service
+
+router = APIRouter(prefix="/catalog", tags=["Catalog"])
+
+def require_catalog():
+    if not catalog_service.path:
+        raise HTTPException(status_code=404, detail="No product catalog configured (CATALOG_PATH)")
+    if not catalog_service.loaded:
+        raise HTTPException(status_code=503, detail="Product catalog is still loading")
+
+@router.get("/lookup", response_model=List[CatalogMatch])
+def lookup_part_number(
+    part_number: str = Query(..., min_length=1),
+    part_number_type: Optional[str] = Query(None, pattern="^(CESS|MPN)$"),
+    limit: Optional[int] = Query(None, ge=1, le=100)
+):
+    """Exact, prefix (partial numbers) or fuzzy (typos) matches for one part number."""
+    require_catalog()
+    return catalog_service.lookup(part_number, part_number_type, limit)
+
+@router.get("/search", response_model=List[CatalogMatch])
+def search_descriptions(
+    q: str = Query(..., min_length=1, description="Product name or description"),
+    limit: Optional[int] = Query(None, ge=1, le=100)
+):
+    """Catalog entries whose name and description resemble free text (for products without a part number)."""
+    require_catalog()
+    if catalog_service.matcher is None:
+        raise HTTPException(status_code=501, detail="Description matching is disabled (CATALOG_MATCHER_ENABLED) or numpy/scipy are not installed")
+    if not catalog_service.matcher.ready:
+        raise HTTPException(status_code=503, detail="Catalog description index is still building")
+    return catalog_service.search([q], limit)[0]
+
+@router.post("/resolve", response_model=List[Product])
+def resolve_products(products: List[Product]):
+    """Fills in `catalogMatches` for extracted products."""
+    require_catalog()
+    return catalog_service.resolve_products([product.model_dump(by_alias=True) for product in products])
+
+@router.get("/stats")
+def get_catalog_stats():
+    return catalog_service.stats()
+
+@router.post("/refresh")
+async def refresh_catalog():
+    """Applies catalog changes now instead of at the next CATALOG_REFRESH_INTERVAL_SECONDS."""
+    if not catalog_service.path:
+        raise HTTPException(status_code=404, detail="No product catalog configured (CATALOG_PATH)")
+    return await asyncio.to_thread(catalog_service.refresh)
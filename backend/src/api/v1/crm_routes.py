@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from datetime import datetime
+from fastapi import APIRouter, Header, HTTPException, Query
+from pydantic import BaseModel, Field
 from typing import Dict, Any, List, Optional
+from src.core.config import settings
 from src.services.crm.service import crm_service
+from src.services.email.pagination import InvalidCursor
 
 router = APIRouter(prefix="/crm", tags=["crm"])
 
@@ -10,21 +13,130 @@ class OpportunityCreate(BaseModel):
     accountName: Optional[str] = None
     keyContact: Optional[str] = None
     products: Optional[List[Dict[str, Any]]] = None
+    # Source email; re-submitting the same message returns its existing opportunity
+    sourceMessageId: Optional[str] = None
+    conversationId: Optional[str] = None
     # Add other fields as needed
 
-@router.post("/opportunity")
-async def create_opportunity(opportunity: OpportunityCreate):
+class OpportunityBulkItem(OpportunityCreate):
+    idempotencyKey: Optional[str] = None
+
+class OpportunityBulkCreate(BaseModel):
+    opportunities: List[OpportunityBulkItem] = Field(..., min_length=1, max_length=settings.OPPORTUNITY_BULK_MAX_ITEMS)
+
+class OpportunityCreateResult(BaseModel):
+    oid: str
+    status: str # "created" or "existing"
+    message: str
+
+class OpportunityBulkResponse(BaseModel):
+    results: List[OpportunityCreateResult]
+    created: int
+    existing: int
+
+class OpportunityListResponse(BaseModel):
+    opportunities: List[Dict[str, Any]]
+    count: int
+    next_cursor: Optional[str] = None
+
+class AccountAlias(BaseModel):
+    accountName: str = Field(..., min_length=1)
+
+class AccountResolution(BaseModel):
+    domain: str
+    registrable_domain: Optional[str] = None
+    account_name: Optional[str] = None
+    source: str # "alias", "domain", "free_mail" or "unknown"
+
+@router.post("/opportunity", response_model=OpportunityCreateResult)
+def create_opportunity(
+    opportunity: OpportunityCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Creates an opportunity in the CRM. With an Idempotency-Key header (or a
+    sourceMessageId), repeating the request returns the opportunity created first.
+    """
+    try:
+        return crm_service.create_opportunity(opportunity.model_dump(), idempotency_key)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/opportunities/bulk", response_model=OpportunityBulkResponse)
+def create_opportunities(request: OpportunityBulkCreate):
     """
-    Creates an opportunity in the CRM.
+    Creates many opportunities in one transaction. Items whose idempotencyKey
+    (or sourceMessageId) was seen before return the existing opportunity.
     """
     try:
-        result = crm_service.create_opportunity(opportunity.dict())
-        return result
+        results = crm_service.create_opportunities([
+            (item.model_dump(exclude={"idempotencyKey"}), item.idempotencyKey)
+            for item in request.opportunities
+        ])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    created = sum(1 for result in results if result["status"] == "created")
+    return {"results": results, "created": created, "existing": len(results) - created}
+
+@router.get("/opportunities", response_model=OpportunityListResponse)
+def list_opportunities(
+    account_name: Optional[str] = Query(None, description="Exact match, case-insensitive"),
+    key_contact: Optional[str] = Query(None, description="Exact match, case-insensitive"),
+    created_from: Optional[datetime] = Query(None, description="ISO 8601; naive times are UTC"),
+    created_before: Optional[datetime] = Query(None, description="ISO 8601; naive times are UTC"),
+    source_message_id: Optional[str] = Query(None),
+    conversation_id: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=settings.OPPORTUNITY_LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page; the filters are then taken from it")
+):
+    """
+    Lists opportunities newest first.
+    """
+    try:
+        return crm_service.list_opportunities(
+            limit=limit,
+            cursor=cursor,
+            account_name=account_name,
+            key_contact=key_contact,
+            created_from=created_from,
+            created_before=created_before,
+            source_message_id=source_message_id,
+            conversation_id=conversation_id
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/accounts/resolve", response_model=AccountResolution)
+def resolve_account(domain: str = Query(..., min_length=1, description="Sender domain or email address")):
+    """
+    The account a sender domain maps to, and why.
+    """
+    return crm_service.account_resolver.resolve(domain.rsplit("@", 1)[-1])
+
+@router.get("/accounts/aliases", response_model=Dict[str, str])
+def list_account_aliases():
+    return crm_service.account_resolver.aliases()
+
+@router.put("/accounts/aliases/{domain}")
+def set_account_alias(domain: str, alias: AccountAlias):
+    """
+    Maps a domain (and its subdomains without an alias of their own) to an account name.
+    """
+    crm_service.account_resolver.set_alias(domain, alias.accountName)
+    return {"domain": domain, "accountName": alias.accountName}
+
+@router.delete("/accounts/aliases/{domain}")
+def delete_account_alias(domain: str):
+    if not crm_service.account_resolver.delete_alias(domain):
+        raise HTTPException(status_code=404, detail="Alias not found")
+    return {"domain": domain, "deleted": True}
+
+@router.get("/accounts/stats")
+def get_account_resolver_stats():
+    return crm_service.account_resolver.stats()
 
 @router.get("/opportunity/{oid}")
-async def get_opportunity(oid: str):
+def get_opportunity(oid: str):
     """
     Retrieves an opportunity from the CRM.
     """
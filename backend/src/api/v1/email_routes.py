@@ -1,42 +1,64 @@
-from typing import List, Optional, Literal
+import asyncio
+import json
+from typing import List, Optional, Literal, Union
 from fastapi import APIRouter, Header, HTTPException, Query, Path, Body
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from src.core.config import settings
 from src.services.email.service import email_service
-from src.services.llm.service import llm_service
-from src.services.crm.service import crm_service
+from src.services.email.attachments import RangeNotSatisfiable
+from src.services.email.pagination import InvalidCursor
+from src.services.email.fields import parse_fields
+from src.services.analysis.service import analysis_service
+from src.services.llm.classifier import TrainingInProgress, intent_classifier
 from src.schemas.email import (
-    EmailListResponse, EmailResponse, SendEmailRequest, SimpleSendEmailRequest, 
+    EmailListResponse, EmailListProjectionResponse, EmailResponse, SendEmailRequest, SimpleSendEmailRequest, 
     ReplyEmailRequest, ForwardEmailRequest, MarkReadRequest, Attachment,
-    EmailAnalysisResponse
+    EmailAnalysisResponse, BatchAnalysisRequest, BatchAnalysisItem, BatchAnalysisResponse,
+    BulkEmailIdsRequest, BulkMarkReadRequest, BulkFetchRequest, BulkFetchResponse, BulkOperationResponse
 )
 
 router = APIRouter(prefix="/emails", tags=["Emails"])
 
-def get_service_or_401(session_id: str):
+DateFilter = Literal["today", "yesterday", "this_week", "last_week", "this_month", "last_month", "last_7_days", "last_30_days"]
+
+async def get_service_or_401(session_id: str):
     try:
-        # Check if session exists/token valid
-        email_service.get_token(session_id)
+        # Check if session exists/token valid (refreshes it if close to expiry)
+        await email_service.get_token(session_id)
         return email_service
     except ValueError:
         raise HTTPException(status_code=401, detail="Session not found or not authenticated. Please authenticate first.")
 
-@router.get("", response_model=EmailListResponse)
-def get_emails(
+def parse_fields_or_400(fields: Optional[str]) -> Optional[List[str]]:
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("", response_model=Union[EmailListResponse, EmailListProjectionResponse])
+async def get_emails(
     x_session_id: str = Header(..., alias="X-Session-Id"),
-    limit: int = Query(25, ge=1, le=100),
+    limit: int = Query(25, ge=1, le=1000),
     skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from a previous page; other filters are then ignored"),
     folder: str = "inbox",
-    date_filter: Optional[Literal["today", "yesterday", "this_week", "last_week", "this_month", "last_month", "last_7_days", "last_30_days"]] = None,
+    date_filter: Optional[DateFilter] = None,
     unread_only: bool = False,
     has_attachments: Optional[bool] = None,
     importance: Optional[Literal["low", "normal", "high"]] = None,
     from_address: Optional[str] = None,
     search: Optional[str] = None,
     order_by: str = "receivedDateTime desc",
-    include_body: bool = True
+    include_body: bool = True,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated properties to return (e.g. 'default,attachments'); omit for full messages"
+    )
 ):
-    service = get_service_or_401(x_session_id)
+    projection = parse_fields_or_400(fields)
+    service = await get_service_or_401(x_session_id)
     try:
-        return service.get_emails(
+        result = await service.get_emails(
             session_id=x_session_id,
             folder=folder,
             limit=limit,
@@ -47,20 +69,85 @@ def get_emails(
             has_attachments=has_attachments,
             from_address=from_address,
             order_by=order_by,
-            include_body=include_body
+            include_body=include_body,
+            cursor=cursor,
+            fields=projection
         )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if "fields" not in result:
+        return result
+    # Projected items only carry what was asked for, so unset properties are left out entirely
+    response = EmailListProjectionResponse.model_validate(result)
+    return JSONResponse(response.model_dump(by_alias=True, exclude_unset=True, mode="json"))
+
+@router.get("/export")
+async def export_emails(
+    x_session_id: str = Header(..., alias="X-Session-Id"),
+    folder: str = "inbox",
+    date_filter: Optional[DateFilter] = None,
+    unread_only: bool = False,
+    has_attachments: Optional[bool] = None,
+    from_address: Optional[str] = None,
+    search: Optional[str] = None,
+    order_by: str = "receivedDateTime desc",
+    include_body: bool = False,
+    page_size: Optional[int] = Query(None, ge=1, le=1000),
+    fields: Optional[str] = None
+):
+    """
+    Streams every matching message in a folder as NDJSON (one message per line).
+    Later pages are fetched while earlier ones are sent. A failure after the
+    first page ends the stream with an `{"error": ...}` line.
+    """
+    projection = parse_fields_or_400(fields)
+    service = await get_service_or_401(x_session_id)
+    pages = service.export_emails(
+        session_id=x_session_id,
+        folder=folder,
+        search=search,
+        date_filter=date_filter,
+        unread_only=unread_only,
+        has_attachments=has_attachments,
+        from_address=from_address,
+        order_by=order_by,
+        include_body=include_body,
+        page_size=page_size,
+        fields=projection
+    )
+    # The first page is awaited here so setup errors still get a proper status code
+    try:
+        first_page = await pages.__anext__()
+    except StopAsyncIteration:
+        first_page = []
     except Exception as e:
+        await pages.aclose()
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def lines():
+        try:
+            for message in first_page:
+                yield json.dumps(message) + "\n"
+            async for page in pages:
+                yield "".join(json.dumps(message) + "\n" for message in page)
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            await pages.aclose()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @router.get("/today", response_model=EmailListResponse)
-def get_today_emails(
+async def get_today_emails(
     x_session_id: str = Header(..., alias="X-Session-Id"),
     limit: int = 50,
     folder: str = "inbox",
     unread_only: bool = False
 ):
-    service = get_service_or_401(x_session_id)
-    return service.get_emails(
+    service = await get_service_or_401(x_session_id)
+    return await service.get_emails(
         session_id=x_session_id,
         folder=folder,
         limit=limit,
@@ -69,14 +156,14 @@ def get_today_emails(
     )
 
 @router.get("/this-week", response_model=EmailListResponse)
-def get_this_week_emails(
+async def get_this_week_emails(
     x_session_id: str = Header(..., alias="X-Session-Id"),
     limit: int = 50,
     folder: str = "inbox",
     unread_only: bool = False
 ):
-    service = get_service_or_401(x_session_id)
-    return service.get_emails(
+    service = await get_service_or_401(x_session_id)
+    return await service.get_emails(
         session_id=x_session_id,
         folder=folder,
         limit=limit,
@@ -85,14 +172,14 @@ def get_this_week_emails(
     )
 
 @router.get("/recent", response_model=EmailListResponse)
-def get_recent_emails(
+async def get_recent_emails(
     x_session_id: str = Header(..., alias="X-Session-Id"),
     count: int = Query(10, alias="count"),
     folder: str = "inbox",
     include_body: bool = False
 ):
-    service = get_service_or_401(x_session_id)
-    return service.get_emails(
+    service = await get_service_or_401(x_session_id)
+    return await service.get_emails(
         session_id=x_session_id,
         folder=folder,
         limit=count,
@@ -101,13 +188,13 @@ def get_recent_emails(
     )
 
 @router.get("/unread", response_model=EmailListResponse)
-def get_unread_emails(
+async def get_unread_emails(
     x_session_id: str = Header(..., alias="X-Session-Id"),
     limit: int = 25,
     folder: str = "inbox"
 ):
-    service = get_service_or_401(x_session_id)
-    return service.get_emails(
+    service = await get_service_or_401(x_session_id)
+    return await service.get_emails(
         session_id=x_session_id,
         folder=folder,
         limit=limit,
@@ -115,14 +202,14 @@ def get_unread_emails(
     )
 
 @router.get("/sent", response_model=EmailListResponse)
-def get_sent_emails(
+async def get_sent_emails(
     x_session_id: str = Header(..., alias="X-Session-Id"),
     limit: int = 25,
     skip: int = 0,
     date_filter: Optional[str] = None
 ):
-    service = get_service_or_401(x_session_id)
-    return service.get_emails(
+    service = await get_service_or_401(x_session_id)
+    return await service.get_emails(
         session_id=x_session_id,
         folder="sentitems",
         limit=limit,
@@ -131,14 +218,14 @@ def get_sent_emails(
     )
 
 @router.get("/from/{sender_email}", response_model=EmailListResponse)
-def get_emails_from_sender(
+async def get_emails_from_sender(
     sender_email: str,
     x_session_id: str = Header(..., alias="X-Session-Id"),
     limit: int = 25,
     folder: str = "inbox"
 ):
-    service = get_service_or_401(x_session_id)
-    return service.get_emails(
+    service = await get_service_or_401(x_session_id)
+    return await service.get_emails(
         session_id=x_session_id,
         folder=folder,
         limit=limit,
@@ -146,14 +233,14 @@ def get_emails_from_sender(
     )
 
 @router.get("/important", response_model=EmailListResponse)
-def get_important_emails(
+async def get_important_emails(
     x_session_id: str = Header(..., alias="X-Session-Id"),
     limit: int = 25,
     folder: str = "inbox",
     unread_only: bool = False
 ):
-    service = get_service_or_401(x_session_id)
-    return service.get_emails(
+    service = await get_service_or_401(x_session_id)
+    return await service.get_emails(
         session_id=x_session_id,
         folder=folder,
         limit=limit,
@@ -161,14 +248,14 @@ def get_important_emails(
     )
 
 @router.get("/with-attachments", response_model=EmailListResponse)
-def get_emails_with_attachments(
+async def get_emails_with_attachments(
     x_session_id: str = Header(..., alias="X-Session-Id"),
     limit: int = 25,
     folder: str = "inbox",
     date_filter: Optional[str] = None
 ):
-    service = get_service_or_401(x_session_id)
-    return service.get_emails(
+    service = await get_service_or_401(x_session_id)
+    return await service.get_emails(
         session_id=x_session_id,
         folder=folder,
         limit=limit,
@@ -177,109 +264,273 @@ def get_emails_with_attachments(
     )
 
 @router.post("/send", status_code=201)
-def send_email(
+async def send_email(
     request: SendEmailRequest,
     x_session_id: str = Header(..., alias="X-Session-Id")
 ):
-    service = get_service_or_401(x_session_id)
+    service = await get_service_or_401(x_session_id)
     try:
-        service.send_email(x_session_id, request)
+        await service.send_email(x_session_id, request)
         return {"success": True, "message": "Email sent successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/drafts", response_model=EmailResponse, status_code=201)
-def create_draft(
+async def create_draft(
     request: SendEmailRequest,
     x_session_id: str = Header(..., alias="X-Session-Id")
 ):
-    service = get_service_or_401(x_session_id)
+    service = await get_service_or_401(x_session_id)
     try:
-        return service.create_draft(x_session_id, request)
+        return await service.create_draft(x_session_id, request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/send/simple", status_code=201)
-def send_simple_email(
+async def send_simple_email(
     request: SimpleSendEmailRequest,
     x_session_id: str = Header(..., alias="X-Session-Id")
 ):
-    service = get_service_or_401(x_session_id)
+    service = await get_service_or_401(x_session_id)
     try:
-        service.send_simple_email(x_session_id, request)
+        await service.send_simple_email(x_session_id, request)
         return {"success": True, "message": "Email sent successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _bulk_response(outcomes):
+    results = [dict(outcome, email_id=email_id) for email_id, outcome in outcomes.items()]
+    succeeded = sum(1 for r in results if r["success"])
+    return {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
+
+@router.post("/bulk/fetch", response_model=BulkFetchResponse)
+async def bulk_fetch_emails(
+    request: BulkFetchRequest,
+    x_session_id: str = Header(..., alias="X-Session-Id")
+):
+    """Fetches many emails by id using Graph JSON batching."""
+    service = await get_service_or_401(x_session_id)
+    try:
+        if request.include_attachments:
+            emails, attachments = await asyncio.gather(
+                service.get_emails_by_ids(x_session_id, request.email_ids),
+                service.get_email_attachments_bulk(x_session_id, request.email_ids)
+            )
+        else:
+            emails = await service.get_emails_by_ids(x_session_id, request.email_ids)
+            attachments = {}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    found = []
+    for email_id, email in emails.items():
+        if email:
+            if email_id in attachments:
+                email["attachments"] = attachments[email_id]
+            found.append(email)
+    missing = [email_id for email_id, email in emails.items() if not email]
+    return {"emails": found, "count": len(found), "missing": missing}
+
+@router.post("/bulk/read", response_model=BulkOperationResponse)
+async def bulk_mark_read(
+    request: BulkMarkReadRequest,
+    x_session_id: str = Header(..., alias="X-Session-Id")
+):
+    """Marks many emails as read/unread using Graph JSON batching."""
+    service = await get_service_or_401(x_session_id)
+    try:
+        outcomes = await service.mark_as_read_bulk(x_session_id, request.email_ids, request.is_read)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return _bulk_response(outcomes)
+
+@router.post("/bulk/delete", response_model=BulkOperationResponse)
+async def bulk_delete_emails(
+    request: BulkEmailIdsRequest,
+    x_session_id: str = Header(..., alias="X-Session-Id")
+):
+    """Deletes many emails using Graph JSON batching."""
+    service = await get_service_or_401(x_session_id)
+    try:
+        outcomes = await service.delete_emails_bulk(x_session_id, request.email_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return _bulk_response(outcomes)
+
+@router.get("/analyze/classifier")
+async def get_intent_classifier_stats(x_session_id: str = Header(..., alias="X-Session-Id")):
+    """Local intent pre-classifier status, holdout quality and LLM calls saved (this worker)."""
+    await get_service_or_401(x_session_id)
+    return await asyncio.to_thread(intent_classifier.stats)
+
+@router.post("/analyze/classifier/train")
+async def train_intent_classifier(x_session_id: str = Header(..., alias="X-Session-Id")):
+    """Retrain the local intent pre-classifier from stored LLM labels (operators only; see CLASSIFIER_TRAINING_ROUTE_ENABLED)."""
+    if not settings.CLASSIFIER_TRAINING_ROUTE_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    await get_service_or_401(x_session_id)
+    try:
+        return await intent_classifier.train()
+    except TrainingInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/analyze/threads/{conversation_id:path}")
+async def get_thread_analysis(
+    conversation_id: str,
+    x_session_id: str = Header(..., alias="X-Session-Id")
+):
+    """Stored analysis state of a conversation: its current products and the messages folded in."""
+    await get_service_or_401(x_session_id)
+    state = await asyncio.to_thread(analysis_service.thread_store.get, x_session_id, conversation_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="No analysis state for this conversation")
+    state.pop("line_hashes", None)
+    return state
+
+@router.delete("/analyze/threads/{conversation_id:path}")
+async def reset_thread_analysis(
+    conversation_id: str,
+    x_session_id: str = Header(..., alias="X-Session-Id")
+):
+    """Forgets a conversation's state; its next message is analyzed from scratch."""
+    await get_service_or_401(x_session_id)
+    if not await asyncio.to_thread(analysis_service.thread_store.delete, x_session_id, conversation_id):
+        raise HTTPException(status_code=404, detail="No analysis state for this conversation")
+    return {"conversation_id": conversation_id, "deleted": True}
+
+@router.post("/analyze/batch", response_model=BatchAnalysisResponse)
+async def analyze_emails_batch(
+    request: BatchAnalysisRequest,
+    x_session_id: str = Header(..., alias="X-Session-Id")
+):
+    """
+    Analyzes many emails concurrently.
+
+    With `stream=true` results are returned as NDJSON, one line per email,
+    in completion order. Otherwise a single aggregate response is returned.
+    """
+    await get_service_or_401(x_session_id)
+    results = analysis_service.analyze_batch(
+        x_session_id,
+        email_ids=request.email_ids,
+        filters=request.filter.model_dump() if request.filter else None,
+        concurrency=request.concurrency
+    )
+
+    if request.stream:
+        async def ndjson():
+            async for item in results:
+                yield BatchAnalysisItem.model_validate(item).model_dump_json(by_alias=True) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    try:
+        items = [item async for item in results]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "results": items,
+        "count": len(items),
+        "failed": sum(1 for item in items if item.get("error"))
+    }
+
 @router.get("/{email_id}", response_model=EmailResponse)
-def get_email_detail(
+async def get_email_detail(
     email_id: str,
     x_session_id: str = Header(..., alias="X-Session-Id")
 ):
-    service = get_service_or_401(x_session_id)
-    email = service.get_email(x_session_id, email_id)
+    service = await get_service_or_401(x_session_id)
+    email = await service.get_email(x_session_id, email_id)
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
     return email
 
 @router.get("/{email_id}/attachments", response_model=List[Attachment])
-def get_email_attachments(
+async def get_email_attachments(
     email_id: str,
     x_session_id: str = Header(..., alias="X-Session-Id")
 ):
-    service = get_service_or_401(x_session_id)
+    service = await get_service_or_401(x_session_id)
+    try:
+        return await service.get_email_attachments(x_session_id, email_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{email_id}/attachments/{attachment_id}/content")
+async def download_email_attachment(
+    email_id: str,
+    attachment_id: str,
+    x_session_id: str = Header(..., alias="X-Session-Id"),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    disposition: Literal["attachment", "inline"] = "attachment"
+):
+    """Stream an attachment's raw bytes from Graph, honouring single byte ranges."""
+    service = await get_service_or_401(x_session_id)
     try:
-        return service.get_email_attachments(x_session_id, email_id)
+        download = await service.open_attachment(x_session_id, email_id, attachment_id, range_header, disposition)
+    except RangeNotSatisfiable:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not download:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return StreamingResponse(
+        download["body"],
+        status_code=download["status_code"],
+        headers=download["headers"],
+        background=BackgroundTask(download["close"])
+    )
 
 @router.patch("/{email_id}/read")
-def mark_email_read(
+async def mark_email_read(
     email_id: str,
     request: MarkReadRequest,
     x_session_id: str = Header(..., alias="X-Session-Id")
 ):
-    service = get_service_or_401(x_session_id)
+    service = await get_service_or_401(x_session_id)
     try:
-        service.mark_as_read(x_session_id, email_id, request.is_read)
+        await service.mark_as_read(x_session_id, email_id, request.is_read)
         return {"success": True, "message": "Email marked as read"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{email_id}")
-def delete_email(
+async def delete_email(
     email_id: str,
     x_session_id: str = Header(..., alias="X-Session-Id")
 ):
-    service = get_service_or_401(x_session_id)
+    service = await get_service_or_401(x_session_id)
     try:
-        service.delete_email(x_session_id, email_id)
+        await service.delete_email(x_session_id, email_id)
         return {"success": True, "message": "Email deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{email_id}/reply")
-def reply_email(
+async def reply_email(
     email_id: str,
     request: ReplyEmailRequest,
     x_session_id: str = Header(..., alias="X-Session-Id")
 ):
-    service = get_service_or_401(x_session_id)
+    service = await get_service_or_401(x_session_id)
     try:
-        service.reply_email(x_session_id, email_id, request)
+        await service.reply_email(x_session_id, email_id, request)
         return {"success": True, "message": "Reply sent successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{email_id}/forward")
-def forward_email(
+async def forward_email(
     email_id: str,
     request: ForwardEmailRequest,
     x_session_id: str = Header(..., alias="X-Session-Id")
 ):
-    service = get_service_or_401(x_session_id)
+    service = await get_service_or_401(x_session_id)
     try:
-        service.forward_email(x_session_id, email_id, request)
+        await service.forward_email(x_session_id, email_id, request)
         return {"success": True, "message": "Email forwarded successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -290,43 +541,11 @@ async def analyze_email(
     x_session_id: str = Header(..., alias="X-Session-Id")
 ):
     # 1. Get the email content using EmailService
-    # Note: get_email is synchronous, but we're in an async function. 
-    # For this scale it's fine, but in high load scenarios this should be offloaded or made async.
-    email_service_instance = get_service_or_401(x_session_id)
-    email = email_service_instance.get_email(x_session_id, email_id)
+    email_service_instance = await get_service_or_401(x_session_id)
+    email = await email_service_instance.get_email(x_session_id, email_id, text_body=True)
     
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
-    
-    subject = email.get("subject", "")
-    
-    # Handle body content properly (Graph returns dict or str)
-    body_data = email.get("body", {})
-    if isinstance(body_data, dict):
-        body_content = body_data.get("content", "")
-    else:
-        body_content = str(body_data)
-    
-    # 2. Analyze intent using LLMService
-    intent = await llm_service.analyze_email_intent(subject, body_content)
-    
-    # 3. If it is a request, extract products immediately
-    products = []
-    opportunity_name = None
-    if intent.get("is_customer_request"):
-        product_data = await llm_service.extract_product_data(subject, body_content)
-        products = product_data.get("products", [])
-        opportunity_name = product_data.get("opportunity_name")
-
-    # 4. Deduce Account and Contact info
-    account_name, key_contact = crm_service.deduce_account_info(email.get("from"))
 
-    return {
-        "is_customer_request": intent.get("is_customer_request"),
-        "confidence": intent.get("confidence"),
-        "reasoning": intent.get("reasoning"),
-        "products": products,
-        "opportunity_name": opportunity_name,
-        "account_name": account_name,
-        "key_contact": key_contact
-    }
+    # 2. Intent, product extraction and account deduction
+    return await analysis_service.analyze_email(email, x_session_id)
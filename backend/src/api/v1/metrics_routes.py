@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from src.core.config import settings
+from src.core.metrics import metrics
+from src.services.llm.cache import llm_cache
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+@router.get("")
+def get_metrics(format: str = Query("json", pattern="^(json|prometheus)$")):
+    """
+    LLM call counters and latency/token histograms for this worker process.
+    `format=prometheus` returns the Prometheus text exposition format.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    if format == "prometheus":
+        return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+    return {"metrics": metrics.snapshot(), "llm_cache": llm_cache.stats()}
@@ -0,0 +1,69 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response
+from src.core.config import settings
+from src.services.email.service import email_service
+from src.services.notifications.service import notification_service, local_notifier
+from src.schemas.notifications import (
+    SubscriptionResponse, LocalNotificationRequest, NotificationAnalysesResponse
+)
+
+router = APIRouter(prefix="/notifications", tags=["Notifications"])
+
+async def require_session(session_id: str):
+    try:
+        await email_service.get_token(session_id)
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Session not found or not authenticated. Please authenticate first.")
+
+@router.post("", include_in_schema=False)
+async def receive_notifications(request: Request, validation_token: Optional[str] = Query(None, alias="validationToken")):
+    """
+    Graph webhook. Echoes the validation token when a subscription is created,
+    otherwise validates and enqueues the notifications and acknowledges with 202.
+    """
+    if validation_token is not None:
+        return PlainTextResponse(validation_token)
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid notification payload")
+    await notification_service.handle_notifications(payload)
+    return Response(status_code=202)
+
+@router.post("/subscription", response_model=SubscriptionResponse)
+async def subscribe(x_session_id: str = Header(..., alias="X-Session-Id")):
+    """Subscribe the session's inbox to new-mail notifications."""
+    await require_session(x_session_id)
+    try:
+        subscription = await notification_service.subscriptions.subscribe(x_session_id)
+        return {"subscription_id": subscription["subscription_id"], "expires_at": subscription["expires_at"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/subscription")
+async def unsubscribe(x_session_id: str = Header(..., alias="X-Session-Id")):
+    await require_session(x_session_id)
+    try:
+        removed = await notification_service.subscriptions.unsubscribe(x_session_id)
+        return {"removed": removed}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/analyses", response_model=NotificationAnalysesResponse)
+async def get_notification_analyses(x_session_id: str = Header(..., alias="X-Session-Id")):
+    """Analyses of newly arrived mail, most recent first."""
+    await require_session(x_session_id)
+    results = notification_service.recent_results(x_session_id)
+    return {"results": results, "count": len(results)}
+
+@router.post("/local", status_code=202)
+async def simulate_notifications(request: LocalNotificationRequest, x_session_id: str = Header(..., alias="X-Session-Id")):
+    """Feed `created` notifications for existing messages through the pipeline (dev/testing only)."""
+    if not settings.NOTIFICATION_LOCAL_NOTIFIER_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    await require_session(x_session_id)
+    enqueued = await local_notifier.notify_created(x_session_id, request.email_ids)
+    return {"enqueued": enqueued}
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class TieredCache:
+    """
+    Two-tier key/value cache: a bounded in-memory LRU in front of a local
+    SQLite table that survives restarts.
+
+    Values must be JSON serializable. Entries expire after `ttl_seconds` in
+    both tiers. Disk hits are promoted into the memory tier.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        max_entries: int = 1024,
+        ttl_seconds: float = 86400,
+        max_disk_entries: int = 100000,
+        table: str = "cache"
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.table = table
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes_since_prune = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --- Disk tier ---
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_expires ON {self.table}(expires_at)")
+            self._conn = conn
+        return self._conn
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return None
+            row = conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[1], json.loads(row[0])
+
+    def _disk_set(self, key: str, value: Any, expires_at: float):
+        payload = json.dumps(value)
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, payload, expires_at)
+            )
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= 500:
+                self._writes_since_prune = 0
+                self._prune(conn)
+
+    def _prune(self, conn: sqlite3.Connection):
+        conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),))
+        conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f"SELECT key FROM {self.table} ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+    # --- Memory tier ---
+
+    def _memory_get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return entry[1]
+
+    def _memory_set(self, key: str, value: Any, expires_at: float):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.evictions += 1
+
+    # --- Public API ---
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._memory_get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        entry = self._disk_get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.disk_hits += 1
+        self._memory_set(key, entry[1], entry[0])
+        return entry[1]
+
+    def set(self, key: str, value: Any):
+        expires_at = time.time() + self.ttl_seconds
+        self._memory_set(key, value, expires_at)
+        self._disk_set(key, value, expires_at)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        # Memory hits are served inline; only the SQLite lookup leaves the event loop
+        value = self._memory_get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any):
+        await asyncio.to_thread(self.set, key, value)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            conn = self._db()
+            if conn is not None:
+                conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+        }
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Tuple
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -11,10 +11,172 @@ class Settings(BaseSettings):
     # OpenAI
     OPENAI_API_KEY: str
     OPENAI_MODEL: str = "gpt-4o"
+    OPENAI_TIMEOUT_SECONDS: float = 60.0
+    OPENAI_MAX_RETRIES: int = 2
+    OPENAI_MAX_CONNECTIONS: int = 50
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_INTENT_TIMEOUT_SECONDS: float = 30.0
+    LLM_EXTRACTION_TIMEOUT_SECONDS: float = 60.0
+    # Token budgets for email content in prompts (bodies are normalized to text first)
+    LLM_INTENT_BODY_TOKEN_BUDGET: int = 1500
+    LLM_EXTRACTION_BODY_TOKEN_BUDGET: int = 4000
+    LLM_EXTRACTION_ATTACHMENT_TOKEN_BUDGET: int = 8000 # Shared by all attachments
+    # USD per 1M (prompt, completion) tokens, for the llm_cost_usd_total metric
+    OPENAI_PRICING: Dict[str, Tuple[float, float]] = {
+        "gpt-4o": (2.5, 10.0),
+        "gpt-4o-mini": (0.15, 0.6),
+    }
+    METRICS_ENABLED: bool = True # Exposes GET /metrics
+
+    # Request tracing (X-Request-Id, Server-Timing, JSONL span export)
+    TRACING_ENABLED: bool = True
+    TRACING_SERVER_TIMING: bool = True
+    TRACING_EXPORT_PATH: str = "data/traces.jsonl" # Empty disables export
+    TRACING_EXPORT_MIN_DURATION_MS: float = 0.0 # Only export requests at least this slow
+    TRACING_EXPORT_MAX_BYTES: int = 50 * 1024 * 1024 # Rotated to <path>.1 beyond this
+    TRACING_MAX_SPANS: int = 1000 # Per request
+
+    # Rule-based product extraction; the LLM is only called below this confidence
+    RULE_EXTRACTION_ENABLED: bool = True
+    RULE_EXTRACTION_MIN_CONFIDENCE: float = 0.9
+
+    # Product catalog for resolving extracted part numbers (CSV, JSON lines, or a SQLite
+    # catalog_products table standing in for the product DB); empty disables
+    CATALOG_PATH: str = ""
+    CATALOG_REFRESH_INTERVAL_SECONDS: float = 300.0
+    CATALOG_MAX_MATCHES: int = 5 # Per product
+    CATALOG_PREFIX_MIN_LENGTH: int = 4 # Shorter partial numbers only get exact/fuzzy lookups
+    CATALOG_COMPACT_TOMBSTONE_SHARE: float = 0.25 # An incrementally updated index is rebuilt once this share of it is deleted
+    CATALOG_FUZZY_MIN_SCORE: float = 0.6 # Trigram Dice similarity
+    CATALOG_FUZZY_MAX_EDITS: int = 1
+    CATALOG_FUZZY_MAX_CANDIDATES: int = 500 # Best-overlapping keys compared in full
+    CATALOG_FUZZY_MAX_SCAN: int = 200000 # Posting entries one fuzzy lookup may read; less selective queries get no fuzzy matches
+    # Name/description matching (char n-gram TF-IDF; needs numpy and scipy)
+    CATALOG_MATCHER_ENABLED: bool = True
+    CATALOG_MATRIX_DIR: str = "data/catalog_tfidf" # Memory-mapped by every worker
+    CATALOG_MATCHER_NGRAM_MIN: int = 3
+    CATALOG_MATCHER_NGRAM_MAX: int = 4
+    CATALOG_MATCHER_DIMENSIONS: int = 2 ** 20
+    CATALOG_MATCHER_MAX_DF: float = 0.1 # N-grams in more of the catalog than this get no weight
+    CATALOG_MATCHER_MIN_SCORE: float = 0.3 # Cosine similarity
+
+    # Local intent pre-classifier (skips the LLM for clear non-requests)
+    CLASSIFIER_ENABLED: bool = True
+    CLASSIFIER_MODEL_PATH: str = "data/intent_classifier.json"
+    CLASSIFIER_LABEL_STORE_PATH: str = "data/intent_labels.sqlite3" # LLM labels (email subjects and bodies) kept for training; empty disables collecting them
+    CLASSIFIER_LABEL_MAX_ENTRIES: int = 50000
+    CLASSIFIER_LABEL_MAX_AGE_DAYS: int = 90
+    CLASSIFIER_TRAINING_ROUTE_ENABLED: bool = False # Exposes POST /emails/analyze/classifier/train; the model is shared by every session
+    CLASSIFIER_TRAINING_TIMEOUT_SECONDS: float = 3600.0 # A training lease older than this is taken over
+    CLASSIFIER_SKIP_THRESHOLD: float = 0.97 # Min P(not a request) to skip the LLM
+    CLASSIFIER_MIN_PRECISION: float = 0.99 # Holdout skip precision required to activate a model
+    CLASSIFIER_MIN_LABEL_CONFIDENCE: float = 0.8 # LLM labels below this are not used for training
+    CLASSIFIER_MIN_TRAINING_EXAMPLES: int = 200
+    CLASSIFIER_HOLDOUT_FRACTION: float = 0.2
+    CLASSIFIER_HASH_DIMENSIONS: int = 2 ** 18
+    CLASSIFIER_MAX_BODY_CHARS: int = 4000
+    CLASSIFIER_EPOCHS: int = 8
+    CLASSIFIER_LEARNING_RATE: float = 0.5
+    CLASSIFIER_L2: float = 1e-6
+    CLASSIFIER_RELOAD_INTERVAL_SECONDS: float = 30.0
+
+    # LLM result cache (memory LRU + SQLite)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = "data/llm_cache.sqlite3"
+    LLM_CACHE_MAX_ENTRIES: int = 2048
+    LLM_CACHE_MAX_DISK_ENTRIES: int = 100000
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # Batch analysis
+    ANALYSIS_BATCH_CONCURRENCY: int = 8
+    ANALYSIS_BATCH_MAX_CONCURRENCY: int = 32
+
+    # Thread-aware analysis (replies update their conversation's product list)
+    THREAD_ANALYSIS_ENABLED: bool = True
+    THREAD_STATE_PATH: str = "data/threads.sqlite3"
+    THREAD_STATE_MAX_AGE_DAYS: int = 90
+    THREAD_STATE_MAX_MESSAGES: int = 200 # Message ids remembered per thread
+    THREAD_STATE_MAX_LINES: int = 5000 # Line hashes remembered per thread
+    THREAD_BOOTSTRAP_MAX_MESSAGES: int = 10 # Earlier messages folded in when a thread is first seen mid-way
+    LLM_THREAD_UPDATE_BODY_TOKEN_BUDGET: int = 2000
+    
+    # Session / token storage
+    SESSION_STORE_BACKEND: str = "sqlite" # "sqlite" (shared across workers) or "memory"
+    SESSION_STORE_PATH: str = "data/sessions.sqlite3"
+    SESSION_TTL_SECONDS: int = 30 * 24 * 3600
+    SESSION_CACHE_MAX_ENTRIES: int = 10000
+    SESSION_CACHE_TTL_SECONDS: float = 5.0
+    SESSION_PURGE_INTERVAL_SECONDS: float = 3600.0
+    LEGACY_TOKEN_FILE: str = "tokens.json" # Imported once into the session store if present
+    TOKEN_REFRESH_AHEAD_SECONDS: float = 300.0 # Refresh in the background this long before expiry
+    TOKEN_MIN_VALIDITY_SECONDS: float = 60.0 # Below this, callers wait for the refresh
     
     # Optional: Graph API Base URL if we want to config it
     GRAPH_API_BASE_URL: str = "https://graph.microsoft.com/v1.0"
 
+    # Graph HTTP transport (shared connection pool)
+    GRAPH_HTTP2: bool = True
+    GRAPH_MAX_CONNECTIONS: int = 100
+    GRAPH_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    GRAPH_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    GRAPH_TIMEOUT_SECONDS: float = 30.0
+    GRAPH_CONNECT_TIMEOUT_SECONDS: float = 5.0
+
+    # Graph JSON $batch
+    GRAPH_BATCH_CONCURRENCY: int = 4
+    GRAPH_BATCH_MAX_RETRIES: int = 3
+    GRAPH_BATCH_MAX_RETRY_DELAY_SECONDS: float = 30.0
+
+    # Attachment downloads are streamed from Graph in chunks of this size
+    ATTACHMENT_STREAM_CHUNK_BYTES: int = 64 * 1024
+
+    # Attachment text extraction for the product extraction prompt (process pool)
+    ATTACHMENT_EXTRACT_ENABLED: bool = True
+    ATTACHMENT_EXTRACT_WORKERS: int = 2
+    ATTACHMENT_EXTRACT_TIMEOUT_SECONDS: float = 30.0
+    ATTACHMENT_EXTRACT_MAX_BYTES: int = 25 * 1024 * 1024
+    ATTACHMENT_EXTRACT_MAX_FILES: int = 5
+    ATTACHMENT_EXTRACT_MAX_PAGES: int = 50 # PDF pages / spreadsheet sheets
+    ATTACHMENT_EXTRACT_MAX_ROWS: int = 2000 # Rows per sheet or table
+    ATTACHMENT_TEXT_MAX_CHARS: int = 20000 # Per attachment, as sent to the LLM
+    ATTACHMENT_TEXT_CACHE_MAX_ENTRIES: int = 256 # Stored alongside the LLM cache
+
+    # Incremental mail sync (Graph delta queries + local store)
+    MAIL_SYNC_ENABLED: bool = True
+    MAIL_STORE_PATH: str = "data/mail_store.sqlite3"
+    MAIL_SYNC_MIN_INTERVAL_SECONDS: float = 15.0
+    MAIL_SYNC_INITIAL_DAYS: int = 90
+    MAIL_SYNC_PAGE_SIZE: int = 200
+
+    # NDJSON folder export (GET /emails/export)
+    EMAIL_EXPORT_PAGE_SIZE: int = 500
+    EMAIL_EXPORT_MAX_PAGE_SIZE: int = 1000 # Graph's $top limit for messages
+    EMAIL_EXPORT_PREFETCH_PAGES: int = 2 # Pages fetched ahead of the client
+
+    # Graph change notifications (push ingestion of new inbox mail)
+    NOTIFICATION_URL: str = "" # Public HTTPS URL of POST /notifications; empty disables Graph subscriptions
+    NOTIFICATION_STORE_PATH: str = "data/subscriptions.sqlite3"
+    NOTIFICATION_SUBSCRIPTION_MINUTES: int = 4200 # Graph allows up to 4230 for messages
+    NOTIFICATION_RENEW_BEFORE_SECONDS: float = 6 * 3600.0
+    NOTIFICATION_RENEW_INTERVAL_SECONDS: float = 15 * 60.0
+    NOTIFICATION_WORKERS: int = 4
+    NOTIFICATION_QUEUE_MAX_SIZE: int = 10000
+    NOTIFICATION_DEDUP_MAX_ENTRIES: int = 50000
+    NOTIFICATION_CLAIM_TIMEOUT_SECONDS: float = 15 * 60.0 # A queued message not analyzed by then (e.g. its worker restarted) is taken again on redelivery
+    NOTIFICATION_RESULTS_PER_SESSION: int = 200
+    NOTIFICATION_LOCAL_NOTIFIER_ENABLED: bool = False # Exposes POST /notifications/local for dev/testing
+
+    # Opportunity store (CRM mock)
+    OPPORTUNITY_STORE_PATH: str = "data/opportunities.sqlite3"
+    OPPORTUNITY_BULK_MAX_ITEMS: int = 500
+    OPPORTUNITY_LIST_MAX_LIMIT: int = 200
+
+    # Account resolution from sender domains
+    ACCOUNT_PUBLIC_SUFFIX_LIST_PATH: str = "" # public_suffix_list.dat; empty uses the built-in common suffixes
+    ACCOUNT_EXTRA_FREE_MAIL_DOMAINS: List[str] = [] # Added to the built-in free-mail providers
+    ACCOUNT_RESOLVER_CACHE_SIZE: int = 10000 # Domains memoized per worker
+    ACCOUNT_ALIAS_RELOAD_SECONDS: float = 30.0 # How soon alias changes made by other workers apply
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -0,0 +1,184 @@
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Seconds; spans cached lookups through slow extraction calls
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+# Tokens per call
+DEFAULT_TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [{"labels": dict(key), "value": value} for key, value in self._values.items()]
+
+    def prometheus(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """Fixed-bucket histogram; buckets are upper bounds, as in Prometheus."""
+
+    def __init__(self, name: str, description: str, buckets: Iterable[float]):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, Dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0, "max": 0.0}
+                self._series[key] = series
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    index = i
+                    break
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+            series["max"] = max(series["max"], value)
+
+    def _quantile(self, counts: List[int], total: int, q: float) -> Optional[float]:
+        """Bucket upper bound below which a `q` share of observations fall."""
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            series = [(key, dict(s, counts=list(s["counts"]))) for key, s in self._series.items()]
+        result = []
+        for key, s in series:
+            result.append({
+                "labels": dict(key),
+                "count": s["count"],
+                "sum": s["sum"],
+                "mean": s["sum"] / s["count"] if s["count"] else 0.0,
+                "max": s["max"],
+                # Bucket bounds, so these are upper estimates
+                "p50": self._quantile(s["counts"], s["count"], 0.5),
+                "p95": self._quantile(s["counts"], s["count"], 0.95),
+                "p99": self._quantile(s["counts"], s["count"], 0.99),
+            })
+        return result
+
+    def prometheus(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, s in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), s["counts"]):
+                    cumulative += count
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {cumulative}"
+                    )
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(s['sum'])}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {s['count']}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms, rendered as JSON or in the Prometheus
+    text format. Values are per worker process and reset on restart.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, description)
+            return self._metrics[name]
+
+    def histogram(self, name: str, description: str, buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, description, buckets)
+            return self._metrics[name]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {
+                "type": "counter" if isinstance(metric, Counter) else "histogram",
+                "description": metric.description,
+                "series": metric.snapshot()
+            }
+            for metric in metrics
+        }
+
+    def prometheus(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.prometheus())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,269 @@
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from starlette.datastructures import MutableHeaders
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Incoming request ids are echoed back only if they look like ids
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+_METRIC_NAME_RE = re.compile(r"[^A-Za-z0-9._-]")
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "attributes", "start", "end", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+
+class Trace:
+    """Spans recorded while serving one HTTP request."""
+
+    def __init__(self, request_id: str, method: str, path: str):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.status_code: Optional[int] = None
+        self.error: Optional[str] = None
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def add(self, span: Span) -> bool:
+        if len(self.spans) >= settings.TRACING_MAX_SPANS:
+            self.dropped_spans += 1
+            return False
+        self.spans.append(span)
+        return True
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing header value: total time so far plus the summed duration
+        of finished spans per name (e.g. `graph;dur=84.2;desc="3 calls"`).
+        """
+        totals: Dict[str, List[float]] = {}
+        for span in list(self.spans):
+            if span.end is not None:
+                entry = totals.setdefault(span.name, [0.0, 0])
+                entry[0] += span.duration_ms
+                entry[1] += 1
+        metrics = [f"total;dur={self.duration_ms:.1f}"]
+        for name, (duration, count) in totals.items():
+            metric = _METRIC_NAME_RE.sub("_", name)
+            desc = f';desc="{count} calls"' if count > 1 else ""
+            metrics.append(f"{metric};dur={duration:.1f}{desc}")
+        return ", ".join(metrics)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "error": self.error,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "dropped_spans": self.dropped_spans,
+            "spans": [
+                {
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "name": span.name,
+                    # Offset from the start of the request
+                    "start_ms": round((span.start - self.start) * 1000, 3),
+                    "duration_ms": round(span.duration_ms, 3),
+                    "error": span.error,
+                    "attributes": span.attributes
+                }
+                for span in self.spans
+            ]
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[str]] = ContextVar("current_span", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Records a nested span in the current request's trace. Outside a traced
+    request (background workers, startup) this does nothing and yields None.
+
+    Works in sync and async code; tasks and threads started inside the span
+    inherit it as their parent through contextvars.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    record = Span(name, _current_span.get(), attributes)
+    if not trace.add(record):
+        yield record
+        return
+    token = _current_span.set(record.span_id)
+    try:
+        yield record
+    except BaseException as e:
+        record.error = type(e).__name__
+        raise
+    finally:
+        record.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+class TraceExporter:
+    """
+    Appends finished traces as JSON lines to TRACING_EXPORT_PATH from a
+    background thread, so requests never wait on disk. The file is rotated
+    to `<path>.1` once it exceeds TRACING_EXPORT_MAX_BYTES.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def export(self, trace: Trace):
+        if not self.path or trace.duration_ms < settings.TRACING_EXPORT_MIN_DURATION_MS:
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(trace.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            batch = [record]
+            # Drain whatever else is queued into the same write
+            while len(batch) < 500:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    self._write(batch)
+                    return
+                batch.append(record)
+            self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) > settings.TRACING_EXPORT_MAX_BYTES:
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                for record in batch:
+                    f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not export traces: {e}")
+
+    def close(self, timeout: float = 5.0):
+        """Flushes queued traces and stops the writer thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+
+
+trace_exporter = TraceExporter(settings.TRACING_EXPORT_PATH or None)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that gives every HTTP request a trace: a request id
+    (taken from X-Request-Id when the client sends one), the spans recorded
+    with `span()` while serving it, and `X-Request-Id`/`Server-Timing`
+    response headers. Finished traces go to `trace_exporter`.
+    """
+
+    def __init__(self, app, exporter: TraceExporter = trace_exporter):
+        self.app = app
+        self.exporter = exporter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for key, value in scope.get("headers", []):
+            if key == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_RE.match(candidate):
+                    request_id = candidate
+                break
+        trace = Trace(request_id or uuid.uuid4().hex, scope.get("method", ""), scope.get("path", ""))
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                trace.status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Request-Id", trace.request_id)
+                if settings.TRACING_SERVER_TIMING:
+                    # Spans still running when headers go out (streamed bodies) are left out
+                    headers.append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_with_headers)
+        except Exception as e:
+            trace.error = type(e).__name__
+            raise
+        finally:
+            trace.end = time.perf_counter()
+            _current_trace.reset(token)
+            self.exporter.export(trace)
@@ -1,11 +1,38 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from src.api.router import api_router
+from src.core.tracing import TracingMiddleware, trace_exporter
+from src.services.email.graph_client import graph_client
+from src.services.llm.clients.openai_client import openai_client
+from src.services.notifications.service import notification_service
+from src.services.attachments.service import attachment_text_service
+from src.services.catalog.service import catalog_service
+from src.services.llm.classifier import intent_classifier
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Notification workers and subscription renewal
+    await notification_service.start()
+    # Loads the product catalog in the background, then keeps it current
+    await catalog_service.start()
+    # Keeps the intent pre-classifier's model current, off the request path
+    await intent_classifier.start()
+    yield
+    await notification_service.stop()
+    await catalog_service.stop()
+    await intent_classifier.stop()
+    # Release pooled connections on shutdown
+    await graph_client.aclose()
+    await openai_client.aclose()
+    attachment_text_service.shutdown()
+    trace_exporter.close()
 
 app = FastAPI(
     title="VT Redirect Email API",
     description="API for accessing and managing Outlook emails via Microsoft Graph",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Set up CORS
@@ -21,8 +48,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-Id", "Server-Timing"],
 )
 
+# Added last so it wraps CORS and sees the whole request
+app.add_middleware(TracingMiddleware)
+
 app.include_router(api_router)
 
 @app.get("/")
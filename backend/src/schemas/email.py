@@ -1,5 +1,5 @@
 from typing import List, Optional, Any, Literal, Dict
-from pydantic import BaseModel, Field, EmailStr, ConfigDict
+from pydantic import BaseModel, Field, EmailStr, ConfigDict, model_validator
 from datetime import datetime
 from src.schemas.products import Product
 
@@ -63,6 +63,50 @@ class EmailResponse(BaseModel):
 class EmailListResponse(BaseModel):
     emails: List[EmailResponse]
     count: int
+    next_cursor: Optional[str] = None # Pass as `cursor` to fetch the next page
+
+class EmailListItem(BaseModel):
+    """A message from a `fields`-projected listing; only the requested properties are set."""
+    id: str
+    subject: Optional[str] = None
+    body_preview: Optional[str] = Field(None, alias="bodyPreview")
+    body: Optional[Dict[str, str]] = None
+    from_: Optional[Recipient] = Field(None, alias="from")
+    to_recipients: Optional[List[Recipient]] = Field(None, alias="toRecipients")
+    cc_recipients: Optional[List[Recipient]] = Field(None, alias="ccRecipients")
+    received_datetime: Optional[datetime] = Field(None, alias="receivedDateTime")
+    sent_datetime: Optional[datetime] = Field(None, alias="sentDateTime")
+    is_read: Optional[bool] = Field(None, alias="isRead")
+    is_draft: Optional[bool] = Field(None, alias="isDraft")
+    importance: Optional[str] = None
+    has_attachments: Optional[bool] = Field(None, alias="hasAttachments")
+    attachments: Optional[List[Attachment]] = None
+    conversation_id: Optional[str] = Field(None, alias="conversationId")
+    web_link: Optional[str] = Field(None, alias="webLink")
+
+    model_config = ConfigDict(populate_by_name=True)
+
+class EmailListProjectionResponse(BaseModel):
+    emails: List[EmailListItem]
+    count: int
+    fields: List[str]
+    next_cursor: Optional[str] = None
+
+class BulkFetchResponse(BaseModel):
+    emails: List[EmailResponse]
+    count: int
+    missing: List[str] = []
+
+class BulkOperationResult(BaseModel):
+    email_id: str
+    success: bool
+    status: int
+    error: Optional[str] = None
+
+class BulkOperationResponse(BaseModel):
+    results: List[BulkOperationResult]
+    succeeded: int
+    failed: int
 
 # --- Request Models ---
 
@@ -96,6 +140,15 @@ class ForwardEmailRequest(BaseModel):
 class MarkReadRequest(BaseModel):
     is_read: bool
 
+class BulkEmailIdsRequest(BaseModel):
+    email_ids: List[str] = Field(..., min_length=1, max_length=1000)
+
+class BulkMarkReadRequest(BulkEmailIdsRequest):
+    is_read: bool = True
+
+class BulkFetchRequest(BulkEmailIdsRequest):
+    include_attachments: bool = False
+
 # --- Auth Models ---
 
 class AuthUrlResponse(BaseModel):
@@ -124,5 +177,46 @@ class EmailAnalysisResponse(BaseModel):
     account_name: Optional[str] = Field(None, alias="accountName")
     key_contact: Optional[str] = Field(None, alias="keyContact")
 
+    # Thread analysis: the result is the conversation's state after this message
+    conversation_id: Optional[str] = Field(None, alias="conversationId")
+    thread_messages: Optional[int] = Field(None, alias="threadMessages")
+    analysis_mode: Optional[Literal["full", "delta", "unchanged", "already_folded"]] = Field(None, alias="analysisMode")
+
+    model_config = ConfigDict(populate_by_name=True)
+
+class BatchAnalysisFilter(BaseModel):
+    folder: str = "inbox"
+    limit: int = Field(50, ge=1, le=500)
+    skip: int = Field(0, ge=0)
+    date_filter: Optional[Literal["today", "yesterday", "this_week", "last_week", "this_month", "last_month", "last_7_days", "last_30_days"]] = None
+    unread_only: bool = False
+    has_attachments: Optional[bool] = None
+    from_address: Optional[str] = None
+    search: Optional[str] = None
+    order_by: str = "receivedDateTime desc"
+
+class BatchAnalysisRequest(BaseModel):
+    # Provide either explicit ids or a get_emails-style filter
+    email_ids: Optional[List[str]] = Field(None, min_length=1, max_length=500)
+    filter: Optional[BatchAnalysisFilter] = None
+    concurrency: Optional[int] = Field(None, ge=1)
+    stream: bool = False # Emit NDJSON results as they complete
+
+    @model_validator(mode="after")
+    def check_source(self):
+        if (self.email_ids is None) == (self.filter is None):
+            raise ValueError("Provide exactly one of 'email_ids' or 'filter'")
+        return self
+
+class BatchAnalysisItem(BaseModel):
+    email_id: str = Field(..., alias="emailId")
+    subject: Optional[str] = None
+    analysis: Optional[EmailAnalysisResponse] = None
+    error: Optional[str] = None
+
     model_config = ConfigDict(populate_by_name=True)
 
+class BatchAnalysisResponse(BaseModel):
+    results: List[BatchAnalysisItem]
+    count: int
+    failed: int
@@ -0,0 +1,24 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict
+from src.schemas.email import EmailAnalysisResponse
+
+class SubscriptionResponse(BaseModel):
+    subscription_id: str = Field(..., alias="subscriptionId")
+    expires_at: float = Field(..., alias="expiresAt")
+
+    model_config = ConfigDict(populate_by_name=True)
+
+class LocalNotificationRequest(BaseModel):
+    email_ids: List[str] = Field(..., min_length=1, max_length=500)
+
+class NotificationAnalysisItem(BaseModel):
+    email_id: str = Field(..., alias="emailId")
+    subject: Optional[str] = None
+    received_at: float = Field(..., alias="receivedAt")
+    analysis: EmailAnalysisResponse
+
+    model_config = ConfigDict(populate_by_name=True)
+
+class NotificationAnalysesResponse(BaseModel):
+    results: List[NotificationAnalysisItem]
+    count: int
@@ -1,6 +1,17 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field, ConfigDict
 
+class CatalogMatch(BaseModel):
+    """A product master entry an extracted part number resolved to."""
+    model_config = ConfigDict(populate_by_name=True)
+
+    sku: str
+    mpn: Optional[str] = None
+    manufacturer: Optional[str] = None
+    name: Optional[str] = None
+    match_type: str = Field(..., alias="matchType") # exact, prefix or fuzzy
+    score: float
+
 class Product(BaseModel):
     """
     Product model representing product information extracted from emails or other sources.
@@ -13,4 +24,5 @@ class Product(BaseModel):
     part_number: Optional[str] = Field(None, alias="partNumber")
     part_number_type: Optional[str] = Field(None, alias="partNumberType")
     description: Optional[str] = None
+    catalog_matches: List[CatalogMatch] = Field([], alias="catalogMatches")
  
\ No newline at end of file
@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import weakref
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+
+from src.core.config import settings
+from src.core.tracing import span
+from src.services.email.service import email_service
+from src.services.llm.service import llm_service
+from src.services.llm.normalize import normalize_body
+from src.services.crm.service import crm_service
+from src.services.catalog.service import catalog_service
+from src.services.attachments.service import attachment_text_service
+from src.services.analysis.threads import compact_products, new_lines, thread_store
+
+logger = logging.getLogger(__name__)
+
+# Keys of an analysis result that a thread's state carries over between messages
+RESULT_KEYS = (
+    "is_customer_request", "confidence", "reasoning", "products", "opportunity_name", "account_name", "key_contact",
+)
+
+class AnalysisService:
+    """
+    Orchestrates the analyze pipeline for one or many emails:
+    Graph message -> intent -> (product extraction) -> account deduction.
+
+    Messages with a conversationId are analyzed as part of their thread: the
+    first message runs the full pipeline, and once the thread is a customer
+    request, each reply only sends its new lines and the current product
+    list to the LLM, which returns the updated list.
+    """
+
+    def __init__(self):
+        self.email_service = email_service
+        self.llm_service = llm_service
+        self.crm_service = crm_service
+        self.attachment_service = attachment_text_service
+        self.catalog_service = catalog_service
+        self.thread_store = thread_store
+        # One analysis at a time per conversation, so replies fold in order
+        self._thread_locks: "weakref.WeakValueDictionary[Tuple[str, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def get_body_content(email: Dict[str, Any]) -> str:
+        # Handle body content properly (Graph returns dict or str), then reduce it
+        # to the new text: no markup, quoted history, disclaimers or signature
+        body_data = email.get("body", {})
+        if isinstance(body_data, dict):
+            return normalize_body(body_data.get("content", ""), body_data.get("contentType"))
+        return normalize_body(str(body_data or ""))
+
+    async def _attachment_texts(self, session_id: str, email: Dict[str, Any]) -> List[str]:
+        try:
+            return await self.attachment_service.get_email_attachment_texts(
+                session_id, email["id"], email.get("attachments")
+            )
+        except Exception as e:
+            logger.warning(f"Attachment extraction failed for email {email.get('id')}: {e}")
+            return []
+
+    def _wants_attachments(self, session_id: Optional[str], email: Dict[str, Any]) -> bool:
+        return bool(session_id and email.get("hasAttachments") and settings.ATTACHMENT_EXTRACT_ENABLED)
+
+    async def _resolve_products(self, products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not self.catalog_service.loaded:
+            return products
+        with span("catalog.resolve", products=len(products)):
+            # Off the loop: description matching is a sparse matrix product
+            return await asyncio.to_thread(self.catalog_service.resolve_products, products)
+
+    async def analyze_email(self, email: Dict[str, Any], session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Analyzes an already fetched Graph message. Messages with a
+        conversationId are analyzed in the context of their thread (see
+        analyze_message for a message on its own).
+
+        The first message seen from a thread that is already under way (a
+        reply analyzed before anything else in it) first folds in the
+        thread's earlier messages, fetched from Graph when a session_id is given.
+
+        Returns:
+            Dict matching EmailAnalysisResponse, with the thread's current products
+        """
+        conversation_id = email.get("conversationId")
+        if not (settings.THREAD_ANALYSIS_ENABLED and conversation_id):
+            return await self.analyze_message(email, session_id)
+
+        # Thread state belongs to the mailbox session; messages analyzed without one share ""
+        owner = session_id or ""
+        lock = self._thread_locks.get((owner, conversation_id))
+        if lock is None:
+            lock = self._thread_locks[(owner, conversation_id)] = asyncio.Lock()
+        async with lock:
+            state = await asyncio.to_thread(self.thread_store.get, owner, conversation_id)
+            if state is None and session_id:
+                state = await self._bootstrap_thread(email, session_id)
+            state, mode, failure = await self._fold_into_thread(state, email, session_id)
+            if state is not None:
+                # After a failure this is the state from before the message, so it is retried next time
+                await asyncio.to_thread(self.thread_store.save, owner, conversation_id, state)
+
+        return {
+            **{key: (state or {}).get(key) for key in RESULT_KEYS},
+            **(failure or {}),
+            "conversation_id": conversation_id,
+            "thread_messages": (state or {}).get("message_count", 0),
+            "analysis_mode": mode
+        }
+
+    async def _bootstrap_thread(self, email: Dict[str, Any], session_id: str) -> Optional[Dict[str, Any]]:
+        """Thread state from the messages before `email`: the first one and the most recent others."""
+        try:
+            with span("analysis.thread_bootstrap"):
+                messages = await self.email_service.get_conversation_messages(session_id, email["conversationId"])
+        except Exception as e:
+            logger.warning(f"Could not fetch conversation of email {email.get('id')}: {e}")
+            return None
+        received = email.get("receivedDateTime") or ""
+        earlier = [m for m in messages if m.get("id") != email.get("id") and (m.get("receivedDateTime") or "") < received]
+        limit = settings.THREAD_BOOTSTRAP_MAX_MESSAGES
+        if len(earlier) > limit:
+            # The first message usually holds the original request
+            earlier = earlier[:1] + (earlier[-(limit - 1):] if limit > 1 else [])
+
+        state = None
+        for message in earlier:
+            # A message that fails is left out; it is folded in if it is analyzed later
+            state, _, _ = await self._fold_into_thread(state, message, session_id)
+        return state
+
+    @staticmethod
+    def _analysis_error(result: Dict[str, Any]) -> Optional[str]:
+        """The error an LLM step failed with, if it fell back to its fail-safe result."""
+        if result.get("error"):
+            return str(result["error"])
+        reasoning = result.get("reasoning") or ""
+        return reasoning if reasoning.startswith("Error during analysis") else None
+
+    async def _fold_into_thread(
+        self, state: Optional[Dict[str, Any]], email: Dict[str, Any], session_id: Optional[str]
+    ) -> Tuple[Optional[Dict[str, Any]], str, Optional[Dict[str, Any]]]:
+        """
+        Applies one message to a thread's state.
+
+        When the LLM fails, the state is returned untouched: the message is not
+        marked as folded and its lines are not recorded, so analyzing it again
+        (or the thread's next message) sends them again.
+
+        Returns:
+            (state, mode, failure): mode is "full" (analyzed on its own),
+            "delta" (products updated from its new lines), "unchanged"
+            (nothing new) or "already_folded" (already part of the thread); failure
+            is None, or the result keys to answer with instead of the state's
+        """
+        message_id = email.get("id")
+        if state is not None and message_id in state["message_ids"]:
+            return state, "already_folded", None
+
+        body = self.get_body_content(email)
+        delta, hashes = new_lines(body, state["line_hashes"] if state else ())
+
+        if state is not None and not delta:
+            mode = "unchanged"
+        elif state is None or not state["is_customer_request"]:
+            # Not a request so far: classify (and extract from) this message's new text on its own
+            result = await self.analyze_message(email, session_id, body=delta if state else body)
+            if self._analysis_error(result):
+                return state, "full", result
+            state = {**(state or {"message_ids": [], "line_hashes": [], "message_count": 0}), **result}
+            mode = "full"
+        else:
+            attachments = await self._attachment_texts(session_id, email) if self._wants_attachments(session_id, email) else []
+            with span("analysis.thread_update"):
+                updated = await self.llm_service.update_product_data(
+                    email.get("subject", "") or "", state.get("opportunity_name"),
+                    compact_products(state.get("products") or []), delta, attachments
+                )
+            error = self._analysis_error(updated)
+            if error:
+                return state, "delta", {"reasoning": f"Error during analysis: {error}"}
+            state["products"] = await self._resolve_products(updated.get("products") or [])
+            state["opportunity_name"] = updated.get("opportunity_name") or state.get("opportunity_name")
+            mode = "delta"
+
+        state["message_ids"].append(message_id)
+        state["line_hashes"].extend(hashes)
+        state["message_count"] += 1
+        return state, mode, None
+
+    async def analyze_message(
+        self, email: Dict[str, Any], session_id: Optional[str] = None, body: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Runs the analysis pipeline for an already fetched Graph message, on its own.
+
+        With a session_id, text extracted from the email's attachments is fed
+        into product extraction. `body` replaces the message's normalized body
+        (thread analysis passes only the lines new to the thread).
+
+        Returns:
+            Dict matching EmailAnalysisResponse
+        """
+        subject = email.get("subject", "") or ""
+        body_content = self.get_body_content(email) if body is None else body
+
+        # Attachments are downloaded and parsed while the intent call is in flight
+        attachments_task = None
+        if self._wants_attachments(session_id, email):
+            attachments_task = asyncio.create_task(self._attachment_texts(session_id, email))
+
+        try:
+            # 1. Analyze intent using LLMService
+            with span("analysis.intent"):
+                intent = await self.llm_service.analyze_email_intent(subject, body_content)
+
+            # 2. If it is a request, extract products immediately
+            products = []
+            opportunity_name = None
+            extraction_error = None
+            if intent.get("is_customer_request"):
+                with span("analysis.attachments_wait"):
+                    attachments = await attachments_task if attachments_task else []
+                with span("analysis.extraction"):
+                    product_data = await self.llm_service.extract_product_data(subject, body_content, attachments)
+                products = product_data.get("products", [])
+                opportunity_name = product_data.get("opportunity_name")
+                extraction_error = product_data.get("error")
+                products = await self._resolve_products(products)
+        finally:
+            if attachments_task and not attachments_task.done():
+                attachments_task.cancel()
+
+        # 3. Deduce Account and Contact info
+        with span("crm.deduce_account_info"):
+            account_name, key_contact = self.crm_service.deduce_account_info(email.get("from"))
+
+        result = {
+            "is_customer_request": intent.get("is_customer_request"),
+            "confidence": intent.get("confidence"),
+            "reasoning": intent.get("reasoning"),
+            "products": products,
+            "opportunity_name": opportunity_name,
+            "account_name": account_name,
+            "key_contact": key_contact
+        }
+        if extraction_error:
+            # Not part of the response; tells thread analysis not to keep this result
+            result["error"] = extraction_error
+        return result
+
+    async def analyze_batch(
+        self,
+        session_id: str,
+        email_ids: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        concurrency: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Analyzes many emails with bounded concurrency.
+
+        Messages are fetched up front with text bodies (by id, or the ones a
+        get_emails-style filter lists), then analyzed concurrently. Results are yielded as soon as each email
+        finishes, so callers can stream them or collect an aggregate. Messages
+        of the same conversation are analyzed one after another, oldest first,
+        so each reply updates the thread state left by the one before it.
+        """
+        concurrency = min(concurrency or settings.ANALYSIS_BATCH_CONCURRENCY, settings.ANALYSIS_BATCH_MAX_CONCURRENCY)
+
+        if email_ids is None:
+            # The listing only picks the messages; list bodies are HTML, so they are fetched below as text
+            listing = await self.email_service.get_emails(session_id=session_id, include_body=False, **(filters or {}))
+            email_ids = [email["id"] for email in listing.get("emails", [])]
+        # One $batch round trip per 20 messages instead of one request each
+        fetched = await self.email_service.get_emails_by_ids(session_id, email_ids, text_body=True)
+        emails = [(email_id, fetched.get(email_id)) for email_id in email_ids]
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(email_id: str, email: Optional[Dict[str, Any]], after: Optional[asyncio.Task]) -> Dict[str, Any]:
+            if not email:
+                return {"email_id": email_id, "error": "Email not found"}
+            if after is not None:
+                # Outside the semaphore, so waiting never holds a slot
+                await asyncio.wait([after])
+            async with semaphore:
+                try:
+                    analysis = await self.analyze_email(email, session_id)
+                    return {"email_id": email_id, "subject": email.get("subject"), "analysis": analysis}
+                except Exception as e:
+                    logger.error(f"Error analyzing email {email_id}: {e}")
+                    return {"email_id": email_id, "subject": email.get("subject"), "error": str(e)}
+
+        tasks = []
+        previous: Dict[str, asyncio.Task] = {}
+        threaded = settings.THREAD_ANALYSIS_ENABLED
+        for email_id, email in sorted(emails, key=lambda item: (item[1] or {}).get("receivedDateTime") or ""):
+            conversation_id = (email or {}).get("conversationId") if threaded else None
+            task = asyncio.create_task(run(email_id, email, previous.get(conversation_id)))
+            if conversation_id:
+                previous[conversation_id] = task
+            tasks.append(task)
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Stop outstanding work if the consumer goes away (e.g. client disconnects)
+            for task in tasks:
+                task.cancel()
+
+analysis_service = AnalysisService()
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.core.config import settings
+
+# Product fields sent back to the LLM as the thread's current list
+PRODUCT_FIELDS = ("name", "quantity", "partNumber", "partNumberType", "description")
+
+
+def line_hash(line: str, following: str = "") -> int:
+    """Hash of a line together with the next one, ignoring case and spacing."""
+    text = " ".join(line.lower().split()) + "\n" + " ".join(following.lower().split())
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def new_lines(text: str, seen: Iterable[int]) -> Tuple[str, List[int]]:
+    """
+    The lines of a normalized body not already seen earlier in its thread.
+    Catches history normalize_body cannot tell apart: quotes without a
+    reply header, forwarded copies and pasted-back tables.
+
+    Lines are compared with their neighbours (as pairs of consecutive
+    non-blank lines), so a repeated short line such as "Qty: 10" is only
+    dropped where the text around it was seen too, and lines repeated
+    within the message itself are kept.
+
+    Returns:
+        (the new text, hashes of all of its line pairs)
+    """
+    seen = set(seen)
+    lines = text.splitlines()
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    # Pair hashes of each non-blank line with the one after it ("" after the last)
+    pairs = [
+        line_hash(lines[i], lines[content[n + 1]] if n + 1 < len(content) else "")
+        for n, i in enumerate(content)
+    ]
+    # The pair with the end of the text only counts for a message of one line, so a
+    # closing line seen at the end of an earlier message is kept after new lines
+    old = {
+        i for n, i in enumerate(content)
+        if (pairs[n] in seen and (n + 1 < len(content) or n == 0)) or (n > 0 and pairs[n - 1] in seen)
+    }
+
+    kept = []
+    for i, line in enumerate(lines):
+        if not line.strip():
+            if kept and kept[-1]:
+                kept.append("")
+        elif i not in old:
+            kept.append(line)
+    return "\n".join(kept).strip(), pairs
+
+
+def compact_products(products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Products as the LLM sees them: extraction fields only, nulls dropped."""
+    return [
+        {field: product[field] for field in PRODUCT_FIELDS if product.get(field) is not None}
+        for product in products
+    ]
+
+
+class ThreadStateStore:
+    """
+    SQLite (WAL mode) analysis state per session and conversation: the
+    thread's current products, classification and account, which messages
+    were folded in, and hashes of the lines already sent to the LLM. Threads
+    untouched for THREAD_STATE_MAX_AGE_DAYS are pruned when the store opens.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS thread_states ("
+                "session_id TEXT NOT NULL, conversation_id TEXT NOT NULL, state TEXT NOT NULL, "
+                "updated_at REAL NOT NULL, PRIMARY KEY (session_id, conversation_id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS thread_states_updated ON thread_states(updated_at)")
+            conn.execute(
+                "DELETE FROM thread_states WHERE updated_at < ?",
+                (time.time() - settings.THREAD_STATE_MAX_AGE_DAYS * 86400,)
+            )
+            self._conn = conn
+        return self._conn
+
+    def get(self, session_id: str, conversation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT state FROM thread_states WHERE session_id = ? AND conversation_id = ?",
+                (session_id, conversation_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id: str, conversation_id: str, state: Dict[str, Any]):
+        # Bounded so long negotiation threads keep a small row
+        state["message_ids"] = state["message_ids"][-settings.THREAD_STATE_MAX_MESSAGES:]
+        state["line_hashes"] = state["line_hashes"][-settings.THREAD_STATE_MAX_LINES:]
+        state["updated_at"] = time.time()
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO thread_states (session_id, conversation_id, state, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, conversation_id, json.dumps(state), state["updated_at"])
+            )
+
+    def delete(self, session_id: str, conversation_id: str) -> bool:
+        with self._lock:
+            return self._db().execute(
+                "DELETE FROM thread_states WHERE session_id = ? AND conversation_id = ?",
+                (session_id, conversation_id)
+            ).rowcount > 0
+
+    def clear(self, session_id: str) -> int:
+        """Forgets every thread of a session."""
+        with self._lock:
+            return self._db().execute("DELETE FROM thread_states WHERE session_id = ?", (session_id,)).rowcount
+
+
+thread_store = ThreadStateStore(settings.THREAD_STATE_PATH)
@@ -0,0 +1,109 @@
+"""
+Text extractors for RFQ attachments.
+
+These run inside worker processes (see AttachmentTextService), so this
+module stays import-light: parser libraries are optional and imported on
+first use, and nothing here touches settings or I/O beyond the bytes given.
+"""
+import csv
+import io
+import os
+from typing import Callable, Dict, Optional
+
+# Bump when extraction output changes so cached texts are recomputed
+EXTRACTOR_VERSION = "1"
+
+
+def _rows_to_text(rows, max_rows: int) -> str:
+    lines = []
+    for row in rows:
+        cells = ["" if cell is None else str(cell).strip() for cell in row]
+        if any(cells):
+            lines.append(" | ".join(cells).rstrip(" |"))
+        if len(lines) >= max_rows:
+            lines.append("[... truncated]")
+            break
+    return "\n".join(lines)
+
+
+def extract_pdf(data: bytes, max_pages: int, max_rows: int) -> str:
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    pages = []
+    for page in reader.pages[:max_pages]:
+        pages.append(page.extract_text() or "")
+    return "\n\n".join(text.strip() for text in pages if text.strip())
+
+
+def extract_xlsx(data: bytes, max_pages: int, max_rows: int) -> str:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        sheets = []
+        for sheet in workbook.worksheets[:max_pages]:
+            text = _rows_to_text(sheet.iter_rows(values_only=True), max_rows)
+            if text:
+                sheets.append(f"## Sheet: {sheet.title}\n{text}")
+        return "\n\n".join(sheets)
+    finally:
+        workbook.close()
+
+
+def extract_csv(data: bytes, max_pages: int, max_rows: int) -> str:
+    text = data.decode("utf-8-sig", errors="replace")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    return _rows_to_text(csv.reader(io.StringIO(text), dialect), max_rows)
+
+
+def extract_docx(data: bytes, max_pages: int, max_rows: int) -> str:
+    from docx import Document
+
+    document = Document(io.BytesIO(data))
+    parts = [p.text for p in document.paragraphs if p.text.strip()]
+    for table in document.tables:
+        parts.append(_rows_to_text(([cell.text for cell in row.cells] for row in table.rows), max_rows))
+    return "\n".join(parts)
+
+
+EXTRACTORS: Dict[str, Callable[[bytes, int, int], str]] = {
+    "pdf": extract_pdf,
+    "xlsx": extract_xlsx,
+    "csv": extract_csv,
+    "docx": extract_docx,
+}
+
+CONTENT_TYPES = {
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+}
+
+
+def detect_kind(name: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Maps an attachment to an extractor key, by content type then file extension."""
+    kind = CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+    if kind:
+        return kind
+    extension = os.path.splitext(name or "")[1].lower().lstrip(".")
+    return extension if extension in EXTRACTORS else None
+
+
+def extract_text(kind: str, data: bytes, max_pages: int, max_rows: int) -> Optional[str]:
+    """
+    Entry point executed in the process pool. `max_pages` bounds PDF pages
+    and spreadsheet sheets, `max_rows` bounds rows per table.
+
+    Returns:
+        Extracted text, or None when the parser library for `kind` is not installed
+    """
+    try:
+        return EXTRACTORS[kind](data, max_pages, max_rows)
+    except ImportError:
+        return None
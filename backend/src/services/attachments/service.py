@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional
+
+from src.core.cache import TieredCache
+from src.core.config import settings
+from src.core.tracing import span
+from src.services.email.service import email_service
+from src.services.attachments.extractors import EXTRACTOR_VERSION, detect_kind, extract_text
+
+logger = logging.getLogger(__name__)
+
+
+class AttachmentTextService:
+    """
+    Extracts text and tables from email attachments (PDF, XLSX, CSV, DOCX)
+    for the product extraction prompt.
+
+    Parsing is CPU bound, so it runs in a process pool rather than on the
+    event loop or in threads. Results are cached by content hash, so
+    re-analysis and the same file forwarded in another email cost nothing,
+    and concurrent requests for identical content share one parse.
+    """
+
+    def __init__(self):
+        self.email_service = email_service
+        self.cache = TieredCache(
+            path=settings.LLM_CACHE_PATH if settings.LLM_CACHE_ENABLED else None,
+            max_entries=settings.ATTACHMENT_TEXT_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+            max_disk_entries=settings.LLM_CACHE_MAX_DISK_ENTRIES,
+            table="attachment_text"
+        )
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        # Spawned (not forked) workers, since the API process runs threads
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.ATTACHMENT_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    @staticmethod
+    def content_key(kind: str, content: bytes) -> str:
+        return f"{EXTRACTOR_VERSION}:{kind}:{hashlib.sha256(content).hexdigest()}"
+
+    async def _parse(self, kind: str, content: bytes) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        try:
+            with span("attachments.parse", kind=kind, size=len(content)):
+                return await asyncio.wait_for(
+                    loop.run_in_executor(
+                        self.pool, extract_text, kind, content,
+                        settings.ATTACHMENT_EXTRACT_MAX_PAGES, settings.ATTACHMENT_EXTRACT_MAX_ROWS
+                    ),
+                    timeout=settings.ATTACHMENT_EXTRACT_TIMEOUT_SECONDS
+                )
+        except BrokenProcessPool:
+            # A worker died (e.g. a parser crashed); start a fresh pool for later calls
+            self._pool = None
+            raise
+
+    async def _parse_and_cache(self, key: str, kind: str, content: bytes) -> Optional[str]:
+        text = await self._parse(kind, content)
+        # None means the parser library is missing; don't pin that in the cache
+        if text is not None:
+            text = text[:settings.ATTACHMENT_TEXT_MAX_CHARS]
+            await self.cache.aset(key, {"text": text})
+        return text
+
+    async def extract(self, kind: str, content: bytes) -> Optional[str]:
+        """Text for one file, from the cache or the process pool."""
+        key = self.content_key(kind, content)
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            return cached.get("text")
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._parse_and_cache(key, kind, content))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one caller going away doesn't cancel the parse for the others
+        return await asyncio.shield(future)
+
+    async def _extract_attachment(self, session_id: str, email_id: str, attachment: Dict[str, Any]) -> Optional[str]:
+        kind = detect_kind(attachment.get("name"), attachment.get("contentType"))
+        if not kind or attachment.get("isInline") or attachment.get("size", 0) > settings.ATTACHMENT_EXTRACT_MAX_BYTES:
+            return None
+        try:
+            content = await self.email_service.get_attachment_content(
+                session_id, email_id, attachment["id"], settings.ATTACHMENT_EXTRACT_MAX_BYTES
+            )
+            if not content:
+                return None
+            text = await self.extract(kind, content)
+        except Exception as e:
+            logger.warning(f"Could not extract text from attachment {attachment.get('name')}: {e!r}")
+            return None
+        if not text or not text.strip():
+            return None
+        return f"### {attachment.get('name')}\n{text.strip()}"
+
+    async def get_email_attachment_texts(
+        self, session_id: str, email_id: str, attachments: Optional[List[Dict[str, Any]]] = None
+    ) -> List[str]:
+        """
+        Extracted text for each supported attachment of an email, in attachment order.
+
+        Args:
+            attachments: Attachment metadata if already known (e.g. from the local store)
+        """
+        if attachments is None:
+            attachments = await self.email_service.get_email_attachments(session_id, email_id)
+        attachments = attachments[:settings.ATTACHMENT_EXTRACT_MAX_FILES]
+        texts = await asyncio.gather(
+            *(self._extract_attachment(session_id, email_id, attachment) for attachment in attachments)
+        )
+        return [text for text in texts if text]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+attachment_text_service = AttachmentTextService()
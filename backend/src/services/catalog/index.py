@@ -0,0 +1,328 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+_NON_ALNUM_RE = re.compile(r"[^A-Z0-9]")
+
+CESS_PREFIX = "CESS"
+
+# Pending prefix-index keys are merged into the sorted array beyond this many
+PREFIX_MERGE_THRESHOLD = 4096
+
+NO_ENTRY = -1
+SHARED = -2
+
+
+class CatalogEntry(NamedTuple):
+    sku: str # CESS number
+    mpn: Optional[str] = None
+    manufacturer: Optional[str] = None
+    name: Optional[str] = None
+    description: Optional[str] = None
+
+
+def normalize_part_number(value: Optional[str]) -> str:
+    """Upper-case alphanumerics only: "cess-748203-001" and "CESS 748203001" both give "CESS748203001"."""
+    return _NON_ALNUM_RE.sub("", (value or "").upper())
+
+
+def trigrams(key: str) -> Set[str]:
+    """Character trigrams of a normalized key, anchored with ^ and $ so short keys still get a few."""
+    padded = f"^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CatalogIndex:
+    """
+    In-memory lookup structures over the product master.
+
+    Entries are referenced by their position in `entries`. Every normalized
+    CESS number and MPN is a key, and each key gets a small integer id that
+    the three indexes share:
+
+    - a hash from key to key id, for exact lookups
+    - the key ids ordered by length, then key (an `array`), searched with
+      bisect, for prefix lookups on partial numbers. Each length is a sorted
+      run, so the shortest keys with a prefix are found by searching the
+      runs in turn. This does the same job as a prefix trie in a fraction of
+      the memory.
+    - trigram postings (`array`s of key ids), for typo-tolerant lookups.
+      Postings are split by key length, since a key within a few edits is
+      within as many characters of the query's length. CESS numbers and
+      MPNs have separate postings, so the digit runs of one never crowd the
+      candidates for the other, and the CESS prefix every CESS number shares
+      is left out of their trigrams.
+
+    Per-key data lives in flat arrays rather than Python objects, and entries
+    are found by SKU through the hash on their normalized CESS number, so a
+    key costs little beyond its string.
+
+    Upserts and removals update the indexes in place. Keys that lose all
+    their entries stay behind as tombstones and are skipped; `compacted()`
+    builds a copy without them once `tombstone_share()` grows.
+    """
+
+    def __init__(self):
+        self.entries: List[Optional[CatalogEntry]] = []
+        self._keys: List[str] = []
+        self._key_ids: Dict[str, int] = {}
+        # Entry position per key id; NO_ENTRY for tombstones, SHARED when in `_shared`
+        self._key_entry = array("i")
+        self._shared: Dict[int, Tuple[int, ...]] = {}
+        self._gram_counts = array("B")
+        self._sorted = array("I")
+        self._pending: List[int] = []
+        self._postings: Dict[str, array] = {}
+        self._cess_postings: Dict[str, array] = {}
+        self._lock = threading.Lock()
+        self._max_key_length = 0
+        self._dead_keys = 0
+        self.live_entries = 0
+
+    @classmethod
+    def build(cls, entries: Iterable[CatalogEntry]) -> "CatalogIndex":
+        index = cls()
+        index.upsert(entries)
+        index._merge_pending()
+        return index
+
+    def compacted(self) -> "CatalogIndex":
+        """A new index over the live entries only. Entry positions change."""
+        with self._lock:
+            entries = [entry for entry in self.entries if entry is not None]
+        return CatalogIndex.build(entries)
+
+    def tombstone_share(self) -> float:
+        """Largest share of dead entry slots or dead keys."""
+        dead_entries = len(self.entries) - self.live_entries
+        return max(
+            dead_entries / len(self.entries) if self.entries else 0.0,
+            self._dead_keys / len(self._keys) if self._keys else 0.0
+        )
+
+    # --- Updates ---
+
+    def upsert(self, entries: Iterable[CatalogEntry]) -> int:
+        """Adds or replaces entries by SKU. Returns how many were written."""
+        count = 0
+        with self._lock:
+            for entry in entries:
+                position = self._find_sku(entry.sku)
+                if position is not None:
+                    previous = self.entries[position]
+                    if previous == entry:
+                        continue
+                    self._unlink(position, previous)
+                    self.entries[position] = entry
+                else:
+                    position = len(self.entries)
+                    self.entries.append(entry)
+                self._link(position, entry)
+                self.live_entries += 1
+                count += 1
+            if len(self._pending) > PREFIX_MERGE_THRESHOLD:
+                self._merge_pending()
+        return count
+
+    def remove(self, skus: Iterable[str]) -> int:
+        count = 0
+        with self._lock:
+            for sku in skus:
+                position = self._find_sku(sku)
+                if position is None:
+                    continue
+                self._unlink(position, self.entries[position])
+                self.entries[position] = None
+                count += 1
+        return count
+
+    def get(self, sku: str) -> Optional[int]:
+        """Position of the entry with this SKU."""
+        return self._find_sku(sku)
+
+    def _find_sku(self, sku: str) -> Optional[int]:
+        key_id = self._key_ids.get(normalize_part_number(sku))
+        if key_id is None:
+            return None
+        return next((p for p in self._positions(key_id) if self.entries[p].sku == sku), None)
+
+    @staticmethod
+    def _entry_keys(entry: CatalogEntry) -> Set[str]:
+        return {key for key in (normalize_part_number(entry.sku), normalize_part_number(entry.mpn)) if key}
+
+    def _link(self, position: int, entry: CatalogEntry):
+        for key in self._entry_keys(entry):
+            key_id = self._key_ids.get(key)
+            if key_id is None:
+                key_id = len(self._keys)
+                self._keys.append(key)
+                self._key_ids[key] = key_id
+                self._key_entry.append(position)
+                self._pending.append(key_id)
+                self._max_key_length = max(self._max_key_length, len(key))
+                grams = self._grams(key)
+                self._gram_counts.append(min(len(grams), 255))
+                postings = self._postings_for(key)
+                length = chr(self._length(key))
+                for gram in grams:
+                    gram += length
+                    if gram in postings:
+                        postings[gram].append(key_id)
+                    else:
+                        postings[gram] = array("I", (key_id,))
+                continue
+            self._set_positions(key_id, self._positions(key_id) + (position,))
+
+    def _unlink(self, position: int, entry: CatalogEntry):
+        self.live_entries -= 1
+        for key in self._entry_keys(entry):
+            key_id = self._key_ids[key]
+            self._set_positions(key_id, tuple(p for p in self._positions(key_id) if p != position))
+
+    def _set_positions(self, key_id: int, positions: Tuple[int, ...]):
+        self._shared.pop(key_id, None)
+        if self._key_entry[key_id] == NO_ENTRY:
+            self._dead_keys -= 1
+        if not positions:
+            self._dead_keys += 1
+            self._key_entry[key_id] = NO_ENTRY
+        elif len(positions) == 1:
+            self._key_entry[key_id] = positions[0]
+        else:
+            self._key_entry[key_id] = SHARED
+            self._shared[key_id] = positions
+
+    def _postings_for(self, key: str) -> Dict[str, array]:
+        return self._cess_postings if key.startswith(CESS_PREFIX) else self._postings
+
+    @staticmethod
+    def _grams(key: str) -> Set[str]:
+        return trigrams(key[len(CESS_PREFIX):] if key.startswith(CESS_PREFIX) else key)
+
+    @staticmethod
+    def _length(key: str) -> int:
+        """Length bucket of a key's postings."""
+        return min(len(key) - (len(CESS_PREFIX) if key.startswith(CESS_PREFIX) else 0), 255)
+
+    def _order(self, key_id: int) -> Tuple[int, str]:
+        """Sort key of the prefix index: length, then key."""
+        key = self._keys[key_id]
+        return len(key), key
+
+    def _merge_pending(self):
+        if not self._pending:
+            return
+        pending = sorted(self._pending, key=self._order)
+        self._sorted = array("I", heapq.merge(self._sorted, pending, key=self._order))
+        self._pending = []
+
+    # --- Lookups ---
+
+    def _positions(self, key_id: int) -> Tuple[int, ...]:
+        position = self._key_entry[key_id]
+        if position >= 0:
+            return (position,)
+        return self._shared.get(key_id, ()) if position == SHARED else ()
+
+    def exact(self, key: str) -> List[int]:
+        key_id = self._key_ids.get(key)
+        return list(self._positions(key_id)) if key_id is not None else []
+
+    def prefix(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        """(key, entry position) pairs for keys starting with `prefix`, shortest keys first."""
+        keys = self._keys
+        found: List[Tuple[str, int]] = []
+        sorted_ids = self._sorted
+        start = 0
+        # One sorted run per length, shortest first; stop once `limit` are found
+        for length in range(len(prefix), self._max_key_length + 1):
+            if len(found) >= limit:
+                break
+            start = bisect.bisect_left(sorted_ids, (length, prefix), lo=start, key=self._order)
+            for i in range(start, len(sorted_ids)):
+                key = keys[sorted_ids[i]]
+                if len(key) != length or not key.startswith(prefix) or len(found) >= limit:
+                    break
+                found.extend((key, position) for position in self._positions(sorted_ids[i]))
+        # Keys added since the last merge
+        for key_id in list(self._pending):
+            key = keys[key_id]
+            if key.startswith(prefix):
+                found.extend((key, position) for position in self._positions(key_id))
+        found.sort(key=lambda item: (len(item[0]), item[0]))
+        return found[:limit]
+
+    def fuzzy(
+        self, key: str, limit: int, min_score: float, max_edits: int, max_candidates: int, max_scan: int
+    ) -> List[Tuple[str, int, float]]:
+        """
+        (key, entry position, score) for keys similar to `key`, best first.
+        Score is the Dice coefficient of the two trigram sets.
+
+        Only keys within `max_edits` characters of the query's length are
+        considered. One edit changes at most three trigrams, so any key within
+        `max_edits` edits shares at least one of the query's
+        3 * max_edits + 1 rarest trigrams; only those postings are scanned.
+        A candidate can share at most its hits there plus the query trigrams
+        that were not scanned, which rules most of them out before their
+        trigrams are compared. Queries whose rarest postings hold more than
+        `max_scan` key ids are too unselective to answer and return nothing.
+        """
+        grams = self._grams(key)
+        space = self._postings_for(key)
+        length = self._length(key)
+        lengths = [chr(n) for n in range(max(length - max_edits, 0), min(length + max_edits, 255) + 1)]
+        postings = []
+        for gram in grams:
+            lists = [space[gram + n] for n in lengths if gram + n in space]
+            if lists:
+                postings.append((sum(len(ids) for ids in lists), lists))
+        if not postings:
+            return []
+        postings.sort(key=lambda item: item[0])
+        scanned = postings[:3 * max_edits + 1]
+        if sum(size for size, _ in scanned) > max_scan:
+            return []
+        hits: Counter = Counter()
+        for _, lists in scanned:
+            for ids in lists:
+                hits.update(ids)
+
+        # Hits a key with n trigrams needs before it is worth comparing
+        unscanned = len(postings) - len(scanned)
+        needed = [
+            math.ceil(min_score * (len(grams) + n) / 2 - 1e-9) - unscanned
+            if 2 * n >= min_score * (len(grams) + n) else math.inf
+            for n in range(256)
+        ]
+        gram_counts = self._gram_counts
+        candidates = [(count, key_id) for key_id, count in hits.items() if count >= needed[gram_counts[key_id]]]
+        if len(candidates) > max_candidates:
+            candidates = heapq.nlargest(max_candidates, candidates)
+
+        keys = self._keys
+        results = []
+        for _, key_id in candidates:
+            candidate = keys[key_id]
+            if candidate == key or self._key_entry[key_id] == NO_ENTRY:
+                continue
+            candidate_grams = self._grams(candidate)
+            score = 2 * len(grams & candidate_grams) / (len(grams) + len(candidate_grams))
+            if score >= min_score:
+                results.extend((candidate, position, score) for position in self._positions(key_id))
+        results.sort(key=lambda item: (-item[2], item[0]))
+        return results[:limit]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": self.live_entries,
+            "keys": len(self._keys),
+            "posting_lists": len(self._postings) + len(self._cess_postings),
+            "postings": sum(len(ids) for space in (self._postings, self._cess_postings) for ids in space.values()),
+            "pending_prefix_keys": len(self._pending),
+        }
@@ -0,0 +1,286 @@
+"""
+TF-IDF matching of free-text product names and descriptions against the catalog.
+
+Catalog texts become hashed character n-gram TF-IDF vectors. The matrix is
+stored transposed (n-gram -> catalog rows, i.e. an inverted index) as .npy
+files that every worker memory-maps, so the pages are shared rather than
+copied per process. Query lines are vectorized together and scored with a
+single sparse matrix product, then the top matches per line are picked with
+argpartition.
+
+Requires numpy and scipy; CatalogService runs without description matching
+when they are not installed.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+MATRIX_VERSION = 1
+
+_NON_WORD_RE = re.compile(r"[^0-9a-z]+")
+
+# Documents vectorized per chunk while building, to bound peak memory
+BUILD_CHUNK_DOCS = 50000
+
+FNV_PRIME = np.uint32(16777619)
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case words separated by single spaces, padded so n-grams see word boundaries."""
+    return f" {_NON_WORD_RE.sub(' ', (text or '').lower()).strip()} "
+
+
+def term_counts(texts: List[str], ngram_range: Tuple[int, int], dims: int) -> sparse.csr_matrix:
+    """
+    Hashed character n-gram counts, one row per text.
+
+    All texts are hashed at once: their bytes are concatenated and an FNV-1a
+    hash is rolled over every n-gram position with vectorized uint32
+    arithmetic. N-grams that would straddle two texts are dropped.
+    """
+    encoded = [normalize_text(text).encode("utf-8") for text in texts]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint32)
+    doc_of = np.repeat(np.arange(len(encoded), dtype=np.int64), lengths)
+
+    rows, cols = [], []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        m = len(data) - n + 1
+        if m <= 0:
+            continue
+        # Seeded with n so that n-grams of different lengths hash apart
+        h = np.full(m, 2166136261 ^ n, dtype=np.uint32)
+        for j in range(n):
+            h ^= data[j:j + m]
+            h *= FNV_PRIME
+        inside = doc_of[:m] == doc_of[n - 1:]
+        rows.append(doc_of[:m][inside])
+        cols.append(h[inside] % np.uint32(dims))
+
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    cols = np.concatenate(cols).astype(np.int64) if cols else np.zeros(0, dtype=np.int64)
+    counts = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(texts), dims), dtype=np.float32
+    )
+    counts.sum_duplicates()
+    return counts
+
+
+def _normalize_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags((1.0 / norms).astype(np.float32)) @ matrix
+
+
+def tfidf(counts: sparse.csr_matrix, idf: np.ndarray) -> sparse.csr_matrix:
+    """Sublinear TF times IDF, L2-normalized per row. Features with zero IDF are dropped."""
+    weighted = counts.copy()
+    weighted.data = (1.0 + np.log(weighted.data)) * idf[weighted.indices]
+    weighted.eliminate_zeros()
+    return _normalize_rows(weighted)
+
+
+def _index_dtype(nnz: int):
+    return np.int32 if nnz < 2 ** 31 else np.int64
+
+
+class DescriptionMatcher:
+    """
+    Ranks catalog entries for product names and descriptions.
+
+    `build()` writes a new matrix version under `directory` and points the
+    `current` file at it; every process picks it up through
+    `maybe_reload()`. Older versions are removed after the switch.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._loaded: Optional[dict] = None
+        self._pointer_mtime = 0.0
+
+    @property
+    def _pointer(self) -> str:
+        return os.path.join(self.directory, "current")
+
+    @property
+    def signature(self) -> Optional[str]:
+        """Identifies the catalog contents the loaded matrix was built from."""
+        loaded = self._loaded
+        return loaded["meta"]["signature"] if loaded else None
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded is not None
+
+    def build(
+        self,
+        rows: Iterable[Tuple[str, str]],
+        signature: str,
+        ngram_range: Tuple[int, int],
+        dims: int,
+        max_df: float
+    ):
+        """
+        Builds the matrix from (sku, text) rows. Blocking and CPU-heavy; run
+        it off the event loop.
+
+        N-grams found in more than `max_df` of the texts get no weight: they
+        say little about which product is meant and would make every query
+        touch most of the catalog.
+        """
+        skus: List[str] = []
+        texts: List[str] = []
+        chunks = []
+        for sku, text in rows:
+            skus.append(sku)
+            texts.append(text)
+            if len(texts) >= BUILD_CHUNK_DOCS:
+                chunks.append(term_counts(texts, ngram_range, dims))
+                texts = []
+        if texts or not chunks:
+            chunks.append(term_counts(texts, ngram_range, dims))
+        counts = sparse.vstack(chunks, format="csr")
+        del chunks
+
+        docs = counts.shape[0]
+        df = np.bincount(counts.indices, minlength=dims)
+        idf = (np.log((1 + docs) / (1 + df)) + 1).astype(np.float32)
+        idf[df > max(max_df * docs, 1)] = 0.0
+        idf[df == 0] = 0.0
+
+        # Stored transposed: for each n-gram, the catalog rows that contain it
+        inverted = tfidf(counts, idf).T.tocsr()
+        index_dtype = _index_dtype(inverted.nnz)
+
+        version = f"v{int(time.time() * 1000)}-{os.getpid()}"
+        path = os.path.join(self.directory, version)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "data.npy"), inverted.data.astype(np.float32))
+        np.save(os.path.join(path, "indices.npy"), inverted.indices.astype(index_dtype))
+        np.save(os.path.join(path, "indptr.npy"), inverted.indptr.astype(index_dtype))
+        np.save(os.path.join(path, "idf.npy"), idf)
+        with open(os.path.join(path, "skus.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(skus))
+        meta = {
+            "version": MATRIX_VERSION,
+            "signature": signature,
+            "docs": docs,
+            "dims": dims,
+            "ngram_range": list(ngram_range),
+            "max_df": max_df,
+            "nnz": int(inverted.nnz),
+            "built_at": time.time(),
+        }
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        tmp_pointer = f"{self._pointer}.{os.getpid()}.tmp"
+        with open(tmp_pointer, "w") as f:
+            f.write(version)
+        os.replace(tmp_pointer, self._pointer)
+        self._pointer_mtime = 0.0
+        self.maybe_reload()
+        self._remove_old_versions(keep=version)
+
+    def _remove_old_versions(self, keep: str):
+        """
+        Removes complete versions older than `keep`. Builds still being
+        written by another process have no meta.json yet and are left alone.
+        Processes still mapping an old version keep reading it on POSIX.
+        """
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if (
+                name.startswith("v") and name < keep
+                and os.path.exists(os.path.join(path, "meta.json"))
+            ):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def maybe_reload(self):
+        """Maps the current matrix version if it changed."""
+        try:
+            mtime = os.path.getmtime(self._pointer)
+        except OSError:
+            return
+        if mtime == self._pointer_mtime:
+            return
+        try:
+            with open(self._pointer) as f:
+                path = os.path.join(self.directory, f.read().strip())
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            if meta.get("version") != MATRIX_VERSION:
+                return
+            inverted = sparse.csr_matrix(
+                (
+                    np.load(os.path.join(path, "data.npy"), mmap_mode="r"),
+                    np.load(os.path.join(path, "indices.npy"), mmap_mode="r"),
+                    np.load(os.path.join(path, "indptr.npy"), mmap_mode="r"),
+                ),
+                shape=(meta["dims"], meta["docs"]),
+                copy=False
+            )
+            with open(os.path.join(path, "skus.txt"), encoding="utf-8") as f:
+                skus = f.read().split("\n") if meta["docs"] else []
+            loaded = {
+                "meta": meta,
+                "inverted": inverted,
+                "idf": np.load(os.path.join(path, "idf.npy"), mmap_mode="r"),
+                "skus": skus,
+            }
+            with self._lock:
+                self._loaded = loaded
+                self._pointer_mtime = mtime
+        except Exception as e:
+            logger.error(f"Error loading catalog matcher from {self.directory}: {e}")
+
+    def match(self, texts: List[str], limit: int, min_score: float) -> List[List[Tuple[str, float]]]:
+        """
+        Top catalog SKUs with their cosine similarity for each text, best
+        first. All texts are scored in one sparse product.
+        """
+        loaded = self._loaded
+        if loaded is None or not texts:
+            return [[] for _ in texts]
+        meta = loaded["meta"]
+        queries = tfidf(term_counts(texts, tuple(meta["ngram_range"]), meta["dims"]), loaded["idf"])
+        scores = (queries @ loaded["inverted"]).tocsr()
+
+        skus = loaded["skus"]
+        results = []
+        for row in range(scores.shape[0]):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            values = scores.data[start:end]
+            columns = scores.indices[start:end]
+            if len(values) > limit:
+                top = np.argpartition(values, -limit)[-limit:]
+                values, columns = values[top], columns[top]
+            order = np.argsort(-values)
+            results.append([
+                (skus[columns[i]], float(values[i])) for i in order if values[i] >= min_score
+            ])
+        return results
+
+    def stats(self) -> dict:
+        loaded = self._loaded
+        if loaded is None:
+            return {"ready": False}
+        meta = loaded["meta"]
+        return {
+            "ready": True,
+            "docs": meta["docs"],
+            "nnz": meta["nnz"],
+            "built_at": meta["built_at"],
+            "signature": meta["signature"],
+        }
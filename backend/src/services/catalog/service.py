@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from src.core.config import settings
+from src.services.catalog.index import CESS_PREFIX, CatalogIndex, normalize_part_number
+from src.services.catalog import source
+
+logger = logging.getLogger(__name__)
+
+try:
+    from src.services.catalog.matcher import DescriptionMatcher
+except ImportError: # numpy/scipy not installed
+    DescriptionMatcher = None
+
+
+class CatalogService:
+    """
+    Resolves extracted part numbers against the product master.
+
+    The catalog is read from CATALOG_PATH: a CSV or JSON lines file, re-read
+    whole when it changes, or a SQLite database standing in for the product
+    DB, whose changed rows are applied to the live index in place.
+
+    Products without a part number (or whose number found nothing) are
+    matched on name and description by a DescriptionMatcher, rebuilt after
+    the catalog changes.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.index = CatalogIndex()
+        self._file_mtime = 0.0
+        self._watermark = 0.0
+        self._refresh_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.loaded_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.matcher = (
+            DescriptionMatcher(settings.CATALOG_MATRIX_DIR)
+            if DescriptionMatcher is not None and settings.CATALOG_MATCHER_ENABLED else None
+        )
+        if self.matcher is None and settings.CATALOG_MATCHER_ENABLED:
+            logger.info("numpy/scipy not installed; catalog description matching is disabled")
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def refresh(self) -> Dict[str, Any]:
+        """Picks up catalog changes. Blocking; run it off the event loop."""
+        if not self.path:
+            return self.stats()
+        with self._refresh_lock:
+            started = time.perf_counter()
+            try:
+                if source.is_incremental(self.path):
+                    upserts, deletes, watermark = source.read_changes(self.path, self._watermark)
+                    changed = self.index.upsert(upserts) + self.index.remove(deletes)
+                    self._watermark = watermark
+                    if self.index.tombstone_share() > settings.CATALOG_COMPACT_TOMBSTONE_SHARE:
+                        # Swapped in like a rebuilt file, since entry positions change
+                        self.index = self.index.compacted()
+                    signature = f"{self.path}:{watermark}:{self.index.live_entries}"
+                else:
+                    mtime = os.path.getmtime(self.path)
+                    changed = 0
+                    if mtime != self._file_mtime:
+                        # Built aside and swapped in, so lookups never see a half-loaded catalog
+                        self.index = CatalogIndex.build(source.read_file(self.path))
+                        self._file_mtime = mtime
+                        changed = self.index.live_entries
+                    signature = f"{self.path}:{mtime}:{self.index.live_entries}"
+                self.loaded_at = time.time()
+                self.last_error = None
+                if changed:
+                    logger.info(
+                        f"Catalog refreshed from {self.path}: {changed} changes, "
+                        f"{self.index.live_entries} entries in {time.perf_counter() - started:.1f}s"
+                    )
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Error loading catalog from {self.path}: {e}")
+                return self.stats()
+            self._refresh_matcher(signature)
+        return self.stats()
+
+    def _refresh_matcher(self, signature: str):
+        """Rebuilds the description matrix unless one for this catalog state exists (possibly from another worker)."""
+        if self.matcher is None:
+            return
+        self.matcher.maybe_reload()
+        if self.matcher.signature == signature:
+            return
+        started = time.perf_counter()
+        try:
+            index = self.index
+            rows = (
+                (entry.sku, " ".join(filter(None, (entry.name, entry.description, entry.manufacturer))))
+                for entry in index.entries if entry is not None
+            )
+            self.matcher.build(
+                rows, signature,
+                (settings.CATALOG_MATCHER_NGRAM_MIN, settings.CATALOG_MATCHER_NGRAM_MAX),
+                settings.CATALOG_MATCHER_DIMENSIONS, settings.CATALOG_MATCHER_MAX_DF
+            )
+            logger.info(f"Catalog description matrix rebuilt in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            logger.error(f"Error building catalog description matrix: {e}")
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.to_thread(self.refresh)
+            await asyncio.sleep(settings.CATALOG_REFRESH_INTERVAL_SECONDS)
+
+    async def start(self):
+        if self.path and self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def lookup(self, part_number: str, part_number_type: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Catalog entries for a part number, best first: the exact match, else
+        entries whose number starts with it (partial numbers), else close
+        spellings (typos, missing characters).
+        """
+        limit = limit or settings.CATALOG_MAX_MATCHES
+        index = self.index
+        key = normalize_part_number(part_number)
+        if not key:
+            return []
+        if (part_number_type or "").upper() == "CESS" and not key.startswith(CESS_PREFIX):
+            key = CESS_PREFIX + key
+
+        positions = index.exact(key)
+        if positions:
+            return [self._match(index, position, "exact", 1.0) for position in positions[:limit]]
+
+        if len(key) >= settings.CATALOG_PREFIX_MIN_LENGTH:
+            found = index.prefix(key, limit)
+            if found:
+                return [self._match(index, position, "prefix", len(key) / len(matched)) for matched, position in found]
+
+        found = index.fuzzy(
+            key, limit,
+            settings.CATALOG_FUZZY_MIN_SCORE, settings.CATALOG_FUZZY_MAX_EDITS,
+            settings.CATALOG_FUZZY_MAX_CANDIDATES, settings.CATALOG_FUZZY_MAX_SCAN
+        )
+        return [self._match(index, position, "fuzzy", score) for _, position, score in found]
+
+    @staticmethod
+    def _match(index: CatalogIndex, position: int, match_type: str, score: float) -> Dict[str, Any]:
+        entry = index.entries[position]
+        return {
+            "sku": entry.sku,
+            "mpn": entry.mpn,
+            "manufacturer": entry.manufacturer,
+            "name": entry.name,
+            "matchType": match_type,
+            "score": round(score, 4),
+        }
+
+    def search(self, texts: List[str], limit: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """Catalog entries for free-text product names/descriptions, scored together in one batch."""
+        if self.matcher is None or not texts:
+            return [[] for _ in texts]
+        self.matcher.maybe_reload()
+        index = self.index
+        results = []
+        for ranked in self.matcher.match(texts, limit or settings.CATALOG_MAX_MATCHES, settings.CATALOG_MATCHER_MIN_SCORE):
+            matches = []
+            for sku, score in ranked:
+                position = index.get(sku)
+                # Entries removed since the matrix was built are skipped
+                if position is not None:
+                    matches.append(self._match(index, position, "description", score))
+            results.append(matches)
+        return results
+
+    def resolve_products(self, products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Extracted products (Product dicts) with `catalogMatches` filled in:
+        by part number where there is one, otherwise by name and description.
+        """
+        resolved = []
+        unmatched = []
+        for product in products:
+            part_number = product.get("partNumber") or product.get("part_number")
+            matches = self.lookup(part_number, product.get("partNumberType") or product.get("part_number_type")) if part_number else []
+            resolved.append({**product, "catalogMatches": matches})
+            text = " ".join(filter(None, (product.get("name"), product.get("description"))))
+            if not matches and text.strip():
+                unmatched.append((len(resolved) - 1, text))
+
+        if unmatched:
+            for (i, _), matches in zip(unmatched, self.search([text for _, text in unmatched])):
+                resolved[i]["catalogMatches"] = matches
+        return resolved
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path or None,
+            "loaded": self.loaded,
+            "loaded_at": self.loaded_at,
+            "incremental": bool(self.path) and source.is_incremental(self.path),
+            "last_error": self.last_error,
+            **self.index.stats(),
+            "description_matcher": self.matcher.stats() if self.matcher else {"ready": False, "available": False}
+        }
+
+
+catalog_service = CatalogService(settings.CATALOG_PATH or None)
@@ -0,0 +1,81 @@
+import csv
+import json
+import os
+import sqlite3
+from typing import Iterator, List, Optional, Tuple
+
+from src.services.catalog.index import CatalogEntry
+
+# Accepted column names per CatalogEntry field, for CSV headers and JSON keys
+COLUMN_ALIASES = {
+    "sku": ("sku", "cess", "cess_number", "cessNumber"),
+    "mpn": ("mpn", "part_number", "partNumber", "manufacturer_part_number"),
+    "manufacturer": ("manufacturer", "mfr", "brand"),
+    "name": ("name", "product_name", "productName", "title"),
+    "description": ("description", "desc"),
+}
+
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+
+
+def _entry(record: dict) -> Optional[CatalogEntry]:
+    values = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        value = next((record[alias] for alias in aliases if record.get(alias) not in (None, "")), None)
+        values[field] = str(value).strip() if value is not None else None
+    if not values["sku"]:
+        return None
+    return CatalogEntry(**values)
+
+
+def is_incremental(path: str) -> bool:
+    """SQLite sources can be read as changes since a watermark; files are re-read whole."""
+    return path.lower().endswith(SQLITE_SUFFIXES)
+
+
+def read_file(path: str) -> Iterator[CatalogEntry]:
+    """Entries from a CSV (with a header row) or JSON lines file. Rows without a SKU are skipped."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = csv.DictReader(f)
+        for record in records:
+            entry = _entry(record)
+            if entry:
+                yield entry
+
+
+def read_changes(path: str, since: float) -> Tuple[List[CatalogEntry], List[str], float]:
+    """
+    Rows of the SQLite source (a stand-in for the product master database)
+    changed at or after `since`. It reads a `catalog_products` table with
+    sku, mpn, manufacturer, name, description, updated_at and deleted columns. Rows sharing the
+    watermark's timestamp are read again next time, which is harmless since
+    upserts and deletes are idempotent, and none committed late are missed.
+
+    Returns:
+        (upserted entries, deleted SKUs, new watermark)
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5.0)
+    try:
+        rows = conn.execute(
+            "SELECT sku, mpn, manufacturer, name, description, updated_at, deleted "
+            "FROM catalog_products WHERE updated_at >= ? ORDER BY updated_at",
+            (since,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    upserts, deletes = [], []
+    watermark = since
+    for sku, mpn, manufacturer, name, description, updated_at, deleted in rows:
+        watermark = max(watermark, updated_at)
+        if deleted:
+            deletes.append(sku)
+        else:
+            upserts.append(CatalogEntry(sku, mpn or None, manufacturer or None, name or None, description or None))
+    return upserts, deletes, watermark
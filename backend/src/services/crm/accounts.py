@@ -0,0 +1,234 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.core.config import settings
+from src.services.crm.public_suffixes import BUILTIN_SUFFIXES, FREE_MAIL_DOMAINS
+
+logger = logging.getLogger(__name__)
+
+# Trie node markers; neither can be a DNS label
+RULE = "!rule"
+EXCEPTION = "!exception"
+
+
+def normalize_domain(domain: Optional[str]) -> str:
+    return (domain or "").strip().strip(".").lower()
+
+
+class SuffixTrie:
+    """
+    Public Suffix List rules compiled into a trie of nested dicts, keyed by
+    label from the TLD inwards. Supports normal, wildcard (`*.ck`) and
+    exception (`!www.ck`) rules, and the PSL default rule that any unlisted
+    TLD is a suffix.
+    """
+
+    def __init__(self, rules: Iterable[str]):
+        self._root: Dict[str, Any] = {}
+        for rule in rules:
+            self.add(rule)
+
+    @classmethod
+    def from_file(cls, path: str) -> "SuffixTrie":
+        """Reads a public_suffix_list.dat: one rule per line, `//` comments."""
+        with open(path, encoding="utf-8") as f:
+            rules = [line.split()[0] for line in f if line.strip() and not line.startswith("//")]
+        return cls(rules)
+
+    def add(self, rule: str):
+        rule = normalize_domain(rule)
+        exception = rule.startswith("!")
+        node = self._root
+        for label in reversed(rule.lstrip("!").split(".")):
+            node = node.setdefault(label, {})
+        node[EXCEPTION if exception else RULE] = True
+
+    def suffix_length(self, labels: List[str]) -> int:
+        """Number of trailing labels forming the public suffix; `labels` are in domain order."""
+        length = 1
+        node = self._root
+        for depth, label in enumerate(reversed(labels)):
+            child = node.get(label)
+            if child is not None and EXCEPTION in child:
+                return depth
+            if "*" in node:
+                length = depth + 1
+            if child is None:
+                break
+            if RULE in child:
+                length = depth + 1
+            node = child
+        return length
+
+    def registrable_domain(self, domain: str) -> Optional[str]:
+        """
+        The public suffix plus one label ("mail.acme.co.uk" -> "acme.co.uk"),
+        or None when the domain is itself a public suffix.
+        """
+        labels = normalize_domain(domain).split(".")
+        if not all(labels):
+            return None
+        length = self.suffix_length(labels)
+        if len(labels) <= length:
+            return None
+        return ".".join(labels[-(length + 1):])
+
+
+class AccountAliasStore:
+    """Domain -> account name overrides, in the opportunity store's SQLite database."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS account_aliases ("
+                "domain TEXT PRIMARY KEY, account_name TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def data_version(self) -> int:
+        """Changes whenever another connection (e.g. another worker) commits to the database."""
+        with self._lock:
+            return self._db().execute("PRAGMA data_version").fetchone()[0]
+
+    def all(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._db().execute("SELECT domain, account_name FROM account_aliases").fetchall())
+
+    def set(self, domain: str, account_name: str):
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO account_aliases (domain, account_name, updated_at) VALUES (?, ?, ?)",
+                (domain, account_name, time.time())
+            )
+
+    def delete(self, domain: str) -> bool:
+        with self._lock:
+            return self._db().execute("DELETE FROM account_aliases WHERE domain = ?", (domain,)).rowcount > 0
+
+
+class AccountResolver:
+    """
+    Maps a sender domain to an account.
+
+    In order:
+    1. An alias for the domain or one of its parents, down to the
+       registrable domain, so "emea.acme.com" can map elsewhere than "acme.com".
+    2. Free-mail providers (gmail.com, yahoo.co.uk, ...) give no account.
+    3. Otherwise the account is named after the registrable domain's first
+       label: "sales.acme-corp.co.uk" -> "Acme Corp".
+
+    Results are memoized per domain in a bounded LRU. It is cleared when
+    aliases change, here or (noticed within ACCOUNT_ALIAS_RELOAD_SECONDS)
+    in another worker.
+    """
+
+    def __init__(self, aliases: AccountAliasStore):
+        self.alias_store = aliases
+        self.suffixes = self._load_suffixes()
+        self.free_mail = FREE_MAIL_DOMAINS | {normalize_domain(d) for d in settings.ACCOUNT_EXTRA_FREE_MAIL_DOMAINS}
+        self._aliases: Optional[Dict[str, str]] = None
+        self._aliases_version: Optional[int] = None
+        self._aliases_checked = 0.0
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_suffixes() -> SuffixTrie:
+        path = settings.ACCOUNT_PUBLIC_SUFFIX_LIST_PATH
+        if path:
+            try:
+                return SuffixTrie.from_file(path)
+            except OSError as e:
+                logger.error(f"Error reading public suffix list {path}, using the built-in suffixes: {e}")
+        return SuffixTrie(BUILTIN_SUFFIXES)
+
+    def _check_aliases(self):
+        now = time.monotonic()
+        if self._aliases is not None and now - self._aliases_checked < settings.ACCOUNT_ALIAS_RELOAD_SECONDS:
+            return
+        self._aliases_checked = now
+        version = self.alias_store.data_version()
+        if self._aliases is None or version != self._aliases_version:
+            self._aliases = self.alias_store.all()
+            self._aliases_version = version
+            self._cache.clear()
+
+    def resolve(self, domain: str) -> Dict[str, Any]:
+        """
+        Returns:
+            {"domain", "registrable_domain", "account_name", "source"}, where
+            source is "alias", "domain", "free_mail" or "unknown"
+        """
+        domain = normalize_domain(domain)
+        with self._lock:
+            self._check_aliases()
+            cached = self._cache.get(domain)
+            if cached is not None:
+                self._cache.move_to_end(domain)
+                return cached
+            result = self._resolve(domain)
+            self._cache[domain] = result
+            while len(self._cache) > settings.ACCOUNT_RESOLVER_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result
+
+    def _resolve(self, domain: str) -> Dict[str, Any]:
+        registrable = self.suffixes.registrable_domain(domain) if domain else None
+        result = {"domain": domain, "registrable_domain": registrable, "account_name": None, "source": "unknown"}
+
+        # The domain itself, then each parent down to the registrable domain
+        labels = domain.split(".")
+        stop = len(labels) - len(registrable.split(".")) if registrable else 0
+        for i in range(stop + 1):
+            alias = self._aliases.get(".".join(labels[i:]))
+            if alias:
+                return {**result, "account_name": alias, "source": "alias"}
+
+        if registrable is None:
+            return result
+        if registrable in self.free_mail or domain in self.free_mail:
+            return {**result, "source": "free_mail"}
+        label = registrable.split(".")[0]
+        return {**result, "account_name": label.replace("-", " ").title(), "source": "domain"}
+
+    def set_alias(self, domain: str, account_name: str):
+        self.alias_store.set(normalize_domain(domain), account_name)
+        with self._lock:
+            self._aliases = None
+
+    def delete_alias(self, domain: str) -> bool:
+        deleted = self.alias_store.delete(normalize_domain(domain))
+        if deleted:
+            with self._lock:
+                self._aliases = None
+        return deleted
+
+    def aliases(self) -> Dict[str, str]:
+        return self.alias_store.all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached_domains": len(self._cache),
+            "cache_size": settings.ACCOUNT_RESOLVER_CACHE_SIZE,
+            "aliases": len(self._aliases or {}),
+            "public_suffix_list": settings.ACCOUNT_PUBLIC_SUFFIX_LIST_PATH or "built-in",
+        }
+
+
+account_resolver = AccountResolver(AccountAliasStore(settings.OPPORTUNITY_STORE_PATH))
@@ -0,0 +1,68 @@
+"""
+Built-in domain data for account resolution.
+
+BUILTIN_SUFFIXES holds the common multi-label public suffixes, in Public
+Suffix List rule syntax. Single-label TLDs need no entry, since the PSL
+default rule already treats any unlisted top-level label as a suffix. Set
+ACCOUNT_PUBLIC_SUFFIX_LIST_PATH to a downloaded public_suffix_list.dat for
+the complete list.
+"""
+
+BUILTIN_SUFFIXES = (
+    # United Kingdom
+    "co.uk", "org.uk", "me.uk", "net.uk", "ltd.uk", "plc.uk", "ac.uk", "gov.uk", "sch.uk", "nhs.uk", "police.uk",
+    # Australia / New Zealand
+    "com.au", "net.au", "org.au", "edu.au", "gov.au", "asn.au", "id.au",
+    "co.nz", "net.nz", "org.nz", "ac.nz", "govt.nz", "school.nz",
+    # Europe
+    "co.at", "or.at", "gv.at", "ac.at",
+    "com.pl", "net.pl", "org.pl",
+    "com.es", "org.es", "nom.es",
+    "com.pt", "org.pt",
+    "com.gr", "com.cy", "com.mt",
+    "co.it", "gov.it",
+    "com.tr", "org.tr", "gen.tr",
+    "com.ua", "org.ua", "in.ua",
+    "co.hu", "org.hu",
+    # Americas
+    "com.br", "net.br", "org.br", "gov.br",
+    "com.mx", "org.mx", "gob.mx",
+    "com.ar", "gob.ar", "com.co", "gov.co", "com.pe", "com.ve", "com.uy", "com.ec",
+    "qc.ca", "on.ca", "bc.ca", "ab.ca",
+    # Asia
+    "co.jp", "ne.jp", "or.jp", "ac.jp", "go.jp", "ad.jp",
+    "co.kr", "or.kr", "ac.kr", "go.kr",
+    "com.cn", "net.cn", "org.cn", "gov.cn", "edu.cn",
+    "com.hk", "org.hk", "edu.hk",
+    "com.tw", "org.tw", "edu.tw",
+    "co.in", "net.in", "org.in", "firm.in", "gen.in", "ind.in", "ac.in", "gov.in",
+    "com.sg", "edu.sg", "gov.sg",
+    "com.my", "edu.my", "gov.my",
+    "co.id", "or.id", "ac.id", "go.id", "web.id",
+    "co.th", "or.th", "ac.th", "go.th", "in.th",
+    "com.ph", "com.pk", "com.vn", "com.bd", "com.np", "com.lk",
+    "co.il", "org.il", "ac.il", "gov.il",
+    "com.sa", "com.qa", "com.kw", "com.bh", "com.om", "co.ae", "gov.ae",
+    # Africa
+    "co.za", "org.za", "gov.za", "ac.za",
+    "com.ng", "gov.ng", "com.eg", "co.ke", "or.ke", "co.tz", "co.ug", "com.gh", "co.zw", "co.ma",
+)
+
+# Registrable domains of consumer mailbox providers; senders there say nothing about their company
+FREE_MAIL_DOMAINS = frozenset((
+    "gmail.com", "googlemail.com",
+    "outlook.com", "outlook.co.uk", "hotmail.com", "hotmail.co.uk", "hotmail.fr", "hotmail.de", "hotmail.it",
+    "hotmail.es", "live.com", "live.co.uk", "live.fr", "live.de", "msn.com", "passport.com",
+    "yahoo.com", "yahoo.co.uk", "yahoo.fr", "yahoo.de", "yahoo.it", "yahoo.es", "yahoo.co.jp", "yahoo.co.in",
+    "yahoo.com.au", "yahoo.com.br", "ymail.com", "rocketmail.com",
+    "icloud.com", "me.com", "mac.com",
+    "aol.com", "aim.com", "verizon.net", "att.net", "comcast.net", "sbcglobal.net", "cox.net",
+    "gmx.com", "gmx.de", "gmx.net", "gmx.at", "web.de", "t-online.de", "freenet.de",
+    "mail.com", "email.com", "usa.com",
+    "proton.me", "protonmail.com", "pm.me", "tutanota.com", "tuta.io", "fastmail.com", "hey.com", "zoho.com",
+    "yandex.ru", "yandex.com", "mail.ru", "rambler.ru",
+    "qq.com", "163.com", "126.com", "sina.com", "naver.com", "daum.net",
+    "btinternet.com", "sky.com", "virginmedia.com", "talktalk.net",
+    "orange.fr", "free.fr", "laposte.net", "sfr.fr", "wanadoo.fr", "libero.it", "virgilio.it",
+    "bigpond.com", "optusnet.com.au", "rediffmail.com", "seznam.cz", "wp.pl", "o2.pl", "interia.pl",
+))
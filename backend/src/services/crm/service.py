@@ -1,8 +1,19 @@
-from typing import Dict, Any, Optional, Tuple
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from src.services.crm.accounts import account_resolver
+from src.services.crm.store import opportunity_store
+from src.services.email.pagination import InvalidCursor, encode_cursor, decode_cursor
+
+# Filters a list cursor may carry
+OPPORTUNITY_FILTERS = (
+    "account_name", "key_contact", "created_from", "created_before", "source_message_id", "conversation_id",
+)
 
 class CRMService:
     def __init__(self):
-        self._opportunities = {}
+        self.store = opportunity_store
+        self.account_resolver = account_resolver
 
     def deduce_account_info(self, from_data: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
         """
@@ -27,72 +38,106 @@ class CRMService:
         if not key_contact and email:
              key_contact = email.split("@")[0].replace(".", " ").title()
         
-        # Account Name: Deduce from domain
+        # Account Name: from the sender's domain (aliases, public suffixes, free mail)
         account_name = None
         if email and "@" in email:
-            domain = email.split("@")[1]
-            
-            # List of common public email domains to ignore for account naming (optional, but good practice)
-            # For now, we will just process whatever domain is there as requested.
-            
-            if "." in domain:
-                # Remove TLD (e.g., .com, .co.uk) - simple approach: take everything before the last dot
-                # For 'acme.co.uk', this might be 'acme.co', which isn't perfect but simple.
-                # Better approach for now: take the first part of the domain.
-                # e.g. company.com -> company
-                # e.g. mail.company.com -> mail (maybe not ideal, but simple)
-                
-                # Let's try to get the main domain part. 
-                parts = domain.split(".")
-                if len(parts) >= 2:
-                    # simplistic: take the part before the last part (TLD)
-                    # if 2 parts: google.com -> google
-                    # if 3 parts: sub.google.com -> sub (maybe check for known TLDs in future)
-                    # For now, let's just capitalize the domain name without TLD.
-                    company_part = parts[-2] if len(parts) >= 2 else parts[0]
-                    # Handle cases like '.co.uk' where we might want the second to last if we were smarter
-                    # But user asked for "last part of the senders email" which is vague, 
-                    # usually means the domain.
-                    
-                    # Re-reading: "Account Name, use the last part of the senders email to deduce this."
-                    # I'll interpret "last part" as the domain name.
-                    
-                    # Let's use the second to last part as the company name usually.
-                    company_part = parts[-2]
-                    account_name = company_part.replace("-", " ").title()
-            else:
-                account_name = domain.title()
-                
+            account_name = self.account_resolver.resolve(email.rsplit("@", 1)[1])["account_name"]
+
         return account_name, key_contact
 
-    def create_opportunity(self, opportunity_data: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def idempotency_key(opportunity_data: Dict[str, Any], idempotency_key: Optional[str] = None) -> Optional[str]:
+        """
+        The caller's key, else one derived from the source email, so analyzing
+        and submitting the same email again finds the opportunity it already created.
+        """
+        if idempotency_key:
+            return idempotency_key
+        source_message_id = opportunity_data.get("sourceMessageId")
+        return f"message:{source_message_id}" if source_message_id else None
+
+    @staticmethod
+    def _result(opportunity: Dict[str, Any], created: bool) -> Dict[str, Any]:
+        return {
+            "oid": opportunity["oid"],
+            "status": "created" if created else "existing",
+            "message": "Opportunity created successfully (Mock)" if created else "Opportunity already exists for this idempotency key"
+        }
+
+    def create_opportunity(self, opportunity_data: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """
         Creates a mock opportunity in the CRM (Salesforce) and returns the opportunity ID.
         
         Args:
             opportunity_data: Dictionary containing opportunity details
+            idempotency_key: Optional; a repeated key returns the existing opportunity
             
         Returns:
-            Dictionary containing the created opportunity ID (oid)
+            Dictionary containing the opportunity ID (oid) and whether it was created
         """
         # In a real implementation, this would connect to Salesforce
-        # For now, we generate a mock ID
-        import random
-        mock_oid = f"006{random.randint(1000000000, 9999999999)}"
-        
-        # Store the opportunity data for retrieval
-        self._opportunities[mock_oid] = opportunity_data
-        
-        return {
-            "oid": mock_oid,
-            "status": "created",
-            "message": "Opportunity created successfully (Mock)"
-        }
+        return self.create_opportunities([(opportunity_data, idempotency_key)])[0]
+
+    def create_opportunities(self, items: List[Tuple[Dict[str, Any], Optional[str]]]) -> List[Dict[str, Any]]:
+        """Creates (opportunity data, idempotency key) pairs in one transaction; results are in order."""
+        created = self.store.create_many([(data, self.idempotency_key(data, key)) for data, key in items])
+        return [self._result(opportunity, is_new) for opportunity, is_new in created]
 
     def get_opportunity(self, oid: str) -> Optional[Dict[str, Any]]:
         """
         Retrieves opportunity details by ID.
         """
-        return self._opportunities.get(oid)
+        return self.store.get(oid)
+
+    def list_opportunities(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        account_name: Optional[str] = None,
+        key_contact: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        source_message_id: Optional[str] = None,
+        conversation_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Lists opportunities newest first. Passing `next_cursor` back as
+        `cursor` continues the same query (the filter arguments are then ignored).
+
+        Raises:
+            InvalidCursor: If the cursor cannot be decoded
+        """
+        if cursor:
+            state = decode_cursor(cursor)
+            query, after = state.get("query"), state.get("after")
+            if (
+                not isinstance(query, dict) or not set(query) <= set(OPPORTUNITY_FILTERS)
+                or not (isinstance(after, list) and len(after) == 2)
+            ):
+                raise InvalidCursor("Not an opportunity list cursor")
+        else:
+            query = {
+                "account_name": account_name,
+                "key_contact": key_contact,
+                "created_from": self._timestamp(created_from),
+                "created_before": self._timestamp(created_before),
+                "source_message_id": source_message_id,
+                "conversation_id": conversation_id,
+            }
+            after = None
+
+        opportunities, last = self.store.query_page(limit=limit, after=after, **query)
+        return {
+            "opportunities": opportunities,
+            "count": len(opportunities),
+            "next_cursor": encode_cursor({"query": query, "after": last}) if last else None
+        }
+
+    @staticmethod
+    def _timestamp(value: Optional[datetime]) -> Optional[float]:
+        if value is None:
+            return None
+        # Naive datetimes are taken as UTC, like the createdDate values returned
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
 
 crm_service = CRMService()
@@ -0,0 +1,185 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.core.config import settings
+
+
+def new_oid() -> str:
+    """Mock Salesforce opportunity id (opportunity ids start with 006)."""
+    return f"006{random.randint(1000000000, 9999999999)}"
+
+
+class OpportunityStore:
+    """
+    SQLite (WAL mode) store of created opportunities, shared by all workers.
+
+    Each row keeps the opportunity JSON plus the columns it is looked up by,
+    each with its own index: account name and key contact (case-insensitive),
+    created time, and the source email and conversation. Lists are ordered
+    newest first and paged by (created_at, oid), so every filter is an index
+    range scan however many opportunities there are.
+
+    An idempotency key, when given, is unique: creating again with the same
+    key returns the opportunity created the first time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS opportunities (
+                    oid TEXT PRIMARY KEY,
+                    idempotency_key TEXT UNIQUE,
+                    created_at REAL NOT NULL,
+                    account_name TEXT COLLATE NOCASE,
+                    key_contact TEXT COLLATE NOCASE,
+                    source_message_id TEXT,
+                    conversation_id TEXT,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS opportunities_created ON opportunities(created_at, oid);
+                CREATE INDEX IF NOT EXISTS opportunities_account ON opportunities(account_name, created_at, oid);
+                CREATE INDEX IF NOT EXISTS opportunities_contact ON opportunities(key_contact, created_at, oid);
+                CREATE INDEX IF NOT EXISTS opportunities_message ON opportunities(source_message_id, created_at, oid);
+                CREATE INDEX IF NOT EXISTS opportunities_conversation ON opportunities(conversation_id, created_at, oid);
+            """)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, data: Dict[str, Any], idempotency_key: Optional[str]) -> Dict[str, Any]:
+        created_at = time.time()
+        for _ in range(5):
+            oid = new_oid()
+            record = {
+                **data,
+                "oid": oid,
+                "createdDate": datetime.fromtimestamp(created_at, timezone.utc).isoformat().replace("+00:00", "Z"),
+            }
+            try:
+                conn.execute(
+                    "INSERT INTO opportunities VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        oid,
+                        idempotency_key,
+                        created_at,
+                        data.get("accountName"),
+                        data.get("keyContact"),
+                        data.get("sourceMessageId"),
+                        data.get("conversationId"),
+                        json.dumps(record),
+                    )
+                )
+                return record
+            except sqlite3.IntegrityError:
+                # Only a clashing random oid gets here; the key was checked first
+                continue
+        raise RuntimeError("Could not allocate an opportunity id")
+
+    def create_many(self, items: List[Tuple[Dict[str, Any], Optional[str]]]) -> List[Tuple[Dict[str, Any], bool]]:
+        """
+        Creates opportunities from (data, idempotency key) pairs in one
+        transaction. Keys already used (also earlier in the same batch) return
+        the existing opportunity instead.
+
+        Returns:
+            (opportunity, created) per item, in order
+        """
+        results = []
+        with self._lock:
+            conn = self._db()
+            # IMMEDIATE takes the write lock up front, so another worker cannot
+            # insert the same key between the lookup and the insert
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for data, idempotency_key in items:
+                    row = conn.execute(
+                        "SELECT data FROM opportunities WHERE idempotency_key = ?", (idempotency_key,)
+                    ).fetchone() if idempotency_key else None
+                    if row:
+                        results.append((json.loads(row[0]), False))
+                    else:
+                        results.append((self._insert(conn, data, idempotency_key), True))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return results
+
+    def get(self, oid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db().execute("SELECT data FROM opportunities WHERE oid = ?", (oid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query_page(
+        self,
+        limit: int = 50,
+        after: Optional[List[Any]] = None,
+        account_name: Optional[str] = None,
+        key_contact: Optional[str] = None,
+        created_from: Optional[float] = None,
+        created_before: Optional[float] = None,
+        source_message_id: Optional[str] = None,
+        conversation_id: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[List[Any]]]:
+        """
+        Newest first. Pages continue strictly after the (created_at, oid) key
+        of the previous page's last row.
+
+        Returns:
+            (opportunities, key of the last row or None when there are no more rows)
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+        if account_name:
+            clauses.append("account_name = ?")
+            params.append(account_name)
+        if key_contact:
+            clauses.append("key_contact = ?")
+            params.append(key_contact)
+        if source_message_id:
+            clauses.append("source_message_id = ?")
+            params.append(source_message_id)
+        if conversation_id:
+            clauses.append("conversation_id = ?")
+            params.append(conversation_id)
+        if created_from is not None:
+            clauses.append("created_at >= ?")
+            params.append(created_from)
+        if created_before is not None:
+            clauses.append("created_at < ?")
+            params.append(created_before)
+        if after:
+            clauses.append("(created_at, oid) < (?, ?)")
+            params.extend(after)
+
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        # One extra row tells whether another page exists
+        sql = f"SELECT created_at, oid, data FROM opportunities {where}ORDER BY created_at DESC, oid DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._db().execute(sql, params).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        last = [rows[-1][0], rows[-1][1]] if more else None
+        return [json.loads(row[2]) for row in rows], last
+
+
+opportunity_store = OpportunityStore(settings.OPPORTUNITY_STORE_PATH)
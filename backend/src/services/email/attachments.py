@@ -0,0 +1,69 @@
+import mimetypes
+import re
+from typing import AsyncIterator, Optional, Tuple
+from urllib.parse import quote
+
+# Attachment properties without the base64 `contentBytes`
+ATTACHMENT_METADATA_SELECT = "id,name,contentType,size,isInline"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header cannot be served for the resource size."""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Resolves a single `bytes=` range against a resource of `size` bytes.
+
+    Returns:
+        Inclusive (start, end) offsets, or None to serve the whole resource
+        (no header, or a multi-range/malformed header, which RFC 9110 lets
+        servers ignore)
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+
+    first, last = match.group(1), match.group(2)
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or (last and int(last) < start):
+            raise RangeNotSatisfiable(header)
+    else:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        start, end = max(size - length, 0), size - 1
+    return start, end
+
+
+async def slice_stream(chunks: AsyncIterator[bytes], start: int, end: int) -> AsyncIterator[bytes]:
+    """Yields only bytes [start, end] of a stream, without buffering it."""
+    offset = 0
+    async for chunk in chunks:
+        chunk_end = offset + len(chunk)
+        if chunk_end > start:
+            yield chunk[max(start - offset, 0):end + 1 - offset]
+        offset = chunk_end
+        if offset > end:
+            break
+
+
+def content_type_for(name: Optional[str], content_type: Optional[str]) -> str:
+    if content_type and "/" in content_type:
+        return content_type
+    guessed, _ = mimetypes.guess_type(name or "")
+    return guessed or "application/octet-stream"
+
+
+def content_disposition(filename: Optional[str], disposition: str = "attachment") -> str:
+    """Builds a Content-Disposition value with an ASCII fallback and an RFC 5987 UTF-8 name."""
+    filename = filename or "attachment"
+    fallback = filename.encode("ascii", "ignore").decode().replace('"', "").replace("\\", "") or "attachment"
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
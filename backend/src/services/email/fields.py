@@ -0,0 +1,62 @@
+from typing import Any, Dict, List, Optional
+
+from src.services.email.attachments import ATTACHMENT_METADATA_SELECT
+
+# Message properties a list projection may ask for (the EmailResponse aliases)
+MESSAGE_FIELDS = (
+    "subject", "bodyPreview", "body", "from", "toRecipients", "ccRecipients",
+    "receivedDateTime", "sentDateTime", "isRead", "isDraft", "importance",
+    "hasAttachments", "attachments", "conversationId", "webLink",
+)
+
+# Everything EmailResponse needs except the body, for include_body=false listings
+NON_BODY_FIELDS = tuple(field for field in MESSAGE_FIELDS if field not in ("body", "attachments"))
+
+# What an inbox list row shows
+DEFAULT_LIST_FIELDS = (
+    "subject", "bodyPreview", "from", "receivedDateTime", "isRead", "hasAttachments", "importance", "conversationId",
+)
+
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """
+    Parses a `fields` query parameter ("subject,from,isRead"). "default"
+    expands to DEFAULT_LIST_FIELDS; `id` is always returned and may be omitted.
+
+    Returns:
+        The requested fields in MESSAGE_FIELDS order, or None when no projection was asked for
+
+    Raises:
+        ValueError: For unknown field names
+    """
+    if value is None:
+        return None
+    requested = set()
+    for name in value.split(","):
+        name = name.strip()
+        if not name or name == "id":
+            continue
+        if name == "default":
+            requested.update(DEFAULT_LIST_FIELDS)
+        elif name in MESSAGE_FIELDS:
+            requested.add(name)
+        else:
+            raise ValueError(f"Unknown field '{name}'. Allowed: id, default, {', '.join(MESSAGE_FIELDS)}")
+    return [field for field in MESSAGE_FIELDS if field in requested]
+
+
+def graph_projection(fields: List[str]) -> Dict[str, str]:
+    """`$select`/`$expand` query parameters for a projection."""
+    params = {"$select": ",".join(["id"] + [field for field in fields if field != "attachments"])}
+    if "attachments" in fields:
+        params["$expand"] = f"attachments($select={ATTACHMENT_METADATA_SELECT})"
+    return params
+
+
+def project(message: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Keeps `id` and the requested fields that the message has."""
+    projected = {"id": message.get("id")}
+    for field in fields:
+        if field in message:
+            projected[field] = message[field]
+    return projected
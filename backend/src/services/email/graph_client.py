@@ -0,0 +1,271 @@
+import asyncio
+import httpx
+from typing import Optional, Dict, Any, List
+from src.core.config import settings
+from src.core.tracing import span
+
+# Graph accepts at most 20 sub-requests per JSON batch
+GRAPH_BATCH_LIMIT = 20
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GraphClient:
+    """
+    Shared async transport for Microsoft Graph.
+
+    A single httpx.AsyncClient is reused for every call so TLS connections are
+    kept alive and pooled (and multiplexed over HTTP/2 when enabled) instead of
+    being re-established per request.
+    """
+
+    def __init__(self, base_url: str = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = (base_url or settings.GRAPH_API_BASE_URL).rstrip("/")
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.GRAPH_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GRAPH_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.GRAPH_KEEPALIVE_EXPIRY_SECONDS
+        )
+        timeout = httpx.Timeout(
+            settings.GRAPH_TIMEOUT_SECONDS,
+            connect=settings.GRAPH_CONNECT_TIMEOUT_SECONDS
+        )
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=settings.GRAPH_HTTP2,
+            limits=limits,
+            timeout=timeout,
+            transport=self._transport
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the client binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    def url(self, path: str) -> str:
+        """Resolve a Graph path (e.g. '/me/messages') or pass through an absolute URL."""
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        token: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> httpx.Response:
+        request_headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        if headers:
+            request_headers.update(headers)
+
+        url = self.url(path)
+        with span("graph", method=method, path=httpx.URL(url).path) as s:
+            response = await self.client.request(
+                method,
+                url,
+                params=params,
+                json=json,
+                headers=request_headers
+            )
+            if s:
+                s.set(status_code=response.status_code)
+            return response
+
+    async def stream(
+        self,
+        path: str,
+        token: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> httpx.Response:
+        """
+        Sends a GET without reading the body, for large binary downloads.
+        The caller must `aclose()` the returned response.
+        """
+        request_headers = {"Authorization": f"Bearer {token}"}
+        if headers:
+            request_headers.update(headers)
+
+        request = self.client.build_request("GET", self.url(path), params=params, headers=request_headers)
+        # Covers time to response headers; the body is read by the caller
+        with span("graph.stream", method="GET", path=request.url.path) as s:
+            response = await self.client.send(request, stream=True)
+            if s:
+                s.set(status_code=response.status_code)
+            return response
+
+    async def get(self, path: str, token: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, token, **kwargs)
+
+    async def post(self, path: str, token: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, token, **kwargs)
+
+    async def patch(self, path: str, token: str, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", path, token, **kwargs)
+
+    async def delete(self, path: str, token: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", path, token, **kwargs)
+
+    @staticmethod
+    def chunk_batch_requests(requests: List[Dict[str, Any]], limit: int = GRAPH_BATCH_LIMIT) -> List[List[Dict[str, Any]]]:
+        """
+        Packs sub-requests into batches of at most `limit`.
+
+        Requests linked through `dependsOn` must travel in the same batch, so
+        dependency chains are grouped first and each group is placed whole,
+        preserving the original order within the group.
+        """
+        ids = [r["id"] for r in requests]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Batch sub-request ids must be unique")
+
+        parent = {request_id: request_id for request_id in ids}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for r in requests:
+            for dep in r.get("dependsOn", []):
+                if dep not in parent:
+                    raise ValueError(f"Sub-request {r['id']} depends on unknown id {dep}")
+                parent[find(r["id"])] = find(dep)
+
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for r in requests:
+            groups.setdefault(find(r["id"]), []).append(r)
+
+        chunks: List[List[Dict[str, Any]]] = []
+        for group in groups.values():
+            if len(group) > limit:
+                raise ValueError(f"A dependsOn chain cannot exceed {limit} sub-requests")
+            for chunk in chunks:
+                if len(chunk) + len(group) <= limit:
+                    chunk.extend(group)
+                    break
+            else:
+                chunks.append(list(group))
+        return chunks
+
+    @staticmethod
+    def retry_delay(headers: Dict[str, Any], attempt: int) -> float:
+        """Seconds to wait before retrying a throttled call: Graph's Retry-After, else exponential backoff."""
+        retry_after = None
+        for key, value in (headers or {}).items():
+            if key.lower() == "retry-after":
+                retry_after = value
+        try:
+            return min(float(retry_after), settings.GRAPH_BATCH_MAX_RETRY_DELAY_SECONDS)
+        except (TypeError, ValueError):
+            return min(0.5 * (2 ** attempt), settings.GRAPH_BATCH_MAX_RETRY_DELAY_SECONDS)
+
+    async def _send_batch(self, token: str, requests: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        with span("graph.batch", size=len(requests)) as s:
+            for attempt in range(settings.GRAPH_BATCH_MAX_RETRIES + 1):
+                response = await self.post("/$batch", token, json={"requests": requests})
+                if response.status_code not in RETRYABLE_STATUSES or attempt == settings.GRAPH_BATCH_MAX_RETRIES:
+                    break
+                await asyncio.sleep(self.retry_delay(dict(response.headers), attempt))
+            if s:
+                s.set(attempts=attempt + 1)
+        response.raise_for_status()
+        return {item["id"]: item for item in response.json().get("responses", [])}
+
+    async def _run_chunk(self, token: str, chunk: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = chunk
+
+        for attempt in range(settings.GRAPH_BATCH_MAX_RETRIES + 1):
+            responses = await self._send_batch(token, pending)
+            results.update(responses)
+
+            # Throttled or transiently failed items are retried, along with dependants
+            # that failed with 424 because one of those items failed
+            retry_ids = {
+                request_id for request_id, item in responses.items()
+                if item.get("status") in RETRYABLE_STATUSES
+            }
+            changed = bool(retry_ids)
+            while changed:
+                changed = False
+                for r in pending:
+                    if (r["id"] not in retry_ids
+                            and responses.get(r["id"], {}).get("status") == 424
+                            and any(dep in retry_ids for dep in r.get("dependsOn", []))):
+                        retry_ids.add(r["id"])
+                        changed = True
+
+            if not retry_ids or attempt == settings.GRAPH_BATCH_MAX_RETRIES:
+                break
+
+            delay = max(
+                self.retry_delay(responses[request_id].get("headers"), attempt)
+                for request_id in retry_ids
+            )
+            await asyncio.sleep(delay)
+
+            pending = []
+            for r in chunk:
+                if r["id"] in retry_ids:
+                    retried = dict(r)
+                    deps = [dep for dep in r.get("dependsOn", []) if dep in retry_ids]
+                    if deps:
+                        retried["dependsOn"] = deps
+                    else:
+                        retried.pop("dependsOn", None)
+                    pending.append(retried)
+
+        return results
+
+    async def batch(self, token: str, requests: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Executes sub-requests through Graph's JSON `/$batch` endpoint.
+
+        Args:
+            token: Access token
+            requests: Sub-requests with unique 'id', 'method', relative 'url' and
+                      optional 'body', 'headers' and 'dependsOn'
+
+        Returns:
+            Dict mapping sub-request id to its response ({'status', 'headers', 'body'})
+        """
+        if not requests:
+            return {}
+
+        for r in requests:
+            if "body" in r:
+                r.setdefault("headers", {}).setdefault("Content-Type", "application/json")
+
+        semaphore = asyncio.Semaphore(settings.GRAPH_BATCH_CONCURRENCY)
+
+        async def run(chunk):
+            async with semaphore:
+                return await self._run_chunk(token, chunk)
+
+        chunk_results = await asyncio.gather(*(run(chunk) for chunk in self.chunk_batch_requests(requests)))
+        results: Dict[str, Dict[str, Any]] = {}
+        for chunk_result in chunk_results:
+            results.update(chunk_result)
+        return results
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+graph_client = GraphClient()
@@ -0,0 +1,47 @@
+import base64
+import json
+from typing import Any, Dict
+
+from src.core.config import settings
+
+CURSOR_VERSION = 1
+
+
+class InvalidCursor(ValueError):
+    """Raised for cursors that are malformed, from another version or point outside Graph."""
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """
+    Opaque page cursor. `state` holds either a Graph `@odata.nextLink`
+    ({"next": url}; a first Graph page also carries {"params": {...}}) or a
+    position in the local store together with the query it belongs to
+    ({"query": {...}, "after": [...]}).
+    """
+    payload = json.dumps({"v": CURSOR_VERSION, **state}, separators=(",", ":"), sort_keys=True)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(state, dict) or state.pop("v", None) != CURSOR_VERSION:
+        raise InvalidCursor("Unsupported cursor version")
+
+    next_link = state.get("next")
+    if next_link is not None:
+        # The access token is sent to this URL, so it must stay on Graph
+        base = settings.GRAPH_API_BASE_URL.rstrip("/") + "/"
+        if not isinstance(next_link, str) or not next_link.startswith(base):
+            raise InvalidCursor("Cursor does not point to Microsoft Graph")
+        params = state.get("params")
+        if params is not None and not (
+            isinstance(params, dict) and all(isinstance(value, (str, int)) for value in params.values())
+        ):
+            raise InvalidCursor("Malformed cursor")
+    elif not isinstance(state.get("query"), dict):
+        raise InvalidCursor("Malformed cursor")
+    return state
@@ -1,38 +1,69 @@
 import msal
-import requests
 import uuid
-import json
-import os
-from typing import List, Optional, Dict, Any
+import time
+import asyncio
+import logging
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
 from datetime import datetime, timedelta, date
 from src.core.config import settings
+from src.core.tracing import span
+from src.services.email.graph_client import graph_client, RETRYABLE_STATUSES
+from src.services.email.store import message_store, parse_order_by
+from src.services.email.pagination import InvalidCursor, encode_cursor, decode_cursor
+from src.services.email.fields import MESSAGE_FIELDS, NON_BODY_FIELDS, graph_projection, project
+from src.services.email.sync import mail_sync
+from src.services.email.session_store import session_store
+from src.services.email.attachments import (
+    ATTACHMENT_METADATA_SELECT, RangeNotSatisfiable, parse_range, slice_stream,
+    content_type_for, content_disposition
+)
 from src.schemas.email import (
     SendEmailRequest, SimpleSendEmailRequest, ReplyEmailRequest, 
     ForwardEmailRequest, AttachmentInput
 )
 
-# Token persistence
-TOKEN_FILE = "tokens.json"
+logger = logging.getLogger(__name__)
 
-def load_tokens():
-    if os.path.exists(TOKEN_FILE):
-        try:
-            with open(TOKEN_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
-
-def save_tokens():
-    try:
-        with open(TOKEN_FILE, 'w') as f:
-            json.dump(TOKENS, f)
-    except Exception as e:
-        print(f"Error saving tokens: {e}")
-
-# In-memory storage for demonstration purposes
-# In production, use Redis or a database
-TOKENS = load_tokens() # session_id -> token_dict (containing access_token)
+# Asks Graph to return message bodies as plain text instead of HTML
+TEXT_BODY_PREFERENCE = 'outlook.body-content-type="text"'
+
+# The arguments a store cursor's query carries (see EmailService._store_query) and their types
+STORE_QUERY_TYPES = {
+    "folder": (str,),
+    "search": (str, type(None)),
+    "received_from": (str, type(None)),
+    "received_before": (str, type(None)),
+    "unread_only": (bool,),
+    "has_attachments": (bool, type(None)),
+    "from_address": (str, type(None)),
+    "order_by": (str,),
+    "include_body": (bool,),
+    "fields": (list, type(None)),
+}
+
+def date_range(date_filter: Optional[str]) -> Tuple[Optional[date], Optional[date]]:
+    """Resolves a named date filter to a [start, end) range of received dates."""
+    today = datetime.now().date()
+    
+    if date_filter == "today":
+        return today, None
+    if date_filter == "yesterday":
+        return today - timedelta(days=1), today
+    if date_filter == "this_week":
+        # Monday of this week
+        return today - timedelta(days=today.weekday()), None
+    if date_filter == "last_week":
+        return today - timedelta(days=today.weekday() + 7), today - timedelta(days=today.weekday())
+    if date_filter == "this_month":
+        return today.replace(day=1), None
+    if date_filter == "last_month":
+        first_of_month = today.replace(day=1)
+        return (first_of_month - timedelta(days=1)).replace(day=1), first_of_month
+    if date_filter == "last_7_days":
+        return today - timedelta(days=7), None
+    if date_filter == "last_30_days":
+        return today - timedelta(days=30), None
+    return None, None
 
 class EmailService:
     def __init__(self):
@@ -42,13 +73,40 @@ class EmailService:
         self.scopes = settings.SCOPES
         self.redirect_uri = settings.MS_REDIRECT_URI
         self.graph_url = settings.GRAPH_API_BASE_URL
+        self.graph = graph_client
+        self.store = message_store
+        self.sync = mail_sync
+        self.sessions = session_store # session_id -> token_dict (containing access_token)
         
-        self.app = msal.ConfidentialClientApplication(
+        # Shared MSAL HTTP cache so per-session apps reuse authority discovery
+        self._msal_http_cache: Dict[str, Any] = {}
+        self._app: Optional[msal.ConfidentialClientApplication] = None
+        # session_id -> in-flight refresh task (single-flight per session)
+        self._refreshes: Dict[str, asyncio.Task] = {}
+
+    def _build_app(self, token_cache: Optional[msal.SerializableTokenCache] = None) -> msal.ConfidentialClientApplication:
+        return msal.ConfidentialClientApplication(
             self.client_id,
             authority=self.authority,
-            client_credential=self.client_secret
+            client_credential=self.client_secret,
+            token_cache=token_cache,
+            http_cache=self._msal_http_cache
         )
 
+    @property
+    def app(self) -> msal.ConfidentialClientApplication:
+        # Built lazily: constructing the app performs authority discovery over the network
+        if self._app is None:
+            self._app = self._build_app()
+        return self._app
+
+    @staticmethod
+    def _session_record(result: Dict[str, Any], token_cache: msal.SerializableTokenCache) -> Dict[str, Any]:
+        record = dict(result)
+        record["expires_at"] = time.time() + float(result.get("expires_in", 0))
+        record["msal_cache"] = token_cache.serialize()
+        return record
+
     def initiate_auth(self) -> Dict[str, Any]:
         """Start the authorization code flow."""
         session_id = str(uuid.uuid4())
@@ -64,20 +122,25 @@ class EmailService:
             "session_id": session_id
         }
 
-    def complete_auth(self, code: str, session_id: str) -> Dict[str, Any]:
+    async def complete_auth(self, code: str, session_id: str) -> Dict[str, Any]:
         """Exchange the auth code for a token."""
-        result = self.app.acquire_token_by_authorization_code(
+        # Each session gets its own MSAL token cache so refresh tokens can be used later
+        token_cache = msal.SerializableTokenCache()
+        app = await asyncio.to_thread(self._build_app, token_cache)
+        
+        # MSAL is synchronous, keep the token exchange off the event loop
+        result = await asyncio.to_thread(
+            app.acquire_token_by_authorization_code,
             code,
             scopes=self.scopes,
             redirect_uri=self.redirect_uri
         )
         
         if "access_token" in result:
-            TOKENS[session_id] = result
-            save_tokens()
+            await asyncio.to_thread(self.sessions.set, session_id, self._session_record(result, token_cache))
             
             # Get user info to return email
-            user_info = self.get_user_profile(session_id)
+            user_info = await self.get_user_profile(session_id)
             return {
                 "is_authenticated": True,
                 "user_email": user_info.get("mail") or user_info.get("userPrincipalName"),
@@ -90,64 +153,130 @@ class EmailService:
                 "message": f"Authentication failed: {error_desc}"
             }
 
-    def get_token(self, session_id: str) -> str:
-        token_data = TOKENS.get(session_id)
+    def _acquire_refreshed_token(self, token_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Runs the MSAL refresh for one session (blocking; called in a worker thread)."""
+        token_cache = msal.SerializableTokenCache()
+        if token_data.get("msal_cache"):
+            token_cache.deserialize(token_data["msal_cache"])
+        app = self._build_app(token_cache)
+        
+        result = None
+        accounts = app.get_accounts()
+        if accounts:
+            result = app.acquire_token_silent_with_error(self.scopes, account=accounts[0], force_refresh=True)
+        if not result and token_data.get("refresh_token"):
+            # Sessions stored before the MSAL cache was persisted only have the raw refresh token
+            result = app.acquire_token_by_refresh_token(token_data["refresh_token"], scopes=self.scopes)
+        if not result:
+            return {"error": "no_refresh_token", "error_description": "Session cannot be refreshed"}
+        if "access_token" in result:
+            return self._session_record(result, token_cache)
+        return result
+
+    async def _refresh_token(self, session_id: str) -> str:
+        token_data = self.sessions.get(session_id)
         if not token_data:
             raise ValueError("Session not authenticated")
         
-        # In a real app, check expiration and refresh if needed
-        # MSAL's acquire_token_silent handles cache and refresh automatically if we use the cache
-        # Since we are storing the token dict, we can try to refresh if expired
-        # but for this simple POC, we'll return the access token.
+        # Another worker may already have refreshed this session
+        if token_data.get("expires_at", 0) - time.time() > settings.TOKEN_REFRESH_AHEAD_SECONDS:
+            return token_data["access_token"]
+        
+        result = await asyncio.to_thread(self._acquire_refreshed_token, token_data)
+        if "access_token" not in result:
+            error_desc = result.get("error_description") or result.get("error") or "Unknown error"
+            logger.warning(f"Token refresh failed for session {session_id}: {error_desc}")
+            if result.get("error") in ("invalid_grant", "interaction_required", "no_refresh_token"):
+                raise ValueError(f"Session expired: {error_desc}")
+            raise Exception(f"Token refresh failed: {error_desc}")
         
-        return token_data["access_token"]
+        await asyncio.to_thread(self.sessions.set, session_id, result)
+        return result["access_token"]
 
-    def _get_headers(self, session_id: str) -> Dict[str, str]:
-        token = self.get_token(session_id)
-        return {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
+    def _start_refresh(self, session_id: str) -> asyncio.Task:
+        """Returns the in-flight refresh for a session, starting one if needed."""
+        task = self._refreshes.get(session_id)
+        if task is None or task.done():
+            task = asyncio.create_task(self._refresh_token(session_id))
+            self._refreshes[session_id] = task
+            task.add_done_callback(lambda t: self._finish_refresh(session_id, t))
+        return task
+
+    def _finish_refresh(self, session_id: str, task: asyncio.Task):
+        if self._refreshes.get(session_id) is task:
+            del self._refreshes[session_id]
+        # Mark the failure as retrieved; it was already logged and callers that awaited saw it
+        if not task.cancelled():
+            task.exception()
+
+    async def get_token(self, session_id: str) -> str:
+        """
+        Returns a usable access token for the session.
 
-    def get_user_profile(self, session_id: str) -> Dict[str, Any]:
-        headers = self._get_headers(session_id)
-        resp = requests.get(f"{self.graph_url}/me", headers=headers)
+        Tokens close to expiry are refreshed in the background while the
+        current one is still returned; expired tokens are refreshed inline.
+        Concurrent callers for the same session share a single refresh.
+        """
+        token_data = self.sessions.get(session_id)
+        if not token_data:
+            raise ValueError("Session not authenticated")
+        
+        # Sessions stored without an expiry are refreshed once on first use
+        remaining = token_data.get("expires_at", 0) - time.time()
+        if remaining > settings.TOKEN_REFRESH_AHEAD_SECONDS:
+            return token_data["access_token"]
+        
+        task = self._start_refresh(session_id)
+        if remaining > settings.TOKEN_MIN_VALIDITY_SECONDS:
+            return token_data["access_token"]
+        # Shield so one caller going away doesn't cancel the refresh for the others
+        with span("auth.token_refresh"):
+            return await asyncio.shield(task)
+
+    async def get_user_profile(self, session_id: str) -> Dict[str, Any]:
+        token = await self.get_token(session_id)
+        resp = await self.graph.get("/me", token)
         resp.raise_for_status()
         return resp.json()
 
     def logout(self, session_id: str):
-        if session_id in TOKENS:
-            del TOKENS[session_id]
-            save_tokens()
+        self.sessions.delete(session_id)
+        # Drop the locally synced copy of the mailbox
+        self.sync.forget_session(session_id)
 
-    def get_emails(
-        self, 
-        session_id: str,
-        folder: str = "inbox",
-        limit: int = 25,
-        skip: int = 0,
-        search: Optional[str] = None,
-        date_filter: Optional[str] = None,
-        unread_only: bool = False,
-        has_attachments: Optional[bool] = None,
-        from_address: Optional[str] = None,
-        order_by: str = "receivedDateTime desc",
-        include_body: bool = True
-    ) -> Dict[str, Any]:
-        
-        headers = self._get_headers(session_id)
-        endpoint = f"{self.graph_url}/me/mailFolders/{folder}/messages"
+    def _graph_list_request(
+        self,
+        folder: str,
+        limit: int,
+        skip: int,
+        search: Optional[str],
+        start: Optional[date],
+        end: Optional[date],
+        unread_only: bool,
+        has_attachments: Optional[bool],
+        from_address: Optional[str],
+        order_by: str,
+        include_body: bool,
+        fields: Optional[List[str]] = None,
+        received_before: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        endpoint = f"/me/mailFolders/{folder}/messages"
         
         # Build query params
         params = {
             "$top": limit,
-            "$skip": skip,
             "$orderby": order_by,
-            "$expand": "attachments($select=id,name,contentType,size,isInline)"
+            "$expand": f"attachments($select={ATTACHMENT_METADATA_SELECT})"
         }
+        if skip:
+            params["$skip"] = skip
         
-        if not include_body:
-            params["$select"] = "subject,receivedDateTime,from,isRead,hasAttachments,importance"
+        if fields is not None:
+            # Only what the caller projected; attachments are expanded only when asked for
+            del params["$expand"]
+            params.update(graph_projection(fields))
+        elif not include_body:
+            params["$select"] = ",".join(("id",) + NON_BODY_FIELDS)
 
         filters = []
         
@@ -161,25 +290,12 @@ class EmailService:
             filters.append(f"from/emailAddress/address eq '{from_address}'")
             
         # Date filters
-        now = datetime.now()
-        today = now.date()
-        
-        if date_filter == "today":
-            filters.append(f"receivedDateTime ge {today.isoformat()}")
-        elif date_filter == "yesterday":
-            yesterday = today - timedelta(days=1)
-            filters.append(f"receivedDateTime ge {yesterday.isoformat()} and receivedDateTime lt {today.isoformat()}")
-        elif date_filter == "this_week":
-            # Monday of this week
-            start = today - timedelta(days=today.weekday())
+        if start:
             filters.append(f"receivedDateTime ge {start.isoformat()}")
-        elif date_filter == "last_week":
-            start = today - timedelta(days=today.weekday() + 7)
-            end = today - timedelta(days=today.weekday())
-            filters.append(f"receivedDateTime ge {start.isoformat()} and receivedDateTime lt {end.isoformat()}")
-        elif date_filter == "last_7_days":
-             start = today - timedelta(days=7)
-             filters.append(f"receivedDateTime ge {start.isoformat()}")
+        if end:
+            filters.append(f"receivedDateTime lt {end.isoformat()}")
+        if received_before:
+            filters.append(f"receivedDateTime lt {received_before}")
 
         if filters:
             params["$filter"] = " and ".join(filters)
@@ -187,30 +303,552 @@ class EmailService:
         if search:
             params["$search"] = f'"{search}"'
 
-        response = requests.get(endpoint, headers=headers, params=params)
-        if response.status_code != 200:
-            raise Exception(f"Error fetching emails: {response.text}")
-            
-        data = response.json()
+        return endpoint, params
+
+    @staticmethod
+    def _store_query(
+        folder: str,
+        search: Optional[str],
+        start: Optional[date],
+        end: Optional[date],
+        unread_only: bool,
+        has_attachments: Optional[bool],
+        from_address: Optional[str],
+        order_by: str,
+        include_body: bool,
+        fields: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Local store query arguments; also what a store cursor carries between pages."""
         return {
-            "emails": data.get("value", []),
-            "count": len(data.get("value", []))
+            "folder": folder,
+            "search": search,
+            "received_from": start.isoformat() if start else None,
+            "received_before": end.isoformat() if end else None,
+            "unread_only": unread_only,
+            "has_attachments": has_attachments,
+            "from_address": from_address,
+            "order_by": order_by,
+            "include_body": include_body,
+            "fields": fields,
         }
 
-    def get_email(self, session_id: str, email_id: str) -> Dict[str, Any]:
-        headers = self._get_headers(session_id)
-        response = requests.get(f"{self.graph_url}/me/messages/{email_id}", headers=headers)
+    @staticmethod
+    def _check_cursor(state: Dict[str, Any]):
+        """Rejects a decoded cursor that get_emails did not write (stale or forged)."""
+        query = state.get("query")
+        fields = state.get("fields") if query is None else query.get("fields")
+        if fields is not None and not (isinstance(fields, list) and set(fields) <= set(MESSAGE_FIELDS)):
+            raise InvalidCursor("Not an email list cursor")
+        if query is None:
+            return
+        after, offset = state.get("after"), state.get("offset")
+        if (
+            set(query) != set(STORE_QUERY_TYPES)
+            or not all(isinstance(query[key], types) for key, types in STORE_QUERY_TYPES.items())
+            or not parse_order_by(query["order_by"])
+            or (after is not None and not (isinstance(after, list) and len(after) == 2 and all(isinstance(v, str) for v in after)))
+            or (offset is not None and (isinstance(offset, bool) or not isinstance(offset, int) or offset < 0))
+            or (after is not None and offset is not None)
+        ):
+            raise InvalidCursor("Not an email list cursor")
+
+    async def _store_page(
+        self, session_id: str, query: Dict[str, Any], limit: int, skip: int = 0, after: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        One page from the local store and the cursor state for the next one.
+        Ranked search results page by offset, everything else by key. Bodies,
+        when the query shows them, are fetched from Graph.
+        """
+        if query.get("search"):
+            emails = await asyncio.to_thread(self.store.query, session_id, limit=limit, skip=skip, **query)
+            next_state = {"query": query, "offset": skip + limit} if len(emails) == limit else None
+        else:
+            store_query = {key: value for key, value in query.items() if key != "search"}
+            emails, next_after = await asyncio.to_thread(
+                self.store.query_page, session_id, limit=limit, skip=skip, after=after, **store_query
+            )
+            next_state = {"query": query, "after": next_after} if next_after else None
+        await self._fill_bodies(session_id, query, emails)
+        return emails, next_state
+
+    async def _fill_bodies(self, session_id: str, query: Dict[str, Any], emails: List[Dict[str, Any]]):
+        """The sync does not store bodies; store pages that show them fetch them in $batch calls."""
+        fields = query.get("fields")
+        if not (query["include_body"] if fields is None else "body" in fields):
+            return
+        missing = [email["id"] for email in emails if "body" not in email]
+        if not missing:
+            return
+        responses = await self._batch_by_id(
+            session_id, missing, lambda email_id: {"method": "GET", "url": f"/me/messages/{email_id}?$select=body"}
+        )
+        bodies = {}
+        for email_id, item in responses.items():
+            if item is not None and item.get("status") == 200:
+                bodies[email_id] = (item.get("body") or {}).get("body")
+            elif item is None or item.get("status") != 404:
+                raise Exception(f"Error fetching email {email_id}: {self._batch_outcome(item).get('error')}")
+        for email in emails:
+            if email["id"] in bodies:
+                email["body"] = bodies[email["id"]]
+
+    @staticmethod
+    def _store_covers(query: Dict[str, Any], synced_from: Optional[str]) -> bool:
+        """Whether everything a store query can match was received inside the synced window."""
+        received_from = query.get("received_from")
+        if not (synced_from and received_from):
+            return False
+        if "T" not in received_from:
+            received_from += "T00:00:00Z"
+        return received_from >= synced_from
+
+    @staticmethod
+    def _continues_in_graph(query: Dict[str, Any], synced_from: Optional[str]) -> bool:
+        """
+        Newest-first listings without search can start in the store and go on
+        with the older mail from Graph; other orders and ranked search cannot.
+        """
+        return bool(synced_from) and not query.get("search") and parse_order_by(query["order_by"]) == ("received_at", "DESC")
+
+    def _older_mail_state(self, query: Dict[str, Any], limit: int, synced_from: str) -> Dict[str, Any]:
+        """Cursor state for the query's mail received before the synced window, read from Graph."""
+        endpoint, params = self._graph_list_request(
+            query["folder"], limit, 0, None,
+            date.fromisoformat(query["received_from"]) if query.get("received_from") else None,
+            date.fromisoformat(query["received_before"]) if query.get("received_before") else None,
+            query["unread_only"], query["has_attachments"], query["from_address"], query["order_by"],
+            query["include_body"], query.get("fields"), received_before=synced_from
+        )
+        return {"next": self.graph.url(endpoint), "params": params, "fields": query.get("fields")}
+
+    async def _windowed_store_page(
+        self, session_id: str, query: Dict[str, Any], limit: int, skip: int = 0, after: Optional[List[str]] = None
+    ) -> Optional[Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+        """
+        A store page, as long as the store can answer it: the store only holds
+        mail since the synced window's start (MAIL_SYNC_INITIAL_DAYS at the
+        first sync). Newest-first listings that run out of stored mail continue
+        with a Graph cursor for the older mail.
+
+        Returns:
+            (emails, next cursor state), or None when the page must come from Graph
+        """
+        synced_from = await asyncio.to_thread(self.store.get_synced_from, session_id, query["folder"])
+        if self._store_covers(query, synced_from):
+            return await self._store_page(session_id, query, limit, skip=skip, after=after)
+        if not self._continues_in_graph(query, synced_from):
+            return None
+        emails, next_state = await self._store_page(session_id, query, limit, skip=skip, after=after)
+        if after is None and len(emails) < limit:
+            # Offset pages past the stored mail: the whole page comes from Graph, as $skip counts from the newest
+            return None
+        return emails, next_state or self._older_mail_state(query, limit, synced_from)
+
+    async def _get_graph_page(self, session_id: str, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """GET a list page, retrying throttled and transient failures; long exports hit these."""
+        for attempt in range(settings.GRAPH_BATCH_MAX_RETRIES + 1):
+            token = await self.get_token(session_id)
+            response = await self.graph.get(url, token, params=params)
+            if response.status_code not in RETRYABLE_STATUSES or attempt == settings.GRAPH_BATCH_MAX_RETRIES:
+                break
+            await asyncio.sleep(self.graph.retry_delay(dict(response.headers), attempt))
+        if response.status_code != 200:
+            raise Exception(f"Error fetching emails: {response.text}")
+        return response.json()
+
+    async def get_emails(
+        self, 
+        session_id: str,
+        folder: str = "inbox",
+        limit: int = 25,
+        skip: int = 0,
+        search: Optional[str] = None,
+        date_filter: Optional[str] = None,
+        unread_only: bool = False,
+        has_attachments: Optional[bool] = None,
+        from_address: Optional[str] = None,
+        order_by: str = "receivedDateTime desc",
+        include_body: bool = True,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Lists messages. `next_cursor` in the result is set when more pages
+        exist; passing it back as `cursor` continues the same query (the other
+        filter arguments are then ignored).
+
+        With `fields` (see services/email/fields.py) only those properties are
+        fetched and returned, and the result's `fields` echoes the projection.
+
+        Raises:
+            InvalidCursor: If the cursor cannot be decoded
+        """
+        token = await self.get_token(session_id)
+
+        if cursor:
+            state = decode_cursor(cursor)
+            self._check_cursor(state)
+            if "next" in state:
+                data = await self._get_graph_page(session_id, state["next"], state.get("params"))
+                return self._graph_list_result(data, state.get("fields"))
+            query = state["query"]
+            if settings.MAIL_SYNC_ENABLED:
+                await self.sync.sync(session_id, token, query["folder"])
+            if state.get("offset") is not None:
+                # Ranked search; only ever started when the synced window covers it
+                emails, next_state = await self._store_page(session_id, query, limit, skip=state["offset"])
+            else:
+                page = await self._windowed_store_page(session_id, query, limit, after=state.get("after"))
+                emails, next_state = page if page is not None else await self._store_page(
+                    session_id, query, limit, after=state.get("after")
+                )
+            return self._store_list_result(emails, next_state, query.get("fields"))
+
+        start, end = date_range(date_filter)
+
+        # Serve from the delta-synced local store (and its full-text index) when it holds the mail asked for
+        if settings.MAIL_SYNC_ENABLED and parse_order_by(order_by):
+            await self.sync.sync(session_id, token, folder)
+            query = self._store_query(
+                folder, search, start, end, unread_only, has_attachments, from_address, order_by, include_body, fields
+            )
+            page = await self._windowed_store_page(session_id, query, limit, skip=skip)
+            if page is not None:
+                return self._store_list_result(*page, fields)
+
+        endpoint, params = self._graph_list_request(
+            folder, limit, skip, search, start, end, unread_only, has_attachments, from_address, order_by, include_body, fields
+        )
+        response = await self.graph.get(endpoint, token, params=params)
+        if response.status_code != 200:
+            raise Exception(f"Error fetching emails: {response.text}")
+        return self._graph_list_result(response.json(), fields)
+
+    @staticmethod
+    def _store_list_result(
+        emails: List[Dict[str, Any]], next_state: Optional[Dict[str, Any]], fields: Optional[List[str]]
+    ) -> Dict[str, Any]:
+        result = {"emails": emails, "count": len(emails), "next_cursor": encode_cursor(next_state) if next_state else None}
+        if fields is not None:
+            result["fields"] = fields
+        return result
+
+    @staticmethod
+    def _graph_list_result(data: Dict[str, Any], fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        emails = data.get("value", [])
+        next_link = data.get("@odata.nextLink")
+        next_state = {"next": next_link} if next_link else None
+        result = {"emails": emails, "count": len(emails)}
+        if fields is not None:
+            result["emails"] = [project(email, fields) for email in emails]
+            result["fields"] = fields
+            if next_state:
+                next_state["fields"] = fields
+        result["next_cursor"] = encode_cursor(next_state) if next_state else None
+        return result
+
+    async def export_emails(
+        self,
+        session_id: str,
+        folder: str = "inbox",
+        search: Optional[str] = None,
+        date_filter: Optional[str] = None,
+        unread_only: bool = False,
+        has_attachments: Optional[bool] = None,
+        from_address: Optional[str] = None,
+        order_by: str = "receivedDateTime desc",
+        include_body: bool = False,
+        page_size: Optional[int] = None,
+        fields: Optional[List[str]] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Walks a whole folder (with get_emails filters) and yields it page by page.
+
+        A background task keeps up to EMAIL_EXPORT_PREFETCH_PAGES pages ahead
+        of the consumer, so the next Graph (or store) page is in flight while the
+        current one is being written out. Pages follow `@odata.nextLink` or the
+        local store key, never deep `$skip` offsets.
+        """
+        page_size = min(page_size or settings.EMAIL_EXPORT_PAGE_SIZE, settings.EMAIL_EXPORT_MAX_PAGE_SIZE)
+        token = await self.get_token(session_id)
+        start, end = date_range(date_filter)
+
+        endpoint, params = self._graph_list_request(
+            folder, page_size, 0, search, start, end, unread_only, has_attachments, from_address, order_by,
+            include_body, fields
+        )
+        # Pages come from the store while it holds the mail asked for, then (or otherwise) from Graph
+        first: Dict[str, Any] = {"next": endpoint, "params": params}
+        if settings.MAIL_SYNC_ENABLED and parse_order_by(order_by):
+            await self.sync.sync(session_id, token, folder)
+            query = self._store_query(
+                folder, search, start, end, unread_only, has_attachments, from_address, order_by, include_body, fields
+            )
+            synced_from = await asyncio.to_thread(self.store.get_synced_from, session_id, folder)
+            if self._store_covers(query, synced_from) or self._continues_in_graph(query, synced_from):
+                first = {"query": query}
+
+        async def fetch(state):
+            state = state or first
+            if "query" in state:
+                page = await self._windowed_store_page(
+                    session_id, state["query"], page_size, skip=state.get("offset", 0), after=state.get("after")
+                )
+                if page is not None:
+                    return page
+                state = {"next": endpoint, "params": params}
+            data = await self._get_graph_page(session_id, state["next"], state.get("params"))
+            next_link = data.get("@odata.nextLink")
+            page = data.get("value", [])
+            if fields is not None:
+                page = [project(message, fields) for message in page]
+            return page, ({"next": next_link} if next_link else None)
+
+        pages: asyncio.Queue = asyncio.Queue(maxsize=settings.EMAIL_EXPORT_PREFETCH_PAGES)
+
+        async def produce():
+            try:
+                state = None
+                while True:
+                    page, state = await fetch(state)
+                    await pages.put(page)
+                    if state is None:
+                        break
+                await pages.put(None)
+            except Exception as e:
+                await pages.put(e)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                page = await pages.get()
+                if page is None:
+                    return
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            producer.cancel()
+
+    async def get_email(self, session_id: str, email_id: str, text_body: bool = False) -> Dict[str, Any]:
+        """Fetches one message; with text_body, Graph converts the body to plain text."""
+        token = await self.get_token(session_id)
+        headers = {"Prefer": TEXT_BODY_PREFERENCE} if text_body else None
+        response = await self.graph.get(f"/me/messages/{email_id}", token, headers=headers)
         if response.status_code == 404:
             return None
         response.raise_for_status()
         return response.json()
 
-    def get_email_attachments(self, session_id: str, email_id: str) -> List[Dict[str, Any]]:
-        headers = self._get_headers(session_id)
-        response = requests.get(f"{self.graph_url}/me/messages/{email_id}/attachments", headers=headers)
+    async def get_conversation_messages(
+        self, session_id: str, conversation_id: str, limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Messages of one conversation with plain-text bodies, oldest first."""
+        # Graph rejects $orderby combined with this filter, so the page is sorted here
+        params = {
+            "$filter": f"conversationId eq '{conversation_id.replace(chr(39), chr(39) * 2)}'",
+            "$select": "id,conversationId,subject,body,from,receivedDateTime,hasAttachments",
+            "$top": limit,
+        }
+        token = await self.get_token(session_id)
+        response = await self.graph.get("/me/messages", token, params=params, headers={"Prefer": TEXT_BODY_PREFERENCE})
+        if response.status_code != 200:
+            raise Exception(f"Error fetching conversation: {response.text}")
+        return sorted(response.json().get("value", []), key=lambda m: m.get("receivedDateTime") or "")
+
+    async def get_email_attachments(self, session_id: str, email_id: str) -> List[Dict[str, Any]]:
+        """Attachment metadata only; content is downloaded through open_attachment."""
+        token = await self.get_token(session_id)
+        response = await self.graph.get(
+            f"/me/messages/{email_id}/attachments", token,
+            params={"$select": ATTACHMENT_METADATA_SELECT}
+        )
         response.raise_for_status()
         return response.json().get("value", [])
 
+    async def open_attachment(
+        self,
+        session_id: str,
+        email_id: str,
+        attachment_id: str,
+        range_header: Optional[str] = None,
+        disposition: str = "attachment"
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Opens a streaming download of an attachment's raw bytes (`$value`).
+
+        The Range header is forwarded to Graph; if Graph answers with the full
+        body instead, the requested range is cut out of the stream locally.
+
+        Returns:
+            None if the attachment does not exist, otherwise a dict with
+            'status_code', 'headers', 'body' (async byte iterator) and 'close'
+            (coroutine function releasing the upstream connection)
+
+        Raises:
+            RangeNotSatisfiable: If the range lies outside the attachment
+        """
+        token = await self.get_token(session_id)
+        path = f"/me/messages/{email_id}/attachments/{attachment_id}"
+        meta_response = await self.graph.get(path, token, params={"$select": ATTACHMENT_METADATA_SELECT})
+        if meta_response.status_code == 404:
+            return None
+        meta_response.raise_for_status()
+        metadata = meta_response.json()
+
+        upstream = await self.graph.stream(
+            f"{path}/$value", token,
+            headers={"Range": range_header} if range_header else None
+        )
+        try:
+            if upstream.status_code == 404:
+                await upstream.aclose()
+                return None
+            if upstream.status_code == 416:
+                raise RangeNotSatisfiable(range_header)
+            if upstream.status_code not in (200, 206):
+                await upstream.aread()
+                raise Exception(f"Error downloading attachment: {upstream.text}")
+
+            headers = {
+                "Content-Type": content_type_for(metadata.get("name"), metadata.get("contentType")),
+                "Content-Disposition": content_disposition(metadata.get("name"), disposition),
+                "Accept-Ranges": "bytes",
+                "X-Content-Type-Options": "nosniff"
+            }
+            chunks = upstream.aiter_bytes(settings.ATTACHMENT_STREAM_CHUNK_BYTES)
+            status_code = upstream.status_code
+            length = upstream.headers.get("Content-Length")
+
+            if status_code == 206:
+                headers["Content-Range"] = upstream.headers.get("Content-Range", "")
+            elif range_header and length is not None:
+                byte_range = parse_range(range_header, int(length))
+                if byte_range:
+                    start, end = byte_range
+                    chunks = slice_stream(chunks, start, end)
+                    status_code = 206
+                    headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+                    length = str(end - start + 1)
+            if length is not None:
+                headers["Content-Length"] = length
+        except BaseException:
+            await upstream.aclose()
+            raise
+
+        async def body():
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await upstream.aclose()
+
+        return {"status_code": status_code, "headers": headers, "body": body(), "close": upstream.aclose}
+
+    async def get_attachment_content(
+        self, session_id: str, email_id: str, attachment_id: str, max_bytes: int
+    ) -> Optional[bytes]:
+        """
+        Downloads an attachment's raw bytes.
+
+        Returns:
+            The content, or None if the attachment is missing or larger than max_bytes
+        """
+        token = await self.get_token(session_id)
+        response = await self.graph.stream(f"/me/messages/{email_id}/attachments/{attachment_id}/$value", token)
+        try:
+            if response.status_code == 404:
+                return None
+            if response.status_code != 200:
+                await response.aread()
+                raise Exception(f"Error downloading attachment: {response.text}")
+            content = bytearray()
+            async for chunk in response.aiter_bytes(settings.ATTACHMENT_STREAM_CHUNK_BYTES):
+                content.extend(chunk)
+                if len(content) > max_bytes:
+                    return None
+            return bytes(content)
+        finally:
+            await response.aclose()
+
+    # --- Bulk operations (Graph JSON $batch) ---
+
+    @staticmethod
+    def _batch_outcome(item: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if item is None:
+            return {"success": False, "status": 0, "error": "No response for sub-request"}
+        status = item.get("status", 0)
+        if 200 <= status < 300:
+            return {"success": True, "status": status}
+        error = (item.get("body") or {}).get("error", {}) if isinstance(item.get("body"), dict) else {}
+        return {"success": False, "status": status, "error": error.get("message") or f"HTTP {status}"}
+
+    async def _batch_by_id(self, session_id: str, email_ids: List[str], build) -> Dict[str, Dict[str, Any]]:
+        """Runs one sub-request per email id and maps the responses back to the ids."""
+        token = await self.get_token(session_id)
+        unique_ids = list(dict.fromkeys(email_ids))
+        requests = [dict(build(email_id), id=str(i)) for i, email_id in enumerate(unique_ids)]
+        responses = await self.graph.batch(token, requests)
+        return {email_id: responses.get(str(i)) for i, email_id in enumerate(unique_ids)}
+
+    async def get_emails_by_ids(
+        self, session_id: str, email_ids: List[str], text_body: bool = False
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Fetches many messages in a handful of $batch round trips. Missing messages map to None."""
+        headers = {"Prefer": TEXT_BODY_PREFERENCE} if text_body else None
+        responses = await self._batch_by_id(
+            session_id, email_ids,
+            lambda email_id: dict(
+                {"method": "GET", "url": f"/me/messages/{email_id}"},
+                **({"headers": headers} if headers else {})
+            )
+        )
+        emails = {}
+        for email_id, item in responses.items():
+            if item is not None and item.get("status") == 200:
+                emails[email_id] = item.get("body")
+            elif item is not None and item.get("status") == 404:
+                emails[email_id] = None
+            else:
+                raise Exception(f"Error fetching email {email_id}: {self._batch_outcome(item).get('error')}")
+        return emails
+
+    async def get_email_attachments_bulk(self, session_id: str, email_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        responses = await self._batch_by_id(
+            session_id, email_ids,
+            lambda email_id: {"method": "GET", "url": f"/me/messages/{email_id}/attachments?$select={ATTACHMENT_METADATA_SELECT}"}
+        )
+        attachments = {}
+        for email_id, item in responses.items():
+            if item is not None and item.get("status") == 404:
+                attachments[email_id] = []
+                continue
+            if item is None or item.get("status") != 200:
+                raise Exception(f"Error fetching attachments for {email_id}: {self._batch_outcome(item).get('error')}")
+            attachments[email_id] = item.get("body", {}).get("value", [])
+        return attachments
+
+    async def mark_as_read_bulk(self, session_id: str, email_ids: List[str], is_read: bool) -> Dict[str, Dict[str, Any]]:
+        responses = await self._batch_by_id(
+            session_id, email_ids,
+            lambda email_id: {"method": "PATCH", "url": f"/me/messages/{email_id}", "body": {"isRead": is_read}}
+        )
+        outcomes = {email_id: self._batch_outcome(item) for email_id, item in responses.items()}
+        succeeded = [email_id for email_id, outcome in outcomes.items() if outcome["success"]]
+        await asyncio.to_thread(self.store.update_messages, session_id, succeeded, {"isRead": is_read})
+        return outcomes
+
+    async def delete_emails_bulk(self, session_id: str, email_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        responses = await self._batch_by_id(
+            session_id, email_ids,
+            lambda email_id: {"method": "DELETE", "url": f"/me/messages/{email_id}"}
+        )
+        outcomes = {email_id: self._batch_outcome(item) for email_id, item in responses.items()}
+        succeeded = [email_id for email_id, outcome in outcomes.items() if outcome["success"]]
+        await asyncio.to_thread(self.store.remove_messages, session_id, succeeded)
+        return outcomes
+
     def _build_message_payload(self, request: SendEmailRequest) -> Dict[str, Any]:
         message = {
             "subject": request.subject,
@@ -245,8 +883,8 @@ class EmailService:
             ]
         return message
 
-    def send_email(self, session_id: str, request: SendEmailRequest):
-        headers = self._get_headers(session_id)
+    async def send_email(self, session_id: str, request: SendEmailRequest):
+        token = await self.get_token(session_id)
         message = self._build_message_payload(request)
         
         payload = {
@@ -254,19 +892,19 @@ class EmailService:
             "saveToSentItems": request.save_to_sent
         }
         
-        response = requests.post(f"{self.graph_url}/me/sendMail", headers=headers, json=payload)
+        response = await self.graph.post("/me/sendMail", token, json=payload)
         response.raise_for_status()
         return True
 
-    def create_draft(self, session_id: str, request: SendEmailRequest) -> Dict[str, Any]:
-        headers = self._get_headers(session_id)
+    async def create_draft(self, session_id: str, request: SendEmailRequest) -> Dict[str, Any]:
+        token = await self.get_token(session_id)
         message = self._build_message_payload(request)
         
-        response = requests.post(f"{self.graph_url}/me/messages", headers=headers, json=message)
+        response = await self.graph.post("/me/messages", token, json=message)
         response.raise_for_status()
         return response.json()
 
-    def send_simple_email(self, session_id: str, request: SimpleSendEmailRequest):
+    async def send_simple_email(self, session_id: str, request: SimpleSendEmailRequest):
         # Convert simple to full request
         to_list = [t.strip() for t in request.to.split(",") if t.strip()]
         to_recipients = [{"email": t} for t in to_list]
@@ -278,35 +916,37 @@ class EmailService:
             to_recipients=to_recipients,
             cc_recipients=[{"email": c} for c in (request.cc or [])]
         )
-        return self.send_email(session_id, full_req)
+        return await self.send_email(session_id, full_req)
 
-    def mark_as_read(self, session_id: str, email_id: str, is_read: bool):
-        headers = self._get_headers(session_id)
+    async def mark_as_read(self, session_id: str, email_id: str, is_read: bool):
+        token = await self.get_token(session_id)
         payload = {"isRead": is_read}
-        response = requests.patch(f"{self.graph_url}/me/messages/{email_id}", headers=headers, json=payload)
+        response = await self.graph.patch(f"/me/messages/{email_id}", token, json=payload)
         response.raise_for_status()
+        await asyncio.to_thread(self.store.update_messages, session_id, [email_id], payload)
         return True
 
-    def delete_email(self, session_id: str, email_id: str):
-        headers = self._get_headers(session_id)
-        response = requests.delete(f"{self.graph_url}/me/messages/{email_id}", headers=headers)
+    async def delete_email(self, session_id: str, email_id: str):
+        token = await self.get_token(session_id)
+        response = await self.graph.delete(f"/me/messages/{email_id}", token)
         response.raise_for_status()
+        await asyncio.to_thread(self.store.remove_messages, session_id, [email_id])
         return True
     
-    def reply_email(self, session_id: str, email_id: str, request: ReplyEmailRequest):
-        headers = self._get_headers(session_id)
+    async def reply_email(self, session_id: str, email_id: str, request: ReplyEmailRequest):
+        token = await self.get_token(session_id)
         action = "replyAll" if request.reply_all else "reply"
         
         payload = {}
         if request.reply_body:
             payload["comment"] = request.reply_body
             
-        response = requests.post(f"{self.graph_url}/me/messages/{email_id}/{action}", headers=headers, json=payload)
+        response = await self.graph.post(f"/me/messages/{email_id}/{action}", token, json=payload)
         response.raise_for_status()
         return True
 
-    def forward_email(self, session_id: str, email_id: str, request: ForwardEmailRequest):
-        headers = self._get_headers(session_id)
+    async def forward_email(self, session_id: str, email_id: str, request: ForwardEmailRequest):
+        token = await self.get_token(session_id)
         
         payload = {
             "toRecipients": [
@@ -316,7 +956,7 @@ class EmailService:
             "comment": request.comment
         }
         
-        response = requests.post(f"{self.graph_url}/me/messages/{email_id}/forward", headers=headers, json=payload)
+        response = await self.graph.post(f"/me/messages/{email_id}/forward", token, json=payload)
         response.raise_for_status()
         return True
 
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore(ABC):
+    """
+    Interface for per-session token storage.
+
+    Every write touches a single session, sessions expire after
+    SESSION_TTL_SECONDS, and implementations must be safe to share across
+    uvicorn worker processes unless documented otherwise.
+    """
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session's data, or None when it is unknown or expired."""
+
+    @abstractmethod
+    def set(self, session_id: str, data: Dict[str, Any]):
+        """Stores the session's data and restarts its expiry."""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Removes the session; unknown ids are ignored."""
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """Removes expired sessions and returns how many there were."""
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store for development and tests. Not shared between workers."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._sessions: Dict[str, tuple] = {}  # session_id -> (expires_at, data)
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._sessions[session_id]
+                return None
+            return entry[1]
+
+    def set(self, session_id: str, data: Dict[str, Any]):
+        with self._lock:
+            self._sessions[session_id] = (time.time() + self.ttl_seconds, data)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (expires_at, _) in self._sessions.items() if expires_at < now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite (WAL mode) session store shared by all worker processes.
+
+    Each login/logout is a single-row write. Reads go through a bounded
+    in-process LRU whose entries live for SESSION_CACHE_TTL_SECONDS, which
+    bounds how long another worker's logout can go unnoticed.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, cache_max_entries: int, cache_ttl_seconds: float):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.cache_max_entries = cache_max_entries
+        self.cache_ttl_seconds = cache_ttl_seconds
+
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()  # session_id -> (cached_until, data)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_purge = 0.0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions(expires_at)")
+            self._conn = conn
+        return self._conn
+
+    def _cache_put(self, session_id: str, data: Optional[Dict[str, Any]]):
+        self._cache[session_id] = (time.time() + self.cache_ttl_seconds, data)
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if entry is not None and entry[0] >= now:
+                self._cache.move_to_end(session_id)
+                return entry[1]
+
+            row = self._db().execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND expires_at >= ?",
+                (session_id, now)
+            ).fetchone()
+            data = json.loads(row[0]) if row else None
+            # Misses are cached too, so unknown ids don't hit SQLite on every request
+            self._cache_put(session_id, data)
+            return data
+
+    def set(self, session_id: str, data: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data), now + self.ttl_seconds)
+            )
+            self._cache_put(session_id, data)
+            if now - self._last_purge >= settings.SESSION_PURGE_INTERVAL_SECONDS:
+                self._last_purge = now
+                conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._db().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._cache.pop(session_id, None)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            self._last_purge = now
+            cursor = self._db().execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+            return cursor.rowcount
+
+
+def migrate_legacy_tokens(store: SessionStore, path: str):
+    """Imports sessions from the old tokens.json file once, then renames it."""
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, 'r') as f:
+            tokens = json.load(f)
+        for session_id, token_data in tokens.items():
+            store.set(session_id, token_data)
+        os.replace(path, f"{path}.migrated")
+        logger.info(f"Migrated {len(tokens)} sessions from {path}")
+    except Exception as e:
+        logger.error(f"Error migrating legacy tokens from {path}: {e}")
+
+
+def create_session_store() -> SessionStore:
+    if settings.SESSION_STORE_BACKEND == "memory":
+        store = MemorySessionStore(settings.SESSION_TTL_SECONDS)
+    elif settings.SESSION_STORE_BACKEND == "sqlite":
+        store = SQLiteSessionStore(
+            settings.SESSION_STORE_PATH,
+            ttl_seconds=settings.SESSION_TTL_SECONDS,
+            cache_max_entries=settings.SESSION_CACHE_MAX_ENTRIES,
+            cache_ttl_seconds=settings.SESSION_CACHE_TTL_SECONDS
+        )
+    else:
+        raise ValueError(f"Unknown SESSION_STORE_BACKEND: {settings.SESSION_STORE_BACKEND}")
+
+    migrate_legacy_tokens(store, settings.LEGACY_TOKEN_FILE)
+    return store
+
+
+session_store = create_session_store()
@@ -0,0 +1,450 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Dict, Any, Tuple
+
+from src.core.config import settings
+from src.services.email.fields import project
+
+# Columns the list endpoints can sort on locally, keyed by Graph property name
+ORDERABLE_COLUMNS = {
+    "receivedDateTime": "received_at",
+    "sentDateTime": "sent_at",
+    "subject": "subject",
+    "importance": "importance",
+}
+
+# Body fields that are dropped when a caller lists messages without bodies
+BODY_FIELDS = ("body", "uniqueBody")
+
+# Bulky fields that projections leave out unless asked for (see services/email/fields.py)
+LARGE_FIELDS = BODY_FIELDS + ("attachments",)
+
+# bm25 column weights for messages_fts: subject, body_preview, sender, attachment_names
+SEARCH_WEIGHTS = (10.0, 2.0, 4.0, 6.0)
+
+
+def build_match_query(search: str) -> Optional[str]:
+    """
+    Turns free text into an FTS5 MATCH expression.
+
+    Every whitespace separated term must match (implicit AND) and is treated
+    as a prefix phrase, so "CESS-7482" matches "CESS-748203-00001" and
+    "lm31" matches "LM317". User input never reaches FTS5 syntax unescaped.
+    """
+    terms = []
+    for term in search.split():
+        term = term.replace('"', '""')
+        if any(ch.isalnum() for ch in term):
+            terms.append(f'"{term}" *')
+    return " ".join(terms) or None
+
+
+def search_fields(message: Dict[str, Any]) -> tuple:
+    """Text indexed for a message: subject, body preview, sender and attachment names."""
+    sender = (message.get("from") or {}).get("emailAddress") or {}
+    attachment_names = " ".join(a.get("name") or "" for a in message.get("attachments") or [])
+    return (
+        message.get("subject") or "",
+        message.get("bodyPreview") or "",
+        f"{sender.get('name') or ''} {sender.get('address') or ''}",
+        attachment_names,
+    )
+
+
+def parse_order_by(order_by: str) -> Optional[Tuple[str, str]]:
+    """Translates a Graph `$orderby` expression into (column, direction), or None if unsupported."""
+    parts = (order_by or "receivedDateTime desc").split()
+    if not parts or len(parts) > 2 or parts[0] not in ORDERABLE_COLUMNS:
+        return None
+    direction = parts[1].lower() if len(parts) == 2 else "asc"
+    if direction not in ("asc", "desc"):
+        return None
+    return ORDERABLE_COLUMNS[parts[0]], direction.upper()
+
+
+class MessageStore:
+    """
+    Local SQLite copy of synced mail folders, fed by Graph delta queries.
+
+    Each row keeps the Graph message JSON plus the columns the list
+    endpoints filter and sort on. Delta links are stored per session and folder.
+    An FTS5 table (messages_fts, sharing rowids with messages) is updated in
+    the same transaction as every write and serves ranked local search.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    session_id TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    received_at TEXT NOT NULL DEFAULT '',
+                    sent_at TEXT NOT NULL DEFAULT '',
+                    subject TEXT NOT NULL DEFAULT '',
+                    from_address TEXT,
+                    is_read INTEGER,
+                    has_attachments INTEGER,
+                    importance TEXT NOT NULL DEFAULT '',
+                    conversation_id TEXT,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (session_id, folder, id)
+                );
+                CREATE INDEX IF NOT EXISTS messages_id ON messages(session_id, id);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    session_id TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    delta_link TEXT,
+                    synced_at REAL,
+                    synced_from TEXT,
+                    PRIMARY KEY (session_id, folder)
+                );
+            """)
+            # One index per sort column, ending in id like the (sort value, id) page keys
+            for column in ORDERABLE_COLUMNS.values():
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS messages_{column}_id ON messages(session_id, folder, {column}, id)"
+                )
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+                "subject, body_preview, sender, attachment_names, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            self._conn = conn
+        return self._conn
+
+    # --- Sync state ---
+
+    def get_sync_state(self, session_id: str, folder: str) -> Tuple[Optional[str], Optional[float]]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT delta_link, synced_at FROM sync_state WHERE session_id = ? AND folder = ?",
+                (session_id, folder)
+            ).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def get_synced_from(self, session_id: str, folder: str) -> Optional[str]:
+        """
+        Start of the synced window (an ISO timestamp): every message of the
+        folder received since then is in the store. None if the folder was never synced.
+        """
+        with self._lock:
+            row = self._db().execute(
+                "SELECT synced_from FROM sync_state WHERE session_id = ? AND folder = ?", (session_id, folder)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_sync_state(self, session_id: str, folder: str, delta_link: Optional[str], synced_from: Optional[str] = None):
+        """`synced_from` is set by the initial sync; later syncs keep the stored value."""
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO sync_state (session_id, folder, delta_link, synced_at, synced_from) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (session_id, folder) DO UPDATE SET delta_link = excluded.delta_link, "
+                "synced_at = excluded.synced_at, synced_from = COALESCE(excluded.synced_from, sync_state.synced_from)",
+                (session_id, folder, delta_link, time.time(), synced_from)
+            )
+
+    # --- Changes ---
+
+    def _upsert(self, conn: sqlite3.Connection, session_id: str, folder: str, message: Dict[str, Any]):
+        # Upsert (rather than REPLACE) keeps the rowid stable so the FTS row can follow it
+        conn.execute(
+            "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (session_id, folder, id) DO UPDATE SET "
+            "received_at = excluded.received_at, sent_at = excluded.sent_at, subject = excluded.subject, "
+            "from_address = excluded.from_address, is_read = excluded.is_read, "
+            "has_attachments = excluded.has_attachments, importance = excluded.importance, "
+            "conversation_id = excluded.conversation_id, data = excluded.data",
+            self._row(session_id, folder, message)
+        )
+        (rowid,) = conn.execute(
+            "SELECT rowid FROM messages WHERE session_id = ? AND folder = ? AND id = ?",
+            (session_id, folder, message["id"])
+        ).fetchone()
+        conn.execute("DELETE FROM messages_fts WHERE rowid = ?", (rowid,))
+        conn.execute(
+            "INSERT INTO messages_fts (rowid, subject, body_preview, sender, attachment_names) VALUES (?, ?, ?, ?, ?)",
+            (rowid, *search_fields(message))
+        )
+
+    def _delete(self, conn: sqlite3.Connection, where: str, params: tuple):
+        rowids = [(rowid,) for (rowid,) in conn.execute(f"SELECT rowid FROM messages WHERE {where}", params)]
+        conn.executemany("DELETE FROM messages_fts WHERE rowid = ?", rowids)
+        conn.executemany("DELETE FROM messages WHERE rowid = ?", rowids)
+
+    @staticmethod
+    def _row(session_id: str, folder: str, message: Dict[str, Any]) -> tuple:
+        sender = (message.get("from") or {}).get("emailAddress") or {}
+        return (
+            session_id,
+            folder,
+            message["id"],
+            # Sort columns are never NULL, so keyset comparisons can use the raw column and its index
+            message.get("receivedDateTime") or "",
+            message.get("sentDateTime") or "",
+            message.get("subject") or "",
+            (sender.get("address") or "").lower(),
+            1 if message.get("isRead") else 0,
+            1 if message.get("hasAttachments") else 0,
+            message.get("importance") or "",
+            message.get("conversationId"),
+            json.dumps(message),
+        )
+
+    def apply_changes(self, session_id: str, folder: str, upserts: List[Dict[str, Any]], removed_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Applies one page of delta results. Updated messages are merged into the
+        stored copy, since delta may only return the properties that changed.
+
+        Returns:
+            The merged messages that were written
+        """
+        written = []
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for message in upserts:
+                    row = conn.execute(
+                        "SELECT data FROM messages WHERE session_id = ? AND folder = ? AND id = ?",
+                        (session_id, folder, message["id"])
+                    ).fetchone()
+                    merged = json.loads(row[0]) if row else {}
+                    merged.update(message)
+                    self._upsert(conn, session_id, folder, merged)
+                    written.append(merged)
+                for message_id in removed_ids:
+                    self._delete(conn, "session_id = ? AND folder = ? AND id = ?", (session_id, folder, message_id))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return written
+
+    def update_messages(self, session_id: str, message_ids: List[str], changes: Dict[str, Any]):
+        """Applies a local change (e.g. isRead) to every stored copy of the given messages."""
+        with self._lock:
+            conn = self._db()
+            # IMMEDIATE takes the write lock before the reads, so a sync in another worker cannot interleave
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for message_id in message_ids:
+                    rows = conn.execute(
+                        "SELECT folder, data FROM messages WHERE session_id = ? AND id = ?",
+                        (session_id, message_id)
+                    ).fetchall()
+                    for folder, data in rows:
+                        merged = json.loads(data)
+                        merged.update(changes)
+                        self._upsert(conn, session_id, folder, merged)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def remove_messages(self, session_id: str, message_ids: List[str]):
+        self._delete_where([("session_id = ? AND id = ?", (session_id, message_id)) for message_id in message_ids])
+
+    def reset_folder(self, session_id: str, folder: str):
+        self._delete_where(
+            [("session_id = ? AND folder = ?", (session_id, folder))],
+            ("DELETE FROM sync_state WHERE session_id = ? AND folder = ?", (session_id, folder))
+        )
+
+    def clear_session(self, session_id: str):
+        self._delete_where(
+            [("session_id = ?", (session_id,))],
+            ("DELETE FROM sync_state WHERE session_id = ?", (session_id,))
+        )
+
+    def _delete_where(self, wheres: List[Tuple[str, tuple]], then: Optional[Tuple[str, tuple]] = None):
+        """Deletes messages (and their FTS rows) in one transaction, then optionally runs `then` in it."""
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for where, params in wheres:
+                    self._delete(conn, where, params)
+                if then:
+                    conn.execute(*then)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    # --- Queries ---
+
+    @staticmethod
+    def _where(
+        session_id: str,
+        folder: str,
+        received_from: Optional[str] = None,
+        received_before: Optional[str] = None,
+        unread_only: bool = False,
+        has_attachments: Optional[bool] = None,
+        from_address: Optional[str] = None,
+        importance: Optional[str] = None
+    ) -> Tuple[List[str], List[Any]]:
+        clauses = ["m.session_id = ?", "m.folder = ?"]
+        params: List[Any] = [session_id, folder]
+
+        if received_from:
+            clauses.append("m.received_at >= ?")
+            params.append(received_from)
+        if received_before:
+            clauses.append("m.received_at < ?")
+            params.append(received_before)
+        if unread_only:
+            clauses.append("m.is_read = 0")
+        if has_attachments is not None:
+            clauses.append("m.has_attachments = ?")
+            params.append(1 if has_attachments else 0)
+        if from_address:
+            clauses.append("m.from_address = ?")
+            params.append(from_address.lower())
+        if importance:
+            clauses.append("m.importance = ?")
+            params.append(importance)
+        return clauses, params
+
+    @staticmethod
+    def _data_expr(include_body: bool, fields: Optional[List[str]]) -> str:
+        """
+        SQL for the stored message JSON. Fields the caller won't return are
+        removed inside SQLite, so large bodies are never parsed in Python.
+        """
+        if fields is not None:
+            drop = [field for field in LARGE_FIELDS if field not in fields]
+        else:
+            drop = [] if include_body else list(BODY_FIELDS)
+        if not drop:
+            return "m.data"
+        return f"json_remove(m.data, {', '.join(repr('$.' + field) for field in drop)})"
+
+    @staticmethod
+    def _decode_rows(rows, fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+        messages = [json.loads(row[0]) for row in rows]
+        if fields is not None:
+            return [project(message, fields) for message in messages]
+        return messages
+
+    def query(
+        self,
+        session_id: str,
+        folder: str,
+        limit: int = 25,
+        skip: int = 0,
+        search: Optional[str] = None,
+        received_from: Optional[str] = None,
+        received_before: Optional[str] = None,
+        unread_only: bool = False,
+        has_attachments: Optional[bool] = None,
+        from_address: Optional[str] = None,
+        importance: Optional[str] = None,
+        order_by: str = "receivedDateTime desc",
+        include_body: bool = True,
+        fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        order = parse_order_by(order_by)
+        if order is None:
+            raise ValueError(f"Unsupported order_by for local store: {order_by}")
+
+        clauses, params = self._where(
+            session_id, folder, received_from, received_before,
+            unread_only, has_attachments, from_address, importance
+        )
+
+        column, direction = order
+        data = self._data_expr(include_body, fields)
+        if search:
+            match = build_match_query(search)
+            if match is None:
+                return []
+            # Full-text matches are ranked by BM25 first, then by the requested order
+            weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+            sql = (
+                f"SELECT {data} FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid "
+                f"WHERE messages_fts MATCH ? AND {' AND '.join(clauses)} "
+                f"ORDER BY bm25(messages_fts, {weights}), m.{column} {direction} LIMIT ? OFFSET ?"
+            )
+            params.insert(0, match)
+        else:
+            sql = (
+                f"SELECT {data} FROM messages m WHERE {' AND '.join(clauses)} "
+                f"ORDER BY m.{column} {direction}, m.id {direction} LIMIT ? OFFSET ?"
+            )
+        params.extend([limit, skip])
+
+        with self._lock:
+            rows = self._db().execute(sql, params).fetchall()
+        return self._decode_rows(rows, fields)
+
+    def query_page(
+        self,
+        session_id: str,
+        folder: str,
+        limit: int = 25,
+        skip: int = 0,
+        after: Optional[List[str]] = None,
+        received_from: Optional[str] = None,
+        received_before: Optional[str] = None,
+        unread_only: bool = False,
+        has_attachments: Optional[bool] = None,
+        from_address: Optional[str] = None,
+        importance: Optional[str] = None,
+        order_by: str = "receivedDateTime desc",
+        include_body: bool = True,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[List[str]]]:
+        """
+        Keyset pagination for cursors and exports: rows strictly after the
+        (sort value, id) pair of the previous page, so deep pages cost the same
+        as the first one. `skip` is only meant for the first page.
+
+        Returns:
+            (messages, key of the last row or None when there are no more rows)
+        """
+        order = parse_order_by(order_by)
+        if order is None:
+            raise ValueError(f"Unsupported order_by for local store: {order_by}")
+
+        clauses, params = self._where(
+            session_id, folder, received_from, received_before,
+            unread_only, has_attachments, from_address, importance
+        )
+        column, direction = order
+        if after:
+            # A row-value comparison on the raw columns is a range on the (.., column, id) index
+            op = "<" if direction == "DESC" else ">"
+            clauses.append(f"(m.{column}, m.id) {op} (?, ?)")
+            params.extend([after[0], after[1]])
+
+        sql = (
+            f"SELECT {self._data_expr(include_body, fields)}, m.{column}, m.id FROM messages m WHERE {' AND '.join(clauses)} "
+            f"ORDER BY m.{column} {direction}, m.id {direction} LIMIT ? OFFSET ?"
+        )
+        params.extend([limit + 1, skip])
+
+        with self._lock:
+            rows = self._db().execute(sql, params).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_after = [rows[-1][1], rows[-1][2]] if has_more and rows else None
+        return self._decode_rows(rows, fields), next_after
+
+
+message_store = MessageStore(settings.MAIL_STORE_PATH)
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Tuple
+
+from src.core.config import settings
+from src.services.email.graph_client import graph_client
+from src.services.email.attachments import ATTACHMENT_METADATA_SELECT
+from src.services.email.store import message_store
+
+logger = logging.getLogger(__name__)
+
+# Properties requested from the delta endpoint (delta does not support $expand).
+# Bodies are left out so the first walk of a folder stays small; store pages
+# that show them fetch them by id.
+SYNC_SELECT_FIELDS = [
+    "id", "subject", "bodyPreview", "from", "toRecipients", "ccRecipients",
+    "receivedDateTime", "sentDateTime", "isRead", "isDraft", "importance",
+    "hasAttachments", "conversationId", "webLink",
+]
+
+
+class DeltaTokenExpired(Exception):
+    """Raised when Graph no longer accepts a stored delta link."""
+
+
+class MailSyncEngine:
+    """
+    Keeps the local message store in step with Graph using `messages/delta`.
+
+    The first sync of a folder walks the last MAIL_SYNC_INITIAL_DAYS of mail
+    and records where that window starts (older mail is only in Graph);
+    afterwards only adds, updates and deletes since the stored delta link are
+    fetched. Syncs are single-flight per session and folder and rate limited
+    by MAIL_SYNC_MIN_INTERVAL_SECONDS.
+    """
+
+    def __init__(self):
+        self.graph = graph_client
+        self.store = message_store
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    def _initial_url(self, folder: str) -> Tuple[str, Dict[str, Any], str]:
+        """Returns the delta URL, its params and the start of the synced window."""
+        since = (datetime.now(timezone.utc) - timedelta(days=settings.MAIL_SYNC_INITIAL_DAYS)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        params = {
+            "$select": ",".join(SYNC_SELECT_FIELDS),
+            "$filter": f"receivedDateTime ge {since}",
+            "$orderby": "receivedDateTime desc",
+        }
+        return f"/me/mailFolders/{folder}/messages/delta", params, since
+
+    async def _fetch_attachment_metadata(self, token: str, messages: List[Dict[str, Any]]):
+        """Delta cannot expand attachments, so their metadata is pulled in $batch calls."""
+        with_attachments = [m for m in messages if m.get("hasAttachments") and "attachments" not in m]
+        if not with_attachments:
+            return
+        requests = [
+            {
+                "id": str(i),
+                "method": "GET",
+                "url": f"/me/messages/{m['id']}/attachments?$select={ATTACHMENT_METADATA_SELECT}"
+            }
+            for i, m in enumerate(with_attachments)
+        ]
+        responses = await self.graph.batch(token, requests)
+        for i, message in enumerate(with_attachments):
+            item = responses.get(str(i))
+            if item and item.get("status") == 200:
+                message["attachments"] = item.get("body", {}).get("value", [])
+
+    async def _run_delta(self, token: str, session_id: str, folder: str) -> Dict[str, int]:
+        delta_link, _ = await asyncio.to_thread(self.store.get_sync_state, session_id, folder)
+        synced_from = None
+        if delta_link:
+            url, params = delta_link, None
+        else:
+            url, params, synced_from = self._initial_url(folder)
+
+        headers = {"Prefer": f"odata.maxpagesize={settings.MAIL_SYNC_PAGE_SIZE}"}
+        stats = {"upserted": 0, "removed": 0}
+
+        while True:
+            response = await self.graph.get(url, token, params=params, headers=headers)
+            if response.status_code == 410 or (
+                response.status_code == 400 and "syncStateNotFound" in response.text
+            ):
+                raise DeltaTokenExpired(response.text)
+            if response.status_code != 200:
+                raise Exception(f"Error syncing folder {folder}: {response.text}")
+
+            data = response.json()
+            upserts, removed = [], []
+            for item in data.get("value", []):
+                if "@removed" in item:
+                    removed.append(item["id"])
+                else:
+                    item.pop("@odata.etag", None)
+                    upserts.append(item)
+
+            await self._fetch_attachment_metadata(token, upserts)
+            await asyncio.to_thread(self.store.apply_changes, session_id, folder, upserts, removed)
+            stats["upserted"] += len(upserts)
+            stats["removed"] += len(removed)
+
+            if "@odata.nextLink" in data:
+                url, params = data["@odata.nextLink"], None
+                continue
+
+            await asyncio.to_thread(
+                self.store.set_sync_state, session_id, folder, data.get("@odata.deltaLink"), synced_from
+            )
+            return stats
+
+    async def sync(self, session_id: str, token: str, folder: str = "inbox", force: bool = False) -> Dict[str, int]:
+        """
+        Brings the local copy of a folder up to date.
+
+        Returns:
+            Dict with the number of upserted and removed messages
+        """
+        lock = self._locks.setdefault((session_id, folder), asyncio.Lock())
+        async with lock:
+            _, synced_at = await asyncio.to_thread(self.store.get_sync_state, session_id, folder)
+            if not force and synced_at and time.time() - synced_at < settings.MAIL_SYNC_MIN_INTERVAL_SECONDS:
+                return {"upserted": 0, "removed": 0}
+
+            try:
+                return await self._run_delta(token, session_id, folder)
+            except DeltaTokenExpired:
+                logger.warning(f"Delta link expired for folder {folder}, running a full resync")
+                await asyncio.to_thread(self.store.reset_folder, session_id, folder)
+                return await self._run_delta(token, session_id, folder)
+
+    def forget_session(self, session_id: str):
+        for key in [key for key in self._locks if key[0] == session_id]:
+            del self._locks[key]
+        self.store.clear_session(session_id)
+
+
+mail_sync = MailSyncEngine()
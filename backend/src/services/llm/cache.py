@@ -0,0 +1,52 @@
+import hashlib
+import json
+import unicodedata
+from typing import List, Optional
+
+from src.core.cache import TieredCache
+from src.core.config import settings
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Normalize text so trivially different copies of an email share a cache entry."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(text.split())
+
+
+def make_cache_key(
+    operation: str,
+    model: str,
+    prompt_version: str,
+    subject: str,
+    body: str,
+    attachments: Optional[List[str]] = None
+) -> str:
+    """
+    Content-addressed key for an LLM result.
+
+    Includes the prompt version so that editing a template in prompts.py
+    invalidates previously cached results automatically.
+    """
+    material = json.dumps(
+        [
+            operation,
+            model,
+            prompt_version,
+            normalize_text(subject),
+            normalize_text(body),
+            [normalize_text(a) for a in (attachments or [])]
+        ],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+llm_cache = TieredCache(
+    path=settings.LLM_CACHE_PATH if settings.LLM_CACHE_ENABLED else None,
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    max_disk_entries=settings.LLM_CACHE_MAX_DISK_ENTRIES,
+    table="llm_results"
+)
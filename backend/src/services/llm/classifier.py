@@ -0,0 +1,416 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+from src.core.config import settings
+from src.services.llm.cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"[a-z0-9]+(?:[-/][a-z0-9]+)*")
+
+MODEL_VERSION = 1
+
+# Name of the lease that lets one worker at a time train
+TRAINING_LEASE = "intent_classifier_training"
+
+
+class TrainingInProgress(Exception):
+    """Raised when a training run is already under way (in any worker)."""
+
+
+def hashed_features(subject: str, body: str, dims: int) -> Dict[int, float]:
+    """
+    Signed hashed bag of subject words, body words and body bigrams,
+    L2-normalized. crc32 keeps indices stable across processes.
+    """
+    subject_words = _WORD_RE.findall(normalize_text(subject).lower())
+    body_words = _WORD_RE.findall(normalize_text(_TAG_RE.sub(" ", body or ""))[:settings.CLASSIFIER_MAX_BODY_CHARS].lower())
+
+    tokens = [f"s:{w}" for w in subject_words]
+    tokens += [f"b:{w}" for w in body_words]
+    tokens += [f"b2:{a} {b}" for a, b in zip(body_words, body_words[1:])]
+
+    features: Dict[int, float] = {}
+    for token in tokens:
+        h = zlib.crc32(token.encode("utf-8"))
+        index = h % dims
+        features[index] = features.get(index, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {index: value / norm for index, value in features.items() if value}
+
+
+def _sigmoid(z: float) -> float:
+    if z < -35:
+        return 0.0
+    if z > 35:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+def _score(bias: float, weights: Dict[int, float], features: Dict[int, float]) -> float:
+    return _sigmoid(bias + sum(weights.get(i, 0.0) * v for i, v in features.items()))
+
+
+def train_weights(
+    examples: List[Tuple[Dict[int, float], int]],
+    epochs: int,
+    learning_rate: float,
+    l2: float,
+    seed: int = 0
+) -> Tuple[float, Dict[int, float]]:
+    """
+    Logistic regression by SGD over sparse features, with classes weighted
+    to balance them. Module level so it can run in a worker process.
+    """
+    positives = sum(label for _, label in examples) or 1
+    negatives = (len(examples) - positives) or 1
+    class_weight = {1: len(examples) / (2.0 * positives), 0: len(examples) / (2.0 * negatives)}
+
+    rng = random.Random(seed)
+    order = list(range(len(examples)))
+    bias, weights = 0.0, {}
+    step = 0
+    for _ in range(epochs):
+        rng.shuffle(order)
+        for i in order:
+            features, label = examples[i]
+            step += 1
+            rate = learning_rate / (1.0 + 0.0001 * step)
+            gradient = (_score(bias, weights, features) - label) * class_weight[label]
+            bias -= rate * gradient
+            for index, value in features.items():
+                w = weights.get(index, 0.0)
+                weights[index] = w - rate * (gradient * value + l2 * w)
+    return bias, {i: w for i, w in weights.items() if abs(w) > 1e-6}
+
+
+def evaluate(
+    bias: float, weights: Dict[int, float], holdout: List[Tuple[Dict[int, float], int]], threshold: float
+) -> Dict[str, Any]:
+    skipped = [label for features, label in holdout if 1.0 - _score(bias, weights, features) >= threshold]
+    wrong = sum(skipped)
+    return {
+        "examples": len(holdout),
+        "would_skip": len(skipped),
+        "skip_rate": len(skipped) / len(holdout) if holdout else 0.0,
+        # Share of skipped emails that really were not requests
+        "skip_precision": (len(skipped) - wrong) / len(skipped) if skipped else None,
+        "missed_requests": wrong
+    }
+
+
+def fit_model(
+    rows: List[Tuple[str, str, int]],
+    dims: int,
+    holdout_fraction: float,
+    threshold: float,
+    epochs: int,
+    learning_rate: float,
+    l2: float
+) -> Tuple[float, Dict[int, float], int, Dict[str, Any]]:
+    """
+    Featurizes labelled emails, trains on a shuffled split and evaluates the
+    skip decision on the rest. Runs in a worker process.
+
+    Returns:
+        (bias, weights, number of training examples, holdout evaluation)
+    """
+    examples = [(hashed_features(subject, body, dims), label) for subject, body, label in rows]
+    random.Random(0).shuffle(examples)
+    split = max(1, int(len(examples) * holdout_fraction))
+    holdout, training = examples[:split], examples[split:]
+    bias, weights = train_weights(training, epochs, learning_rate, l2)
+    return bias, weights, len(training), evaluate(bias, weights, holdout, threshold)
+
+
+class IntentLabelStore:
+    """
+    Intent labels produced by the LLM, kept as training data for
+    IntentClassifier. They hold email subjects and bodies, so only the newest
+    CLASSIFIER_LABEL_MAX_ENTRIES, at most CLASSIFIER_LABEL_MAX_AGE_DAYS old,
+    are kept. An empty path disables collecting them.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS intent_labels ("
+                "key TEXT PRIMARY KEY, subject TEXT NOT NULL, body TEXT NOT NULL, "
+                "label INTEGER NOT NULL, confidence REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "DELETE FROM intent_labels WHERE created_at < ?",
+                (time.time() - settings.CLASSIFIER_LABEL_MAX_AGE_DAYS * 86400,)
+            )
+            self._conn = conn
+        return self._conn
+
+    def add(self, subject: str, body: str, label: bool, confidence: float):
+        subject = normalize_text(subject)
+        body = normalize_text(_TAG_RE.sub(" ", body or ""))[:settings.CLASSIFIER_MAX_BODY_CHARS]
+        key = hashlib.sha256(f"{subject}\0{body}".encode("utf-8")).hexdigest()
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return
+            conn.execute(
+                "INSERT OR REPLACE INTO intent_labels (key, subject, body, label, confidence, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, subject, body, int(label), confidence, time.time())
+            )
+            # REPLACE gives the row a new rowid, so the lowest rowids are the oldest labels
+            conn.execute(
+                "DELETE FROM intent_labels WHERE rowid <= (SELECT MAX(rowid) FROM intent_labels) - ?",
+                (settings.CLASSIFIER_LABEL_MAX_ENTRIES,)
+            )
+
+    def all(self, min_confidence: float) -> List[Tuple[str, str, int]]:
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return []
+            return conn.execute(
+                "SELECT subject, body, label FROM intent_labels WHERE confidence >= ? ORDER BY created_at",
+                (min_confidence,)
+            ).fetchall()
+
+    def count(self) -> int:
+        with self._lock:
+            conn = self._db()
+            return conn.execute("SELECT COUNT(*) FROM intent_labels").fetchone()[0] if conn else 0
+
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        """Takes a named lease; False while another holder's lease is still valid."""
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return True
+            conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                (name, holder, now + ttl_seconds, now)
+            )
+            row = conn.execute("SELECT holder FROM leases WHERE name = ?", (name,)).fetchone()
+        return row is not None and row[0] == holder
+
+    def release_lease(self, name: str, holder: str):
+        with self._lock:
+            conn = self._db()
+            if conn is not None:
+                conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+
+class IntentClassifier:
+    """
+    Hashed n-gram logistic regression in front of the LLM intent call.
+
+    Trained from labels the LLM produced earlier. It only ever short-circuits
+    in one direction: emails it is at least CLASSIFIER_SKIP_THRESHOLD sure
+    are *not* customer requests (newsletters, invites, internal chatter).
+    A trained model is only used if, on a held-out split, the emails it
+    would have skipped were non-requests at least CLASSIFIER_MIN_PRECISION
+    of the time.
+
+    The model file is reloaded by a background loop, so models trained by
+    another worker are picked up without file reads in the request path.
+    """
+
+    def __init__(self, model_path: str, labels: IntentLabelStore):
+        self.model_path = model_path
+        self.labels = labels
+        self._model: Optional[Dict[str, Any]] = None
+        self._weights: Dict[int, float] = {}
+        self._model_mtime = 0.0
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        # Per-process counters
+        self.evaluated = 0
+        self.skipped = 0
+
+    def reload(self):
+        """Picks up models trained by another worker process. Blocking; run it off the event loop."""
+        try:
+            mtime = os.path.getmtime(self.model_path)
+        except OSError:
+            return
+        if mtime == self._model_mtime:
+            return
+        try:
+            with open(self.model_path, "r") as f:
+                model = json.load(f)
+            if model.get("version") != MODEL_VERSION:
+                return
+            with self._lock:
+                self._model = model
+                self._weights = {int(i): w for i, w in model["weights"].items()}
+                self._model_mtime = mtime
+        except Exception as e:
+            logger.error(f"Error loading intent classifier from {self.model_path}: {e}")
+
+    async def _reload_loop(self):
+        while True:
+            await asyncio.to_thread(self.reload)
+            await asyncio.sleep(settings.CLASSIFIER_RELOAD_INTERVAL_SECONDS)
+
+    async def start(self):
+        if settings.CLASSIFIER_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._reload_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @property
+    def active(self) -> bool:
+        return bool(self._model and self._model.get("enabled"))
+
+    def probability(self, subject: str, body: str) -> float:
+        """Probability that the email is a customer request."""
+        with self._lock:
+            model, weights = self._model, self._weights
+        features = hashed_features(subject, body, model["dims"])
+        return _score(model["bias"], weights, features)
+
+    def predict_skip(self, subject: str, body: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns an intent result when the email is confidently not a customer
+        request, or None when the LLM should decide.
+        """
+        if not settings.CLASSIFIER_ENABLED or not self.active:
+            return None
+        self.evaluated += 1
+        not_request = 1.0 - self.probability(subject, body)
+        if not_request < settings.CLASSIFIER_SKIP_THRESHOLD:
+            return None
+        self.skipped += 1
+        return {
+            "is_customer_request": False,
+            "confidence": round(not_request, 4),
+            "reasoning": "Classified locally as not a customer request (newsletter, notification or internal mail)."
+        }
+
+    def record_label(self, subject: str, body: str, result: Dict[str, Any]):
+        """Keeps a confident LLM label as training data."""
+        confidence = float(result.get("confidence") or 0.0)
+        if "is_customer_request" not in result or confidence < settings.CLASSIFIER_MIN_LABEL_CONFIDENCE:
+            return
+        self.labels.add(subject, body, bool(result["is_customer_request"]), confidence)
+
+    async def train(self) -> Dict[str, Any]:
+        """
+        Retrains from the stored labels and saves the model if it trained.
+
+        Raises:
+            ValueError: If there are too few labels, or only one class
+            TrainingInProgress: If another run is under way in any worker
+        """
+        holder = uuid.uuid4().hex
+        if not await asyncio.to_thread(
+            self.labels.acquire_lease, TRAINING_LEASE, holder, settings.CLASSIFIER_TRAINING_TIMEOUT_SECONDS
+        ):
+            raise TrainingInProgress("The intent classifier is already being trained")
+        try:
+            return await self._train()
+        finally:
+            await asyncio.to_thread(self.labels.release_lease, TRAINING_LEASE, holder)
+
+    async def _train(self) -> Dict[str, Any]:
+        rows = await asyncio.to_thread(self.labels.all, settings.CLASSIFIER_MIN_LABEL_CONFIDENCE)
+        if len(rows) < settings.CLASSIFIER_MIN_TRAINING_EXAMPLES:
+            raise ValueError(
+                f"Need at least {settings.CLASSIFIER_MIN_TRAINING_EXAMPLES} labelled emails to train, have {len(rows)}"
+            )
+        if len({label for _, _, label in rows}) < 2:
+            raise ValueError("Labelled emails contain only one class")
+
+        # Featurizing and training are CPU bound pure Python; keep them off the API process
+        dims = settings.CLASSIFIER_HASH_DIMENSIONS
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            bias, weights, training_examples, evaluation = await loop.run_in_executor(
+                pool, fit_model, rows, dims,
+                settings.CLASSIFIER_HOLDOUT_FRACTION, settings.CLASSIFIER_SKIP_THRESHOLD,
+                settings.CLASSIFIER_EPOCHS, settings.CLASSIFIER_LEARNING_RATE, settings.CLASSIFIER_L2
+            )
+
+        precision = evaluation["skip_precision"]
+        model = {
+            "version": MODEL_VERSION,
+            "dims": dims,
+            "bias": bias,
+            "weights": {str(i): w for i, w in weights.items()},
+            "trained_at": time.time(),
+            "training_examples": training_examples,
+            "holdout": evaluation,
+            "enabled": precision is not None and precision >= settings.CLASSIFIER_MIN_PRECISION
+        }
+        await asyncio.to_thread(self._save, model)
+        return await asyncio.to_thread(self.stats)
+
+    def _save(self, model: Dict[str, Any]):
+        directory = os.path.dirname(self.model_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.model_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(model, f)
+        os.replace(tmp_path, self.model_path)
+        self.reload()
+
+    def stats(self) -> Dict[str, Any]:
+        """Blocking (counts the stored labels); run it off the event loop."""
+        model = self._model or {}
+        return {
+            "enabled": settings.CLASSIFIER_ENABLED,
+            "active": bool(model.get("enabled")),
+            "threshold": settings.CLASSIFIER_SKIP_THRESHOLD,
+            "trained_at": model.get("trained_at"),
+            "training_examples": model.get("training_examples", 0),
+            "holdout": model.get("holdout"),
+            "labels_available": self.labels.count(),
+            "evaluated": self.evaluated,
+            "llm_calls_saved": self.skipped
+        }
+
+
+intent_classifier = IntentClassifier(
+    settings.CLASSIFIER_MODEL_PATH,
+    IntentLabelStore(settings.CLASSIFIER_LABEL_STORE_PATH)
+)
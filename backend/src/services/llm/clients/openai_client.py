@@ -1,12 +1,52 @@
-from openai import OpenAI
+import time
+import httpx
+from openai import OpenAI, AsyncOpenAI
 from src.core.config import settings
+from src.core.tracing import span
+from src.services.llm.metrics import record_call, record_call_error
 
 class OpenAIClient:
     def __init__(self):
         self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = settings.OPENAI_MODEL
+        self._async_client = None
 
-    def get_completion(self, messages: list, model: str = None, temperature: float = 0.0, response_format=None) -> str:
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        # Created lazily so the pooled connections bind to the running event loop
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                timeout=settings.OPENAI_TIMEOUT_SECONDS,
+                max_retries=settings.OPENAI_MAX_RETRIES,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS
+                    ),
+                    timeout=settings.OPENAI_TIMEOUT_SECONDS
+                )
+            )
+        return self._async_client
+
+    def _build_kwargs(self, messages: list, model: str, temperature: float, response_format) -> dict:
+        kwargs = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": temperature,
+        }
+        if response_format:
+            kwargs["response_format"] = response_format
+        return kwargs
+
+    def get_completion(
+        self,
+        messages: list,
+        model: str = None,
+        temperature: float = 0.0,
+        response_format=None,
+        operation: str = "other"
+    ) -> str:
         """
         Get completion from OpenAI API.
         
@@ -15,22 +55,78 @@ class OpenAIClient:
             model: Optional model override
             temperature: Sampling temperature
             response_format: Optional response format (e.g. {"type": "json_object"})
+            operation: Metrics label for the calling stage (e.g. "intent", "extraction")
             
         Returns:
             The content of the response message
         """
-        if model is None:
-            model = self.model
-            
-        kwargs = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-        }
-        if response_format:
-            kwargs["response_format"] = response_format
+        kwargs = self._build_kwargs(messages, model, temperature, response_format)
+
+        started = time.perf_counter()
+        with span(f"llm.{operation}", model=kwargs["model"]) as s:
+            try:
+                raw = self.client.chat.completions.with_raw_response.create(**kwargs)
+            except Exception as e:
+                record_call_error(operation, kwargs["model"], time.perf_counter() - started, e)
+                raise
+            return self._record(raw, operation, kwargs["model"], started, s)
 
-        response = self.client.chat.completions.create(**kwargs)
+    async def get_completion_async(
+        self,
+        messages: list,
+        model: str = None,
+        temperature: float = 0.0,
+        response_format=None,
+        timeout: float = None,
+        operation: str = "other"
+    ) -> str:
+        """
+        Get completion from OpenAI API without blocking the event loop.
+
+        Args:
+            messages: List of message objects
+            model: Optional model override
+            temperature: Sampling temperature
+            response_format: Optional response format (e.g. {"type": "json_object"})
+            timeout: Optional per-call timeout in seconds (defaults to OPENAI_TIMEOUT_SECONDS)
+            operation: Metrics label for the calling stage (e.g. "intent", "extraction")
+
+        Returns:
+            The content of the response message
+
+        Cancelling the awaiting task aborts the in-flight HTTP request.
+        """
+        kwargs = self._build_kwargs(messages, model, temperature, response_format)
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+
+        started = time.perf_counter()
+        with span(f"llm.{operation}", model=kwargs["model"]) as s:
+            try:
+                raw = await self.async_client.chat.completions.with_raw_response.create(**kwargs)
+            except Exception as e:
+                record_call_error(operation, kwargs["model"], time.perf_counter() - started, e)
+                raise
+            return self._record(raw, operation, kwargs["model"], started, s)
+
+    @staticmethod
+    def _record(raw, operation: str, model: str, started: float, trace_span=None) -> str:
+        """Records latency, retries and token usage of a raw response and returns its content."""
+        response = raw.parse()
+        # The SDK stamps each attempt with its retry count
+        retries = int(raw.http_request.headers.get("x-stainless-retry-count", 0) or 0)
+        record_call(operation, model, time.perf_counter() - started, retries, response.usage)
+        if trace_span and response.usage:
+            trace_span.set(
+                retries=retries,
+                prompt_tokens=response.usage.prompt_tokens,
+                completion_tokens=response.usage.completion_tokens
+            )
         return response.choices[0].message.content
 
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
 openai_client = OpenAIClient()
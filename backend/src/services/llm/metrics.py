@@ -0,0 +1,62 @@
+from typing import Any, Optional
+
+from src.core.config import settings
+from src.core.metrics import metrics, DEFAULT_TOKEN_BUCKETS
+
+# Per OpenAI request
+llm_calls = metrics.counter("llm_calls_total", "OpenAI chat completion requests")
+llm_call_errors = metrics.counter("llm_call_errors_total", "OpenAI requests that failed after retries")
+llm_call_retries = metrics.counter("llm_call_retries_total", "Retries made by the OpenAI client")
+llm_call_latency = metrics.histogram("llm_call_duration_seconds", "OpenAI request latency, including retries")
+llm_prompt_tokens = metrics.histogram("llm_prompt_tokens", "Prompt tokens per request", DEFAULT_TOKEN_BUCKETS)
+llm_completion_tokens = metrics.histogram("llm_completion_tokens", "Completion tokens per request", DEFAULT_TOKEN_BUCKETS)
+llm_tokens = metrics.counter("llm_tokens_total", "Tokens billed, by kind (prompt, completion)")
+llm_cost = metrics.counter("llm_cost_usd_total", "Estimated spend from OPENAI_PRICING")
+
+# Per LLMService operation, whichever stage answered it
+llm_requests = metrics.counter(
+    "llm_requests_total", "LLMService operations by outcome (cache_hit, rules, classifier, llm, error)"
+)
+llm_request_latency = metrics.histogram(
+    "llm_request_duration_seconds", "LLMService operation latency by outcome"
+)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """USD cost of a call, or None when the model has no OPENAI_PRICING entry."""
+    prices = settings.OPENAI_PRICING.get(model)
+    if prices is None:
+        # Dated snapshots ("gpt-4o-2024-08-06") are priced like their base model
+        prices = next((p for name, p in settings.OPENAI_PRICING.items() if model.startswith(name + "-")), None)
+    if prices is None:
+        return None
+    input_price, output_price = prices
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def record_call(operation: str, model: str, latency: float, retries: int, usage: Any):
+    llm_calls.inc(operation=operation, model=model)
+    llm_call_latency.observe(latency, operation=operation, model=model)
+    if retries:
+        llm_call_retries.inc(retries, operation=operation, model=model)
+    if usage is None:
+        return
+    prompt_tokens = usage.prompt_tokens or 0
+    completion_tokens = usage.completion_tokens or 0
+    llm_prompt_tokens.observe(prompt_tokens, operation=operation, model=model)
+    llm_completion_tokens.observe(completion_tokens, operation=operation, model=model)
+    llm_tokens.inc(prompt_tokens, operation=operation, model=model, kind="prompt")
+    llm_tokens.inc(completion_tokens, operation=operation, model=model, kind="completion")
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    if cost is not None:
+        llm_cost.inc(cost, operation=operation, model=model)
+
+
+def record_call_error(operation: str, model: str, latency: float, error: BaseException):
+    llm_call_errors.inc(operation=operation, model=model, error=type(error).__name__)
+    llm_call_latency.observe(latency, operation=operation, model=model)
+
+
+def record_request(operation: str, outcome: str, latency: float):
+    llm_requests.inc(operation=operation, outcome=outcome)
+    llm_request_latency.observe(latency, operation=operation, outcome=outcome)
@@ -0,0 +1,225 @@
+import re
+from html import unescape
+from html.parser import HTMLParser
+from typing import List, Optional
+
+# Elements whose content is never visible text
+_SKIP_TAGS = {"style", "script", "head", "title", "xml", "o:p"}
+_BLOCK_TAGS = {
+    "p", "div", "br", "tr", "li", "ul", "ol", "table", "h1", "h2", "h3", "h4", "h5", "h6",
+    "hr", "section", "article", "header", "footer", "pre", "blockquote"
+}
+_CELL_TAGS = {"td", "th"}
+
+# Markers that start the quoted history in Outlook, Gmail and Yahoo HTML
+_QUOTE_IDS = {"divrplyfwdmsg", "appendonsend", "mail-editor-reference-message-container"}
+_QUOTE_CLASSES = {"gmail_quote", "yahoo_quoted", "outlookmessageheader", "moz-cite-prefix"}
+
+# Plain-text reply headers; everything from here on is quoted history
+_REPLY_HEADER_RES = [
+    re.compile(r"^\s*On .{1,200}(?:wrote|a écrit|schrieb)\s*:\s*$", re.IGNORECASE),
+    re.compile(r"^\s*-{2,}\s*(?:Original Message|Forwarded message|Ursprüngliche Nachricht)\s*-{2,}", re.IGNORECASE),
+    re.compile(r"^\s*_{10,}\s*$"),
+]
+_HEADER_FIELD_RE = re.compile(r"^\s*\*?(From|Sent|Date|To|Cc|Subject|Von|Gesendet|An|Betreff)\s*:\*?", re.IGNORECASE)
+
+_SIGNATURE_DELIMITER_RE = re.compile(r"^--\s*$")
+_SIGNOFF_RE = re.compile(
+    r"^\s*(?:thanks|thank you|many thanks|thx|best|best regards|kind regards|warm regards|regards|"
+    r"sincerely|cheers|br|mit freundlichen grüßen|cordialement)[\s,.!]*$",
+    re.IGNORECASE
+)
+_MOBILE_SIGNATURE_RE = re.compile(r"^\s*(?:sent from my \w+|get outlook for \w+).*$", re.IGNORECASE)
+
+# Legal and security boilerplate, matched per paragraph
+_DISCLAIMER_RES = [
+    re.compile(r"\b(?:this|the) (?:e-?mail|message|communication)\b.{0,200}\b(?:confidential|privileged|intended (?:solely|only))", re.IGNORECASE | re.DOTALL),
+    re.compile(r"^\s*(?:\[?external\]?|caution|warning)\s*:?.{0,80}\b(?:outside (?:of )?(?:the|your|our) organi[sz]ation|external sender)", re.IGNORECASE | re.DOTALL),
+    re.compile(r"\bif you (?:have )?received this (?:e-?mail|message) in error\b", re.IGNORECASE),
+    re.compile(r"\bplease consider the environment before printing\b", re.IGNORECASE),
+]
+
+# Shorter new text without any numbers ("FYI, see below") marks a forward; quoted content is kept
+_MIN_NEW_TEXT_CHARS = 80
+
+# Signatures longer than this are not recognised as signatures
+_MAX_SIGNATURE_LINES = 10
+_MAX_SIGNATURE_LINE_CHARS = 80
+
+# Text that never appears in a signature block: list items, quantities, part numbers
+_LINE_ITEM_RES = [
+    re.compile(r"^\s*(?:[-*•]|\d{1,3}[.)])\s+\S"),
+    re.compile(r"\b(?:qty|qnty|quantity)\b|\b\d+\s*(?:x|pcs?|pieces|units?|ea)\b|\bx\s*\d+\b", re.IGNORECASE),
+    re.compile(r"\bCESS[\s_-]?\d{3,}", re.IGNORECASE),
+    # Upper-case codes with at least two digits, e.g. "LM317T", "SN74HC595N"
+    re.compile(r"\b(?=[A-Z0-9-]*\d[A-Z0-9-]*\d)(?=[A-Z0-9-]*[A-Z])[A-Z0-9][A-Z0-9-]{3,}\b"),
+]
+
+_TRUNCATION_MARKER = "\n[... truncated]"
+
+
+class _TextExtractor(HTMLParser):
+    """Visible text of an HTML email, with block structure kept as newlines and quoted history dropped."""
+
+    def __init__(self, keep_quoted: bool = False):
+        super().__init__(convert_charrefs=True)
+        self.keep_quoted = keep_quoted
+        self.parts: List[str] = []
+        self._skip_depth = 0
+        self._quote_depth = 0
+        self.stopped = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.stopped:
+            return
+        attributes = dict(attrs)
+        element_id = (attributes.get("id") or "").lower()
+        classes = set((attributes.get("class") or "").lower().split())
+        if not self.keep_quoted and (element_id in _QUOTE_IDS or classes & _QUOTE_CLASSES):
+            # Quoted history runs to the end of the message
+            self.stopped = True
+            return
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "blockquote" and not self.keep_quoted:
+            self._quote_depth += 1
+        elif tag in _CELL_TAGS:
+            self.parts.append(" | ")
+        elif tag == "li":
+            self.parts.append("\n- ")
+        elif tag in _BLOCK_TAGS and tag != "tr":
+            # Rows only end with a newline so tables stay compact
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if not self.stopped and tag in ("br", "hr"):
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if self.stopped:
+            return
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag == "blockquote" and not self.keep_quoted:
+            self._quote_depth = max(self._quote_depth - 1, 0)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.stopped and not self._skip_depth and not self._quote_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html: str, keep_quoted: bool = False) -> str:
+    parser = _TextExtractor(keep_quoted)
+    parser.feed(html)
+    parser.close()
+    text = "".join(parser.parts).replace("\xa0", " ")
+    # Table rows come out as " | a | b"; tidy the leading separator
+    return "\n".join(re.sub(r"^\s*\|\s*", "", line) for line in text.splitlines())
+
+
+def strip_quoted_history(text: str) -> str:
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if any(pattern.match(line) for pattern in _REPLY_HEADER_RES):
+            return "\n".join(lines[:i])
+        # Outlook text replies: a "From:" line followed by Sent/To/Subject header lines
+        if _HEADER_FIELD_RE.match(line) and line.strip().lower().lstrip("*").startswith(("from", "von")):
+            following = [l for l in lines[i + 1:i + 6] if l.strip()]
+            if sum(1 for l in following if _HEADER_FIELD_RE.match(l)) >= 2:
+                return "\n".join(lines[:i])
+    return "\n".join(line for line in lines if not line.lstrip().startswith(">"))
+
+
+def _looks_like_signature(lines: List[str]) -> bool:
+    """A few short lines (name, title, phone) and nothing that could be part of a request."""
+    content = [line for line in lines if line.strip()]
+    return len(content) <= _MAX_SIGNATURE_LINES and all(
+        len(line) <= _MAX_SIGNATURE_LINE_CHARS and not any(pattern.search(line) for pattern in _LINE_ITEM_RES)
+        for line in content
+    )
+
+
+def strip_signature(text: str) -> str:
+    lines = text.rstrip().splitlines()
+    for i, line in enumerate(lines):
+        if _SIGNATURE_DELIMITER_RE.match(line) or _MOBILE_SIGNATURE_RE.match(line):
+            lines = lines[:i]
+            break
+    # A sign-off near the end: keep it, drop the name/title/phone block after it. A
+    # sign-off followed by more of the request ("Thanks!" then the line items) is not one
+    for i in range(len(lines) - 1, max(len(lines) - _MAX_SIGNATURE_LINES - 2, -1), -1):
+        if _SIGNOFF_RE.match(lines[i]):
+            if _looks_like_signature(lines[i + 1:]):
+                return "\n".join(lines[:i + 1])
+            break
+    return "\n".join(lines)
+
+
+def strip_disclaimers(text: str) -> str:
+    paragraphs = re.split(r"\n\s*\n", text)
+    return "\n\n".join(p for p in paragraphs if not any(pattern.search(p) for pattern in _DISCLAIMER_RES))
+
+
+def collapse_whitespace(text: str) -> str:
+    lines = [re.sub(r"[ \t\r\f\v]+", " ", line).strip() for line in text.splitlines()]
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def normalize_body(content: Optional[str], content_type: Optional[str] = None) -> str:
+    """
+    Compact text for prompts: HTML converted to text, quoted reply chains,
+    disclaimers and signatures removed, whitespace collapsed. Messages with
+    almost no text of their own (forwards) keep the quoted content.
+    """
+    if not content:
+        return ""
+    is_html = (content_type or "").lower() == "html" or (
+        content_type is None and re.search(r"<(?:html|body|div|p|br|table)\b", content, re.IGNORECASE)
+    )
+    text = collapse_whitespace(html_to_text(content) if is_html else unescape(content))
+    new_text = strip_quoted_history(text)
+    if len(new_text) < _MIN_NEW_TEXT_CHARS and not re.search(r"\d", new_text):
+        # Forwarded RFQs ("FYI, see below") carry the request in the quoted part
+        text = collapse_whitespace(html_to_text(content, keep_quoted=True)) if is_html else text
+    else:
+        text = new_text
+    text = strip_disclaimers(text)
+    text = strip_signature(text)
+    return collapse_whitespace(text)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text to roughly max_tokens, at a line boundary where possible."""
+    if max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max_tokens * 4 - len(_TRUNCATION_MARKER)
+    cut = text.rfind("\n", 0, limit)
+    if cut < limit // 2:
+        cut = limit
+    return text[:cut].rstrip() + _TRUNCATION_MARKER
+
+
+def fit_to_budget(texts: List[str], max_tokens: int) -> List[str]:
+    """
+    Shares a token budget between several texts (e.g. attachments): short
+    texts are kept whole and the remainder is split evenly among the rest.
+    """
+    if max_tokens <= 0 or sum(estimate_tokens(t) for t in texts) <= max_tokens:
+        return list(texts)
+    result = list(texts)
+    remaining = max_tokens
+    pending = sorted(range(len(texts)), key=lambda i: estimate_tokens(texts[i]))
+    while pending:
+        share = remaining // len(pending)
+        i = pending.pop(0)
+        result[i] = truncate_to_tokens(texts[i], share)
+        remaining -= estimate_tokens(result[i])
+    return result
@@ -1,4 +1,5 @@
 # System prompts and templates for LLM Service
+import hashlib
 
 # Intent Detection Prompts
 CUSTOMER_REQUEST_SYSTEM_PROMPT = """You are an intelligent email analyzer for a quoting system.
@@ -39,6 +40,7 @@ CRITICAL RULES:
 1. "CESS" numbers (starting with CESS-) are ALWAYS part numbers. Ensure they are extracted into the 'partNumber' field.
 2. If a request mentions a CESS number and a quantity (e.g., "qty (1) CESS-xxxx"), extract both correctly.
 3. Do not confuse the part number with the product name. If only a part number is given, 'name' can be null or the part number itself.
+4. Attachments (RFQ PDFs, spreadsheets, documents) are provided as extracted text. Treat table rows listing parts and quantities as separate products.
 
 EXAMPLES:
 
@@ -81,4 +83,51 @@ Respond with a valid JSON object containing:
 
 Email Subject: {subject}
 Email Body: {body}
+
+Attachments:
+{attachments}
+"""
+
+# Thread Update Prompts (a reply in a thread whose products are already known)
+THREAD_UPDATE_SYSTEM_PROMPT = """You maintain the product list of an ongoing quote request (RFQ) email thread.
+You are given the products extracted from the thread so far and only the newest message, without the earlier history.
+
+Apply what the newest message changes and return the complete, updated list:
+- Changed quantities replace the old quantity of that product.
+- Newly requested products are added; products the customer drops are removed.
+- A substitute or corrected part number replaces the product it refers to.
+- Products the message does not mention are kept exactly as they are.
+- If the message changes nothing (thanks, confirmations, questions about delivery), return the list unchanged.
+
+Use the same product fields and CESS/MPN rules as for extraction: "CESS" numbers (starting with CESS-) are ALWAYS part numbers with partNumberType "CESS".
+Keep the opportunity name unless the scope of the request clearly changed.
 """
+
+THREAD_UPDATE_USER_PROMPT = """
+Update the thread's products with the newest message.
+Respond with a valid JSON object containing:
+- "opportunity_name": string
+- "products": the complete updated list of product objects (name, quantity, partNumber, partNumberType, description)
+
+Opportunity Name: {opportunity_name}
+Current Products (JSON): {products}
+
+Newest Message Subject: {subject}
+Newest Message Body: {body}
+
+Newest Message Attachments:
+{attachments}
+"""
+
+
+def prompt_version(*templates: str) -> str:
+    """Fingerprint of a set of templates, used to invalidate cached LLM results when they change."""
+    digest = hashlib.sha256()
+    for template in templates:
+        digest.update(template.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+INTENT_PROMPT_VERSION = prompt_version(CUSTOMER_REQUEST_SYSTEM_PROMPT, CUSTOMER_REQUEST_USER_PROMPT)
+EXTRACTION_PROMPT_VERSION = prompt_version(PRODUCT_EXTRACTION_SYSTEM_PROMPT, PRODUCT_EXTRACTION_USER_PROMPT)
+THREAD_UPDATE_PROMPT_VERSION = prompt_version(THREAD_UPDATE_SYSTEM_PROMPT, THREAD_UPDATE_USER_PROMPT)
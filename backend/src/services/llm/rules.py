@@ -0,0 +1,230 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from src.schemas.products import Product
+
+# CESS numbers, e.g. "CESS-748203-00001", "cess 12345-001"
+CESS_RE = re.compile(r"\bCESS[\s_-]?(\d{3,}(?:-[A-Z0-9]+)*)\b", re.IGNORECASE)
+
+# Part numbers announced by a label, e.g. "MPN: LM317T", "P/N ABC-123", "part number 1N4148"
+LABELLED_MPN_RE = re.compile(
+    r"\b(?:MPN|P/?N|part\s*(?:no\.?|number|num|#))\s*[:#.]?\s*([A-Z0-9][A-Z0-9./-]{1,30}[A-Z0-9])",
+    re.IGNORECASE
+)
+
+# Bare manufacturer part numbers: upper-case letters and digits mixed, e.g. "LM317", "SN74HC595N"
+BARE_MPN_RE = re.compile(r"\b(?=[A-Z0-9-]*\d)(?=[A-Z0-9-]*[A-Z])[A-Z0-9][A-Z0-9-]{2,24}[A-Z0-9]\b")
+
+# Quantities written before the part ("qty (1) CESS-...", "5 x CESS-...", "10 pcs LM317")
+QTY_BEFORE_RE = re.compile(
+    r"(?:\b(?:qty|qnty|quantity)\s*[:=#.]?\s*\(?\s*(\d{1,7})\s*\)?"
+    r"|\b(\d{1,7})\s*(?:x|pcs?|pieces|units?|ea|each)\b\.?)\s*[:-]?\s*(?:of\s+)?$",
+    re.IGNORECASE
+)
+
+# Quantities written after the part ("CESS-... qty 2", "CESS-... x 5", "LM317 - 10 pcs", "| 5 |")
+QTY_AFTER_RE = re.compile(
+    r"^\s*[,;:|-]?\s*(?:\(?\s*(?:qty|qnty|quantity)\s*[:=#.]?\s*\(?\s*(\d{1,7})\s*\)?"
+    r"|x\s*(\d{1,7})\b"
+    r"|(\d{1,7})\s*(?:x|pcs?|pieces|units?|ea|each)\b"
+    r"|(\d{1,7})\s*(?:\||$))",
+    re.IGNORECASE
+)
+
+# Any quantity mention, used to spot line items the rules could not identify
+QTY_ANY_RE = re.compile(
+    r"\b(?:qty|qnty|quantity)\s*[:=#.]?\s*\(?\s*\d{1,7}|\b\d{1,7}\s*(?:pcs|pieces|units)\b",
+    re.IGNORECASE
+)
+
+# "5x", "10 x" without a unit word
+QTY_TIMES_RE = re.compile(r"\b\d{1,7}\s*x\b", re.IGNORECASE)
+
+# Numbers that are not quantities: references, dates, times, durations, phone numbers
+_MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+NON_QUANTITY_RE = re.compile(
+    r"\b(?:RFQ|PO|REF|INV|invoice|order|ticket|case|no|nr)\.?\s*[:#]?\s*\d+"
+    r"|\b\d{1,4}(?:[/.:-]\d{1,4})+\b"
+    rf"|\b\d{{1,2}}(?:st|nd|rd|th)?\s+{_MONTHS}|\b{_MONTHS}\s+\d{{1,4}}(?:st|nd|rd|th)?\b"
+    r"|\b\d{1,4}\s*(?:am|pm|%|h|hrs?|hours?|days?|weeks?|months?|years?)\b"
+    r"|(?:\+|\b(?:tel|phone|mob|mobile|fax)\b).*",
+    re.IGNORECASE
+)
+LIST_MARKER_RE = re.compile(r"^\s*\d{1,3}[.)]\s+")
+BARE_NUMBER_RE = re.compile(r"\b\d{1,7}\b")
+
+# A further item asked for in words, e.g. "also need the blue widgets", "please add some cables"
+ITEM_REQUEST_RE = re.compile(
+    r"\b(?:also|plus|additionally)\s+(?:need|want|require|add|quote|include)\b"
+    r"|\b(?:add|include)\s+(?:some|a|an|the|a few)\s+\w+",
+    re.IGNORECASE
+)
+
+# Bare tokens that look like part numbers but are not
+BARE_MPN_STOPWORDS = re.compile(r"^(?:RFQ|PO|REF|INV|Q[1-4]|FY)[-\d]*$")
+
+CONFIDENCE_CESS_WITH_QTY = 0.95
+CONFIDENCE_CESS = 0.8
+CONFIDENCE_LABELLED_MPN_WITH_QTY = 0.9
+CONFIDENCE_LABELLED_MPN = 0.75
+CONFIDENCE_BARE_MPN = 0.6
+# Cap when a line mentions a quantity or item the rules could not tie to a part,
+# or a part is asked for twice with different quantities
+CONFIDENCE_UNMATCHED_ITEM = 0.5
+
+
+@dataclass
+class RuleExtraction:
+    products: List[Product] = field(default_factory=list)
+    confidence: float = 0.0
+
+    @property
+    def opportunity_name(self) -> Optional[str]:
+        if not self.products:
+            return None
+        first = self.products[0]
+        label = f"{first.quantity}x {first.part_number}" if first.quantity else first.part_number
+        if len(self.products) == 1:
+            return f"Quote for {label}"
+        return f"Quote for {label} and {len(self.products) - 1} more"
+
+
+def _quantity(match: Optional[re.Match]) -> Optional[int]:
+    if not match:
+        return None
+    for group in match.groups():
+        if group:
+            return int(group)
+    return None
+
+
+class RuleExtractor:
+    """
+    Deterministic extractor for the common RFQ shapes ("qty N CESS-...",
+    "5 x CESS-...", "MPN: LM317 - 10 pcs", spreadsheet rows).
+
+    Each product carries a confidence that depends on how it was found, and
+    the extraction's confidence is the lowest of them. Callers fall back to
+    the LLM below their threshold.
+    """
+
+    def _parts_in_line(self, line: str) -> List[Tuple[re.Match, str, str, float]]:
+        """Part number matches in a line as (match, part_number, type, base confidence)."""
+        found = []
+        taken: List[Tuple[int, int]] = []
+
+        def overlaps(match: re.Match) -> bool:
+            return any(match.start() < end and start < match.end() for start, end in taken)
+
+        for match in CESS_RE.finditer(line):
+            found.append((match, f"CESS-{match.group(1).upper()}", "CESS", CONFIDENCE_CESS))
+            taken.append(match.span())
+        for match in LABELLED_MPN_RE.finditer(line):
+            if not overlaps(match) and not match.group(1).upper().startswith("CESS"):
+                found.append((match, match.group(1).upper(), "MPN", CONFIDENCE_LABELLED_MPN))
+                taken.append(match.span())
+        if found or not self._has_quantity(line):
+            return sorted(found, key=lambda item: item[0].start())
+        # Unlabelled part numbers are only considered on lines that also carry a quantity
+        for match in BARE_MPN_RE.finditer(line):
+            if not overlaps(match) and not BARE_MPN_STOPWORDS.match(match.group(0)):
+                found.append((match, match.group(0), "MPN", CONFIDENCE_BARE_MPN))
+                taken.append(match.span())
+        return sorted(found, key=lambda item: item[0].start())
+
+    @staticmethod
+    def _has_quantity(text: str) -> bool:
+        return bool(QTY_ANY_RE.search(text) or QTY_TIMES_RE.search(text))
+
+    def _has_untied_item(self, text: str, has_parts: bool) -> bool:
+        """Whether text outside the matched parts and quantities may ask for something else."""
+        if self._has_quantity(text):
+            return True
+        numbers = NON_QUANTITY_RE.sub(" ", LIST_MARKER_RE.sub("", text))
+        if BARE_NUMBER_RE.search(numbers):
+            # "3 of the blue widgets"
+            return True
+        # Wording like "also add" only counts on lines that named no part themselves
+        return not has_parts and bool(ITEM_REQUEST_RE.search(text))
+
+    def _extract_line(self, line: str) -> Tuple[List[Tuple[Product, float]], bool]:
+        """
+        Returns:
+            (product, confidence) pairs for the line, and whether the line has
+            a quantity or item that could not be tied to a part number
+        """
+        parts = self._parts_in_line(line)
+        if not parts:
+            return [], self._has_untied_item(line, has_parts=False)
+
+        # Quantities either precede every part on the line or follow every part
+        gaps = []
+        for i, (match, _, _, _) in enumerate(parts):
+            prev_end = parts[i - 1][0].end() if i else 0
+            next_start = parts[i + 1][0].start() if i + 1 < len(parts) else len(line)
+            gaps.append((prev_end, match, next_start))
+        quantity_first = QTY_BEFORE_RE.search(line[:parts[0][0].start()]) is not None
+
+        products = []
+        consumed = [match.span() for match, _, _, _ in parts]
+        for (_, part_number, part_type, confidence), (prev_end, match, next_start) in zip(parts, gaps):
+            if quantity_first:
+                offset = prev_end
+                quantity_match = QTY_BEFORE_RE.search(line[prev_end:match.start()])
+            else:
+                offset = match.end()
+                quantity_match = QTY_AFTER_RE.match(line[match.end():next_start])
+            quantity = _quantity(quantity_match)
+            if quantity is not None:
+                consumed.append((offset + quantity_match.start(), offset + quantity_match.end()))
+                if part_type == "CESS":
+                    confidence = CONFIDENCE_CESS_WITH_QTY
+                elif confidence == CONFIDENCE_LABELLED_MPN:
+                    confidence = CONFIDENCE_LABELLED_MPN_WITH_QTY
+            products.append((
+                Product(quantity=quantity, part_number=part_number, part_number_type=part_type),
+                confidence
+            ))
+
+        # Whatever is left must not mention further items (e.g. "20 units of blue widgets", "and 3 more")
+        remaining = list(line)
+        for start, end in consumed:
+            remaining[start:end] = " " * (end - start)
+        return products, self._has_untied_item("".join(remaining), has_parts=True)
+
+    def extract(self, subject: str, body: str, attachments: Optional[List[str]] = None) -> RuleExtraction:
+        texts = [subject or "", body or ""] + list(attachments or [])
+        by_part: dict = {}
+        confidences: dict = {}
+        unmatched_items = False
+        conflicting = False
+
+        for text in texts:
+            for line in text.splitlines():
+                if not line.strip():
+                    continue
+                products, unmatched = self._extract_line(line)
+                unmatched_items = unmatched_items or unmatched
+                for product, confidence in products:
+                    existing = by_part.get(product.part_number)
+                    if existing is None:
+                        by_part[product.part_number] = product
+                        confidences[product.part_number] = confidence
+                    elif existing.quantity is None and product.quantity is not None:
+                        # e.g. the subject names the part and the body gives the quantity
+                        by_part[product.part_number] = product
+                        confidences[product.part_number] = max(confidences[product.part_number], confidence)
+                    elif product.quantity is not None and product.quantity != existing.quantity:
+                        # e.g. "CESS-... x 2 in red and CESS-... x 3 in blue": variants the rules cannot tell apart
+                        conflicting = True
+
+        if not by_part:
+            return RuleExtraction()
+        confidence = min(confidences.values())
+        if unmatched_items or conflicting:
+            confidence = min(confidence, CONFIDENCE_UNMATCHED_ITEM)
+        return RuleExtraction(products=list(by_part.values()), confidence=confidence)
+
+
+rule_extractor = RuleExtractor()
@@ -1,15 +1,52 @@
 import json
+import time
+import asyncio
 import logging
 from typing import Dict, List, Optional, Any
 
+from src.core.config import settings
 from src.services.llm.clients.openai_client import openai_client
 from src.services.llm import prompts
+from src.services.llm.cache import llm_cache, make_cache_key
+from src.services.llm.rules import rule_extractor
+from src.services.llm.classifier import intent_classifier
+from src.services.llm.normalize import truncate_to_tokens, fit_to_budget
+from src.services.llm.metrics import record_request
 
 logger = logging.getLogger(__name__)
 
 class LLMService:
     def __init__(self):
         self.client = openai_client
+        self.cache = llm_cache
+        self.rules = rule_extractor
+        self.classifier = intent_classifier
+        self.rule_extractions = 0 # Extractions answered by the rules without an LLM call
+
+    async def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not settings.LLM_CACHE_ENABLED:
+            return None
+        try:
+            return await self.cache.aget(key)
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+
+    async def _cache_set(self, key: str, value: Dict[str, Any]):
+        if not settings.LLM_CACHE_ENABLED:
+            return
+        try:
+            await self.cache.aset(key, value)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    async def _record_label(self, subject: str, body: str, result: Dict[str, Any]):
+        if not settings.CLASSIFIER_ENABLED:
+            return
+        try:
+            await asyncio.to_thread(self.classifier.record_label, subject, body, result)
+        except Exception as e:
+            logger.warning(f"Could not store intent label: {e}")
 
     async def analyze_email_intent(self, subject: str, body: str) -> Dict[str, Any]:
         """
@@ -22,6 +59,24 @@ class LLMService:
         Returns: 
             Dict containing 'is_customer_request', 'confidence', and 'reasoning'
         """
+        started = time.perf_counter()
+        body = truncate_to_tokens(body, settings.LLM_INTENT_BODY_TOKEN_BUDGET)
+        cache_key = make_cache_key("intent", self.client.model, prompts.INTENT_PROMPT_VERSION, subject, body)
+        cached = await self._cache_get(cache_key)
+        if cached is not None:
+            record_request("intent", "cache_hit", time.perf_counter() - started)
+            return cached
+
+        # Clear non-requests (newsletters, invites, internal mail) are settled locally
+        try:
+            skipped = self.classifier.predict_skip(subject, body)
+        except Exception as e:
+            logger.warning(f"Intent pre-classifier failed: {e}")
+            skipped = None
+        if skipped is not None:
+            record_request("intent", "classifier", time.perf_counter() - started)
+            return skipped
+
         messages = [
             {"role": "system", "content": prompts.CUSTOMER_REQUEST_SYSTEM_PROMPT},
             {"role": "user", "content": prompts.CUSTOMER_REQUEST_USER_PROMPT.format(subject=subject, body=body)}
@@ -29,14 +84,21 @@ class LLMService:
         
         try:
             # We enforce JSON response format for structured output
-            response_content = self.client.get_completion(
+            response_content = await self.client.get_completion_async(
                 messages=messages,
                 response_format={"type": "json_object"},
-                temperature=0.1 # Low temperature for consistent classification
+                temperature=0.1, # Low temperature for consistent classification
+                timeout=settings.LLM_INTENT_TIMEOUT_SECONDS,
+                operation="intent"
             )
-            return json.loads(response_content)
+            result = json.loads(response_content)
+            await self._cache_set(cache_key, result)
+            await self._record_label(subject, body, result)
+            record_request("intent", "llm", time.perf_counter() - started)
+            return result
         except Exception as e:
             logger.error(f"Error analyzing email intent: {e}")
+            record_request("intent", "error", time.perf_counter() - started)
             # Fail safe response
             return {
                 "is_customer_request": False, 
@@ -51,28 +113,112 @@ class LLMService:
         Args:
             subject: The subject of the email
             body: The text body of the email
-            attachments: List of attachment contents (text) - Placeholder for now
+            attachments: Extracted text of each attachment (see AttachmentTextService)
             
         Returns:
             Dict containing a list of 'products'
         """
-        # Note: Logic to handle attachments would go here. 
-        # For now, we are focusing on extracting from the body as per instructions.
-        
+        started = time.perf_counter()
+        # Simple "qty N CESS-..." requests are answered by the deterministic rules
+        if settings.RULE_EXTRACTION_ENABLED:
+            ruled = self.rules.extract(subject, body, attachments)
+            if ruled.products and ruled.confidence >= settings.RULE_EXTRACTION_MIN_CONFIDENCE:
+                self.rule_extractions += 1
+                record_request("extraction", "rules", time.perf_counter() - started)
+                return {
+                    "opportunity_name": ruled.opportunity_name,
+                    "products": [product.model_dump(by_alias=True) for product in ruled.products]
+                }
+
+        body = truncate_to_tokens(body, settings.LLM_EXTRACTION_BODY_TOKEN_BUDGET)
+        attachments = fit_to_budget(attachments, settings.LLM_EXTRACTION_ATTACHMENT_TOKEN_BUDGET)
+
+        cache_key = make_cache_key(
+            "extraction", self.client.model, prompts.EXTRACTION_PROMPT_VERSION, subject, body, attachments
+        )
+        cached = await self._cache_get(cache_key)
+        if cached is not None:
+            record_request("extraction", "cache_hit", time.perf_counter() - started)
+            return cached
+
         messages = [
             {"role": "system", "content": prompts.PRODUCT_EXTRACTION_SYSTEM_PROMPT},
-            {"role": "user", "content": prompts.PRODUCT_EXTRACTION_USER_PROMPT.format(subject=subject, body=body)}
+            {"role": "user", "content": prompts.PRODUCT_EXTRACTION_USER_PROMPT.format(
+                subject=subject, body=body, attachments="\n\n".join(attachments) or "(none)"
+            )}
         ]
 
         try:
-            response_content = self.client.get_completion(
+            response_content = await self.client.get_completion_async(
                 messages=messages,
                 response_format={"type": "json_object"},
-                temperature=0.1 
+                temperature=0.1,
+                timeout=settings.LLM_EXTRACTION_TIMEOUT_SECONDS,
+                operation="extraction"
             )
-            return json.loads(response_content)
+            result = json.loads(response_content)
+            await self._cache_set(cache_key, result)
+            record_request("extraction", "llm", time.perf_counter() - started)
+            return result
         except Exception as e:
             logger.error(f"Error extracting product data: {e}")
+            record_request("extraction", "error", time.perf_counter() - started)
             return {"products": [], "error": str(e)}
 
+    async def update_product_data(
+        self,
+        subject: str,
+        opportunity_name: Optional[str],
+        products: List[Dict[str, Any]],
+        body: str,
+        attachments: List[str] = []
+    ) -> Dict[str, Any]:
+        """
+        Updates a thread's product list with its newest message. Only that
+        message's new text is sent, together with the current list, instead
+        of the whole thread.
+
+        Returns:
+            Dict containing the complete updated 'products' and 'opportunity_name'
+        """
+        started = time.perf_counter()
+        body = truncate_to_tokens(body, settings.LLM_THREAD_UPDATE_BODY_TOKEN_BUDGET)
+        attachments = fit_to_budget(attachments, settings.LLM_EXTRACTION_ATTACHMENT_TOKEN_BUDGET)
+        current = json.dumps(products, separators=(",", ":"))
+
+        cache_key = make_cache_key(
+            "thread_update", self.client.model, prompts.THREAD_UPDATE_PROMPT_VERSION,
+            subject, "\0".join((opportunity_name or "", current, body)), attachments
+        )
+        cached = await self._cache_get(cache_key)
+        if cached is not None:
+            record_request("thread_update", "cache_hit", time.perf_counter() - started)
+            return cached
+
+        messages = [
+            {"role": "system", "content": prompts.THREAD_UPDATE_SYSTEM_PROMPT},
+            {"role": "user", "content": prompts.THREAD_UPDATE_USER_PROMPT.format(
+                opportunity_name=opportunity_name or "(none)", products=current,
+                subject=subject, body=body, attachments="\n\n".join(attachments) or "(none)"
+            )}
+        ]
+
+        try:
+            response_content = await self.client.get_completion_async(
+                messages=messages,
+                response_format={"type": "json_object"},
+                temperature=0.1,
+                timeout=settings.LLM_EXTRACTION_TIMEOUT_SECONDS,
+                operation="thread_update"
+            )
+            result = json.loads(response_content)
+            await self._cache_set(cache_key, result)
+            record_request("thread_update", "llm", time.perf_counter() - started)
+            return result
+        except Exception as e:
+            logger.error(f"Error updating thread product data: {e}")
+            record_request("thread_update", "error", time.perf_counter() - started)
+            # The thread keeps its current products
+            return {"opportunity_name": opportunity_name, "products": products, "error": str(e)}
+
 llm_service = LLMService()
@@ -0,0 +1,530 @@
+import asyncio
+import hmac
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Set
+
+from src.core.config import settings
+from src.services.email.graph_client import graph_client
+from src.services.email.service import email_service
+from src.services.analysis.service import analysis_service
+
+logger = logging.getLogger(__name__)
+
+INBOX_RESOURCE = "me/mailFolders('inbox')/messages"
+# Subscriptions registered by LocalChangeNotifier never exist on Graph
+LOCAL_SUBSCRIPTION_PREFIX = "local-"
+# Lease that lets one uvicorn worker at a time run the renewal loop
+RENEWAL_LEASE = "subscription_renewal"
+
+
+class SubscriptionStore:
+    """SQLite (WAL mode) record of Graph subscriptions, keyed by subscription id."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS subscriptions ("
+                "subscription_id TEXT PRIMARY KEY, session_id TEXT NOT NULL, "
+                "client_state TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS subscriptions_session ON subscriptions(session_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS subscriptions_expires ON subscriptions(expires_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        return {"subscription_id": row[0], "session_id": row[1], "client_state": row[2], "expires_at": row[3]}
+
+    def save(self, subscription_id: str, session_id: str, client_state: str, expires_at: float):
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO subscriptions (subscription_id, session_id, client_state, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (subscription_id, session_id, client_state, expires_at)
+            )
+
+    def get(self, subscription_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT subscription_id, session_id, client_state, expires_at FROM subscriptions WHERE subscription_id = ?",
+                (subscription_id,)
+            ).fetchone()
+        return self._row(row) if row else None
+
+    def for_session(self, session_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT subscription_id, session_id, client_state, expires_at FROM subscriptions WHERE session_id = ?",
+                (session_id,)
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def expiring_before(self, timestamp: float) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT subscription_id, session_id, client_state, expires_at FROM subscriptions WHERE expires_at < ?",
+                (timestamp,)
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def delete(self, subscription_id: str):
+        with self._lock:
+            self._db().execute("DELETE FROM subscriptions WHERE subscription_id = ?", (subscription_id,))
+
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        """Takes or extends a named lease; False while another holder's lease is still valid."""
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                (name, holder, now + ttl_seconds, now)
+            )
+            row = conn.execute("SELECT holder FROM leases WHERE name = ?", (name,)).fetchone()
+        return row is not None and row[0] == holder
+
+
+class NotificationResultStore:
+    """
+    Analyses of notified mail and the notifications already taken, in the
+    subscriptions' SQLite database, so every uvicorn worker sees the same
+    results and a redelivered notification is dropped whichever worker gets it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS notification_results (
+                    session_id TEXT NOT NULL,
+                    email_id TEXT NOT NULL,
+                    subject TEXT,
+                    received_at REAL NOT NULL,
+                    analysis TEXT NOT NULL,
+                    PRIMARY KEY (session_id, email_id)
+                );
+                CREATE INDEX IF NOT EXISTS notification_results_recent ON notification_results(session_id, received_at);
+                CREATE TABLE IF NOT EXISTS notification_seen (
+                    session_id TEXT NOT NULL,
+                    message_id TEXT NOT NULL,
+                    claimed_at REAL NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (session_id, message_id)
+                );
+            """)
+            self._conn = conn
+        return self._conn
+
+    def claim(self, session_id: str, message_id: str) -> bool:
+        """
+        Marks a notified message as taken; False if it is already analyzed or
+        was taken less than NOTIFICATION_CLAIM_TIMEOUT_SECONDS ago. An older
+        claim that never finished (the worker restarted with it queued) is
+        taken over.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            claimed = conn.execute(
+                "INSERT INTO notification_seen (session_id, message_id, claimed_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (session_id, message_id) DO UPDATE SET claimed_at = excluded.claimed_at "
+                "WHERE notification_seen.done = 0 AND notification_seen.claimed_at < ?",
+                (session_id, message_id, now, now - settings.NOTIFICATION_CLAIM_TIMEOUT_SECONDS)
+            ).rowcount > 0
+            if claimed:
+                # Rowids only grow, so the oldest claims are the lowest
+                conn.execute(
+                    "DELETE FROM notification_seen WHERE rowid <= (SELECT MAX(rowid) FROM notification_seen) - ?",
+                    (settings.NOTIFICATION_DEDUP_MAX_ENTRIES,)
+                )
+        return claimed
+
+    def release(self, session_id: str, message_id: str):
+        """Undoes a claim, so a redelivery of the notification is taken again."""
+        with self._lock:
+            self._db().execute(
+                "DELETE FROM notification_seen WHERE session_id = ? AND message_id = ? AND done = 0",
+                (session_id, message_id)
+            )
+
+    def complete(self, session_id: str, message_id: str):
+        """Marks a claimed message as analyzed; redeliveries are dropped from now on."""
+        with self._lock:
+            self._db().execute(
+                "UPDATE notification_seen SET done = 1 WHERE session_id = ? AND message_id = ?", (session_id, message_id)
+            )
+
+    def add(self, session_id: str, result: Dict[str, Any]):
+        """
+        Stores a result, keeping the newest NOTIFICATION_RESULTS_PER_SESSION
+        per session, and completes the message's claim in the same transaction.
+        """
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO notification_results (session_id, email_id, subject, received_at, analysis) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (session_id, result["email_id"], result.get("subject"), result["received_at"], json.dumps(result["analysis"]))
+                )
+                conn.execute(
+                    "DELETE FROM notification_results WHERE session_id = ? AND email_id NOT IN ("
+                    "SELECT email_id FROM notification_results WHERE session_id = ? ORDER BY received_at DESC LIMIT ?)",
+                    (session_id, session_id, settings.NOTIFICATION_RESULTS_PER_SESSION)
+                )
+                conn.execute(
+                    "UPDATE notification_seen SET done = 1 WHERE session_id = ? AND message_id = ?",
+                    (session_id, result["email_id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def recent(self, session_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT email_id, subject, received_at, analysis FROM notification_results "
+                "WHERE session_id = ? ORDER BY received_at DESC LIMIT ?",
+                (session_id, settings.NOTIFICATION_RESULTS_PER_SESSION)
+            ).fetchall()
+        return [
+            {"email_id": row[0], "subject": row[1], "received_at": row[2], "analysis": json.loads(row[3])}
+            for row in rows
+        ]
+
+    def forget(self, session_id: str):
+        with self._lock:
+            conn = self._db()
+            conn.execute("DELETE FROM notification_results WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM notification_seen WHERE session_id = ?", (session_id,))
+
+
+class SubscriptionManager:
+    """
+    Creates, renews and removes Graph change-notification subscriptions for
+    new inbox messages. Graph caps message subscriptions at just under three
+    days, so a background loop renews any that expire within
+    NOTIFICATION_RENEW_BEFORE_SECONDS. Every worker runs the loop, but only
+    the one holding the renewal lease in the store renews.
+    """
+
+    def __init__(self, store: SubscriptionStore):
+        self.graph = graph_client
+        self.email_service = email_service
+        self.store = store
+        self.worker_id = uuid.uuid4().hex
+
+    @staticmethod
+    def _expiration() -> datetime:
+        return datetime.now(timezone.utc) + timedelta(minutes=settings.NOTIFICATION_SUBSCRIPTION_MINUTES)
+
+    @staticmethod
+    def _format(expiration: datetime) -> str:
+        return expiration.strftime("%Y-%m-%dT%H:%M:%S.0000000Z")
+
+    async def subscribe(self, session_id: str) -> Dict[str, Any]:
+        """Subscribes the session's inbox, reusing an existing subscription if there is one."""
+        if not settings.NOTIFICATION_URL:
+            raise ValueError("NOTIFICATION_URL is not configured")
+
+        existing = [
+            s for s in await asyncio.to_thread(self.store.for_session, session_id)
+            if not s["subscription_id"].startswith(LOCAL_SUBSCRIPTION_PREFIX)
+        ]
+        if existing:
+            return existing[0]
+
+        token = await self.email_service.get_token(session_id)
+        client_state = secrets.token_urlsafe(32)
+        expiration = self._expiration()
+        response = await self.graph.post("/subscriptions", token, json={
+            "changeType": "created",
+            "notificationUrl": settings.NOTIFICATION_URL,
+            "lifecycleNotificationUrl": settings.NOTIFICATION_URL,
+            "resource": INBOX_RESOURCE,
+            "expirationDateTime": self._format(expiration),
+            "clientState": client_state
+        })
+        if response.status_code >= 400:
+            raise Exception(f"Error creating subscription: {response.text}")
+
+        subscription_id = response.json()["id"]
+        await asyncio.to_thread(self.store.save, subscription_id, session_id, client_state, expiration.timestamp())
+        return await asyncio.to_thread(self.store.get, subscription_id)
+
+    async def unsubscribe(self, session_id: str) -> int:
+        """Deletes the session's subscriptions from Graph and locally."""
+        subscriptions = await asyncio.to_thread(self.store.for_session, session_id)
+        if not subscriptions:
+            return 0
+        try:
+            token = await self.email_service.get_token(session_id)
+        except ValueError:
+            token = None
+
+        for subscription in subscriptions:
+            if token and not subscription["subscription_id"].startswith(LOCAL_SUBSCRIPTION_PREFIX):
+                response = await self.graph.delete(f"/subscriptions/{subscription['subscription_id']}", token)
+                if response.status_code >= 400 and response.status_code != 404:
+                    logger.warning(f"Error deleting subscription {subscription['subscription_id']}: {response.text}")
+            await asyncio.to_thread(self.store.delete, subscription["subscription_id"])
+        return len(subscriptions)
+
+    async def renew(self, subscription: Dict[str, Any]):
+        subscription_id = subscription["subscription_id"]
+        try:
+            token = await self.email_service.get_token(subscription["session_id"])
+        except ValueError:
+            # The session is gone; Graph lets the subscription lapse on its own
+            await asyncio.to_thread(self.store.delete, subscription_id)
+            return
+
+        expiration = self._expiration()
+        response = await self.graph.patch(
+            f"/subscriptions/{subscription_id}", token,
+            json={"expirationDateTime": self._format(expiration)}
+        )
+        if response.status_code == 404:
+            # Already expired on Graph's side: create a fresh one
+            await asyncio.to_thread(self.store.delete, subscription_id)
+            await self.subscribe(subscription["session_id"])
+            return
+        if response.status_code >= 400:
+            raise Exception(f"Error renewing subscription {subscription_id}: {response.text}")
+        await asyncio.to_thread(
+            self.store.save, subscription_id, subscription["session_id"],
+            subscription["client_state"], expiration.timestamp()
+        )
+
+    async def renew_due(self) -> int:
+        due = await asyncio.to_thread(
+            self.store.expiring_before, time.time() + settings.NOTIFICATION_RENEW_BEFORE_SECONDS
+        )
+        for subscription in due:
+            try:
+                await self.renew(subscription)
+            except Exception as e:
+                logger.error(f"Subscription renewal failed: {e}")
+        return len(due)
+
+    async def renew_loop(self):
+        while True:
+            try:
+                # Outlives one interval, so the holder keeps it; lapses soon after a worker dies
+                if await asyncio.to_thread(
+                    self.store.acquire_lease, RENEWAL_LEASE, self.worker_id, settings.NOTIFICATION_RENEW_INTERVAL_SECONDS * 2
+                ):
+                    await self.renew_due()
+            except Exception as e:
+                logger.error(f"Subscription renewal loop failed: {e}")
+            await asyncio.sleep(settings.NOTIFICATION_RENEW_INTERVAL_SECONDS)
+
+
+class NotificationService:
+    """
+    Receives Graph change notifications and analyzes new messages.
+
+    The webhook only validates and enqueues (Graph expects a response within
+    a few seconds); NOTIFICATION_WORKERS background workers fetch each new
+    message and run it through the analysis pipeline. Recent results are kept
+    per session in the shared store for the frontend to pick up, whichever
+    worker received the notification.
+    """
+
+    def __init__(self):
+        self.subscriptions = SubscriptionManager(SubscriptionStore(settings.NOTIFICATION_STORE_PATH))
+        # Graph may deliver the same notification more than once, to any worker
+        self.results = NotificationResultStore(settings.NOTIFICATION_STORE_PATH)
+        self.email_service = email_service
+        self.analysis_service = analysis_service
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._renewals: Set[asyncio.Task] = set()
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        # Created lazily so the queue binds to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=settings.NOTIFICATION_QUEUE_MAX_SIZE)
+        return self._queue
+
+    async def handle_notifications(self, payload: Dict[str, Any]) -> int:
+        """
+        Validates a Graph notification payload and enqueues new message ids.
+
+        Notifications with an unknown subscription or a mismatched clientState
+        are dropped.
+
+        Returns:
+            Number of messages enqueued
+        """
+        enqueued = 0
+        for notification in payload.get("value", []):
+            subscription_id = notification.get("subscriptionId", "")
+            subscription = await asyncio.to_thread(self.subscriptions.store.get, subscription_id)
+            if not subscription or not hmac.compare_digest(
+                str(notification.get("clientState", "")), subscription["client_state"]
+            ):
+                logger.warning(f"Dropping notification for unknown subscription or bad clientState: {subscription_id}")
+                continue
+
+            event = notification.get("lifecycleEvent")
+            if event:
+                if event in ("reauthorizationRequired", "subscriptionRemoved"):
+                    # Graph wants the 202 within seconds; the renewal calls Graph itself
+                    self._renew_later(subscription)
+                continue
+
+            message_id = (notification.get("resourceData") or {}).get("id")
+            if not message_id or notification.get("changeType") != "created":
+                continue
+            session_id = subscription["session_id"]
+            if not await asyncio.to_thread(self.results.claim, session_id, message_id):
+                continue
+            try:
+                self.queue.put_nowait((session_id, message_id))
+                enqueued += 1
+            except asyncio.QueueFull:
+                # Not taken after all, so Graph's redelivery is analyzed
+                await asyncio.to_thread(self.results.release, session_id, message_id)
+                logger.warning(f"Notification queue full, dropping message {message_id}")
+        return enqueued
+
+    def _renew_later(self, subscription: Dict[str, Any]):
+        task = asyncio.create_task(self._renew(subscription))
+        # Held until done; the event loop only keeps weak references to tasks
+        self._renewals.add(task)
+        task.add_done_callback(self._renewals.discard)
+
+    async def _renew(self, subscription: Dict[str, Any]):
+        try:
+            await self.subscriptions.renew(subscription)
+        except Exception as e:
+            logger.error(f"Renewing subscription {subscription['subscription_id']} after a lifecycle event failed: {e}")
+
+    async def _process(self, session_id: str, message_id: str):
+        email = await self.email_service.get_email(session_id, message_id, text_body=True)
+        if not email:
+            # Deleted before it was analyzed
+            await asyncio.to_thread(self.results.complete, session_id, message_id)
+            return
+        analysis = await self.analysis_service.analyze_email(email, session_id)
+        await asyncio.to_thread(self.results.add, session_id, {
+            "email_id": message_id,
+            "subject": email.get("subject"),
+            "received_at": time.time(),
+            "analysis": analysis
+        })
+
+    async def _worker(self):
+        while True:
+            session_id, message_id = await self.queue.get()
+            try:
+                await self._process(session_id, message_id)
+            except Exception as e:
+                logger.error(f"Error analyzing notified message {message_id}: {e}")
+                # Graph's redelivery of the notification gets another attempt
+                try:
+                    await asyncio.to_thread(self.results.release, session_id, message_id)
+                except Exception as release_error:
+                    logger.error(f"Could not release notified message {message_id}: {release_error}")
+            finally:
+                self.queue.task_done()
+
+    def recent_results(self, session_id: str) -> List[Dict[str, Any]]:
+        return self.results.recent(session_id)
+
+    def forget_session(self, session_id: str):
+        self.results.forget(session_id)
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(settings.NOTIFICATION_WORKERS)]
+        if settings.NOTIFICATION_URL:
+            self._tasks.append(asyncio.create_task(self.subscriptions.renew_loop()))
+
+    async def stop(self):
+        tasks = self._tasks + list(self._renewals)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+
+class LocalChangeNotifier:
+    """
+    Stand-in for Graph when the webhook is not publicly reachable (local dev,
+    tests). Registers a local subscription for the session and feeds
+    Graph-shaped `created` notifications through the same validation path.
+    """
+
+    def __init__(self, service: NotificationService):
+        self.service = service
+
+    async def _local_subscription(self, session_id: str) -> Dict[str, Any]:
+        store = self.service.subscriptions.store
+        for subscription in await asyncio.to_thread(store.for_session, session_id):
+            if subscription["subscription_id"].startswith(LOCAL_SUBSCRIPTION_PREFIX):
+                return subscription
+        subscription_id = f"{LOCAL_SUBSCRIPTION_PREFIX}{uuid.uuid4()}"
+        await asyncio.to_thread(store.save, subscription_id, session_id, secrets.token_urlsafe(32), float("inf"))
+        return await asyncio.to_thread(store.get, subscription_id)
+
+    async def notify_created(self, session_id: str, message_ids: List[str]) -> int:
+        subscription = await self._local_subscription(session_id)
+        payload = {
+            "value": [
+                {
+                    "subscriptionId": subscription["subscription_id"],
+                    "clientState": subscription["client_state"],
+                    "changeType": "created",
+                    "resource": f"Users/me/Messages/{message_id}",
+                    "resourceData": {"@odata.type": "#Microsoft.Graph.Message", "id": message_id}
+                }
+                for message_id in message_ids
+            ]
+        }
+        return await self.service.handle_notifications(payload)
+
+
+notification_service = NotificationService()
+local_notifier = LocalChangeNotifier(notification_service)
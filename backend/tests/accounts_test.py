@@ -0,0 +1,75 @@
+import pytest
+
+from src.services.crm.accounts import AccountAliasStore, AccountResolver, SuffixTrie
+
+# Rules from the Public Suffix List's own test cases
+trie = SuffixTrie(["com", "uk", "co.uk", "jp", "ck", "*.ck", "!www.ck", "*.kawasaki.jp", "!city.kawasaki.jp"])
+
+
+@pytest.mark.parametrize("domain, expected", [
+    ("example.com", "example.com"),
+    ("www.example.com", "example.com"),
+    ("com", None),
+    ("acme.co.uk", "acme.co.uk"),
+    ("mail.acme.co.uk", "acme.co.uk"),
+    ("co.uk", None),
+    ("Mail.ACME.co.uk.", "acme.co.uk"),
+    # Wildcard and exception rules
+    ("ck", None),
+    ("test.ck", None),
+    ("b.test.ck", "b.test.ck"),
+    ("www.ck", "www.ck"),
+    ("www.www.ck", "www.ck"),
+    ("c.kawasaki.jp", None),
+    ("b.c.kawasaki.jp", "b.c.kawasaki.jp"),
+    ("city.kawasaki.jp", "city.kawasaki.jp"),
+    ("b.city.kawasaki.jp", "city.kawasaki.jp"),
+    # Unlisted TLDs fall under the default "*" rule
+    ("example.example", "example.example"),
+    ("b.example.example", "example.example"),
+    ("", None),
+    ("a..com", None),
+])
+def test_registrable_domain(domain, expected):
+    assert trie.registrable_domain(domain) == expected
+
+
+def test_from_file_skips_comments(tmp_path):
+    path = tmp_path / "public_suffix_list.dat"
+    path.write_text("// ===BEGIN ICANN DOMAINS===\nuk\nco.uk\n\n// comment\n*.ck\n", encoding="utf-8")
+    loaded = SuffixTrie.from_file(str(path))
+    assert loaded.registrable_domain("sales.acme.co.uk") == "acme.co.uk"
+    assert loaded.registrable_domain("a.b.ck") == "a.b.ck"
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    return AccountResolver(AccountAliasStore(str(tmp_path / "aliases.db")))
+
+
+def test_resolver_names_account_after_registrable_domain(resolver):
+    result = resolver.resolve("sales.acme-corp.co.uk")
+    assert result == {
+        "domain": "sales.acme-corp.co.uk",
+        "registrable_domain": "acme-corp.co.uk",
+        "account_name": "Acme Corp",
+        "source": "domain",
+    }
+
+
+def test_resolver_gives_free_mail_no_account(resolver):
+    result = resolver.resolve("gmail.com")
+    assert result["account_name"] is None
+    assert result["source"] == "free_mail"
+
+
+def test_resolver_aliases_apply_to_subdomains(resolver):
+    resolver.set_alias("acme.com", "ACME Holdings")
+    resolver.set_alias("emea.acme.com", "ACME Europe")
+    assert resolver.resolve("acme.com")["account_name"] == "ACME Holdings"
+    assert resolver.resolve("sales.acme.com")["account_name"] == "ACME Holdings"
+    assert resolver.resolve("de.emea.acme.com")["account_name"] == "ACME Europe"
+
+    assert resolver.delete_alias("emea.acme.com")
+    result = resolver.resolve("de.emea.acme.com")
+    assert (result["account_name"], result["source"]) == ("ACME Holdings", "alias")
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from src.services.email.attachments import (
+    RangeNotSatisfiable,
+    content_disposition,
+    parse_range,
+    slice_stream,
+)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    (" bytes=10-19 ", (10, 19)),
+    # Malformed and multi-range headers are ignored and the whole file is served
+    ("bytes=-", None),
+    ("bytes=0-9,20-29", None),
+    ("items=0-9", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=1000-", 1000),
+    ("bytes=50-10", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=-10", 0),
+])
+def test_parse_range_not_satisfiable(header, size):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, size)
+
+
+def test_slice_stream_spans_chunks():
+    async def chunks():
+        for chunk in (b"abcd", b"efgh", b"ijkl"):
+            yield chunk
+
+    async def collect(start, end):
+        return b"".join([part async for part in slice_stream(chunks(), start, end)])
+
+    assert asyncio.run(collect(2, 9)) == b"cdefghij"
+    assert asyncio.run(collect(4, 7)) == b"efgh"
+    assert asyncio.run(collect(0, 11)) == b"abcdefghijkl"
+
+
+def test_content_disposition_keeps_utf8_name():
+    value = content_disposition('Angebot "Müller".pdf')
+    assert value == "attachment; filename=\"Angebot Mller.pdf\"; filename*=UTF-8''Angebot%20%22M%C3%BCller%22.pdf"
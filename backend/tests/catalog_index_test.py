@@ -0,0 +1,153 @@
+import sqlite3
+
+import pytest
+
+from src.core.config import settings
+from src.services.catalog import index as catalog_index
+from src.services.catalog.index import CatalogEntry, CatalogIndex, normalize_part_number
+from src.services.catalog.service import CatalogService
+
+ENTRIES = [
+    CatalogEntry("CESS-748203-001", "LM317T", "TI", "Adjustable regulator"),
+    CatalogEntry("CESS-748203-002", "LM317TG", "onsemi", "Adjustable regulator"),
+    CatalogEntry("CESS-100200", "LM7805", "TI", "5V regulator"),
+    CatalogEntry("CESS-100300", "NE555P", "TI", "Timer"),
+]
+
+
+def skus(index, positions):
+    return [index.entries[position].sku for position in positions]
+
+
+def fuzzy(index, key):
+    return index.fuzzy(key, 5, min_score=0.6, max_edits=1, max_candidates=500, max_scan=200000)
+
+
+@pytest.fixture
+def index():
+    return CatalogIndex.build(ENTRIES)
+
+
+def test_exact_lookup_by_sku_and_mpn(index):
+    assert skus(index, index.exact(normalize_part_number("cess 748203-001"))) == ["CESS-748203-001"]
+    assert skus(index, index.exact("LM317T")) == ["CESS-748203-001"]
+    assert index.exact("LM317") == []
+    assert index.get("CESS-100200") == 2
+
+
+def test_upsert_replaces_by_sku(index):
+    assert index.upsert([ENTRIES[0]]) == 0
+    assert index.upsert([CatalogEntry("CESS-748203-001", "LM317T-DG", "TI")]) == 1
+
+    assert index.exact("LM317T") == []
+    assert skus(index, index.exact("LM317TDG")) == ["CESS-748203-001"]
+    assert index.live_entries == len(ENTRIES)
+    assert len(index.entries) == len(ENTRIES)
+    # The old MPN stays behind as a dead key
+    assert index.tombstone_share() == pytest.approx(1 / 9)
+
+
+def test_shared_mpn_lists_every_entry(index):
+    index.upsert([CatalogEntry("CESS-999001", "NE555P", "ST")])
+    assert sorted(skus(index, index.exact("NE555P"))) == ["CESS-100300", "CESS-999001"]
+
+    assert index.remove(["CESS-100300"]) == 1
+    assert skus(index, index.exact("NE555P")) == ["CESS-999001"]
+
+
+def test_remove_leaves_tombstones_until_compacted(index):
+    assert index.remove(["CESS-100200", "CESS-UNKNOWN"]) == 1
+    assert index.exact("LM7805") == []
+    assert index.get("CESS-100200") is None
+    assert index.live_entries == 3
+    assert index.tombstone_share() == pytest.approx(0.25)
+    assert index.fuzzy("LM7806", 5, 0.6, 1, 500, 200000) == []
+
+    compacted = index.compacted()
+    assert compacted.tombstone_share() == 0.0
+    assert compacted.live_entries == len(compacted.entries) == 3
+    assert skus(compacted, compacted.exact("NE555P")) == ["CESS-100300"]
+
+
+def test_removed_sku_can_come_back(index):
+    index.remove(["CESS-100200"])
+    assert index.upsert([ENTRIES[2]]) == 1
+    assert skus(index, index.exact("LM7805")) == ["CESS-100200"]
+    assert index.live_entries == 4
+
+
+def test_prefix_returns_shortest_keys_first(index):
+    assert index.prefix("LM317", 5) == [("LM317T", 0), ("LM317TG", 1)]
+    assert index.prefix("LM317", 1) == [("LM317T", 0)]
+    assert index.prefix("CESS748203", 5) == [("CESS748203001", 0), ("CESS748203002", 1)]
+    assert index.prefix("XYZ", 5) == []
+
+
+def test_prefix_finds_pending_and_skips_dead_keys(index):
+    index.upsert([CatalogEntry("CESS-200100", "LM31")])
+    assert index.stats()["pending_prefix_keys"] == 2
+    assert [key for key, _ in index.prefix("LM31", 5)] == ["LM31", "LM317T", "LM317TG"]
+
+    index.remove(["CESS-748203-001"])
+    assert [key for key, _ in index.prefix("LM31", 5)] == ["LM31", "LM317TG"]
+
+
+def test_pending_keys_are_merged_past_the_threshold(monkeypatch):
+    monkeypatch.setattr(catalog_index, "PREFIX_MERGE_THRESHOLD", 3)
+    index = CatalogIndex.build(ENTRIES)
+    index.upsert([CatalogEntry(f"CESS-50000{i}") for i in range(4)])
+    assert index.stats()["pending_prefix_keys"] == 0
+    assert [key for key, _ in index.prefix("CESS50000", 5)] == [f"CESS50000{i}" for i in range(4)]
+
+
+def test_fuzzy_finds_close_spellings_best_first(index):
+    found = fuzzy(index, "LM317X")
+    assert [key for key, _, _ in found] == ["LM317T", "LM317TG"]
+    assert found[0][2] > found[1][2] >= 0.6
+    # The query key itself is an exact match, not a fuzzy one
+    assert "LM7805" not in [key for key, _, _ in fuzzy(index, "LM7805")]
+    # Too many edits away
+    assert fuzzy(index, "LM3") == []
+
+
+def test_fuzzy_keeps_cess_numbers_and_mpns_apart(index):
+    found = fuzzy(index, "CESS748203003")
+    assert {key for key, _, _ in found} == {"CESS748203001", "CESS748203002"}
+
+
+def test_unselective_fuzzy_queries_return_nothing(index):
+    assert index.fuzzy("LM317X", 5, 0.6, 1, 500, max_scan=1) == []
+
+
+def test_service_compacts_after_enough_deletes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CATALOG_MATCHER_ENABLED", False)
+    path = str(tmp_path / "catalog.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE catalog_products (sku TEXT, mpn TEXT, manufacturer TEXT, name TEXT, "
+        "description TEXT, updated_at REAL, deleted INTEGER)"
+    )
+    conn.executemany(
+        "INSERT INTO catalog_products VALUES (?, ?, ?, ?, ?, 1.0, 0)",
+        [(e.sku, e.mpn, e.manufacturer, e.name, e.description) for e in ENTRIES]
+    )
+    conn.commit()
+    service = CatalogService(path)
+    service.refresh()
+    assert service.lookup("LM317T")[0]["matchType"] == "exact"
+    assert service.lookup("748203", part_number_type="CESS")[0]["matchType"] == "prefix"
+
+    conn.execute("UPDATE catalog_products SET deleted = 1, updated_at = 2.0 WHERE sku = 'CESS-100300'")
+    conn.commit()
+    service.refresh()
+    live = service.index
+    assert live.tombstone_share() == pytest.approx(0.25)
+
+    conn.execute("UPDATE catalog_products SET deleted = 1, updated_at = 3.0 WHERE sku = 'CESS-100200'")
+    conn.commit()
+    conn.close()
+    service.refresh()
+    assert service.index is not live
+    assert service.index.tombstone_share() == 0.0
+    assert service.lookup("LM7805") == []
+    assert service.lookup("LM317T")[0]["sku"] == "CESS-748203-001"
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.api.v1 import email_routes
+from src.core.config import settings
+from src.services.llm.classifier import (
+    TRAINING_LEASE,
+    IntentClassifier,
+    IntentLabelStore,
+    TrainingInProgress,
+    evaluate,
+    fit_model,
+    hashed_features,
+)
+
+REQUEST = ("RFQ for CESS parts", "Please quote qty {n} CESS-{n}00200 and send lead times.", 1)
+NEWSLETTER = ("Weekly newsletter", "Unsubscribe here. Our webinar schedule for week {n} is out.", 0)
+
+
+def labelled(count):
+    rows = []
+    for n in range(count):
+        subject, body, label = REQUEST if n % 2 else NEWSLETTER
+        rows.append((subject, body.format(n=n), label))
+    return rows
+
+
+@pytest.fixture
+def classifier(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CLASSIFIER_ENABLED", True)
+    monkeypatch.setattr(settings, "CLASSIFIER_MIN_TRAINING_EXAMPLES", 40)
+    monkeypatch.setattr(settings, "CLASSIFIER_HASH_DIMENSIONS", 2 ** 12)
+    labels = IntentLabelStore(str(tmp_path / "labels.db"))
+    return IntentClassifier(str(tmp_path / "model.json"), labels)
+
+
+def add_labels(classifier, rows):
+    for subject, body, label in rows:
+        classifier.labels.add(subject, body, bool(label), 0.95)
+
+
+def test_untrained_classifier_never_skips(classifier):
+    assert not classifier.active
+    assert classifier.predict_skip(*NEWSLETTER[:2]) is None
+
+
+def test_fit_model_evaluates_on_holdout():
+    bias, weights, training, evaluation = fit_model(labelled(100), 2 ** 12, 0.2, 0.9, 8, 0.5, 1e-6)
+    assert training == 80
+    assert evaluation["examples"] == 20
+    assert evaluation["missed_requests"] == 0
+    assert evaluation["skip_precision"] == 1.0
+
+
+def test_evaluate_counts_skipped_requests():
+    features = hashed_features("Hello", "world", 2 ** 12)
+    # A model that skips everything skips the request too
+    evaluation = evaluate(-50.0, {}, [(features, 1), (features, 0)], 0.9)
+    assert (evaluation["would_skip"], evaluation["missed_requests"], evaluation["skip_precision"]) == (2, 1, 0.5)
+
+
+def test_train_activates_a_precise_model(classifier, monkeypatch):
+    monkeypatch.setattr(settings, "CLASSIFIER_SKIP_THRESHOLD", 0.9)
+    add_labels(classifier, labelled(60))
+    stats = asyncio.run(classifier.train())
+    assert stats["active"] and stats["training_examples"] == 48
+    skipped = classifier.predict_skip("Weekly newsletter", "Unsubscribe here. Our webinar schedule is out.")
+    assert skipped["is_customer_request"] is False
+    assert classifier.predict_skip("RFQ for CESS parts", "Please quote qty 3 CESS-300200.") is None
+
+
+def test_train_keeps_an_imprecise_model_inactive(classifier, monkeypatch):
+    monkeypatch.setattr(settings, "CLASSIFIER_MIN_PRECISION", 1.01)
+    add_labels(classifier, labelled(60))
+    assert asyncio.run(classifier.train())["active"] is False
+    assert not classifier.active
+
+
+def test_train_needs_enough_labels(classifier):
+    add_labels(classifier, labelled(10))
+    with pytest.raises(ValueError):
+        asyncio.run(classifier.train())
+
+
+def test_train_needs_both_classes(classifier):
+    add_labels(classifier, [row for row in labelled(100) if row[2] == 0])
+    with pytest.raises(ValueError):
+        asyncio.run(classifier.train())
+
+
+def test_train_is_rejected_while_another_worker_trains(classifier):
+    add_labels(classifier, labelled(60))
+    assert classifier.labels.acquire_lease(TRAINING_LEASE, "other-worker", 60)
+    with pytest.raises(TrainingInProgress):
+        asyncio.run(classifier.train())
+    classifier.labels.release_lease(TRAINING_LEASE, "other-worker")
+    asyncio.run(classifier.train())
+    # The lease is given back after a run
+    assert classifier.labels.acquire_lease(TRAINING_LEASE, "other-worker", 60)
+
+
+def test_label_store_keeps_the_newest_entries(classifier, monkeypatch):
+    monkeypatch.setattr(settings, "CLASSIFIER_LABEL_MAX_ENTRIES", 5)
+    add_labels(classifier, labelled(8))
+    rows = classifier.labels.all(0.0)
+    assert [body for _, body, _ in rows] == [body for _, body, _ in labelled(8)[3:]]
+
+
+def test_label_store_without_path_collects_nothing():
+    labels = IntentLabelStore("")
+    labels.add("Subject", "Body", True, 0.99)
+    assert labels.count() == 0
+
+
+def test_train_route_is_off_by_default(monkeypatch):
+    monkeypatch.setattr(settings, "CLASSIFIER_TRAINING_ROUTE_ENABLED", False)
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(email_routes.train_intent_classifier("session-1"))
+    assert raised.value.status_code == 404
+
+
+def test_train_route_answers_409_while_training(monkeypatch):
+    async def authenticated(session_id):
+        return None
+
+    async def busy():
+        raise TrainingInProgress("busy")
+    monkeypatch.setattr(settings, "CLASSIFIER_TRAINING_ROUTE_ENABLED", True)
+    monkeypatch.setattr(email_routes, "get_service_or_401", authenticated)
+    monkeypatch.setattr(email_routes.intent_classifier, "train", busy)
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(email_routes.train_intent_classifier("session-1"))
+    assert raised.value.status_code == 409
@@ -0,0 +1,17 @@
+import os
+import sys
+
+# Settings require these at import; the tests never reach Microsoft or OpenAI
+for name, value in {
+    "MS_CLIENT_ID": "test-client",
+    "MS_TENANT_ID": "common",
+    "MS_CLIENT_SECRET": "test-secret",
+    "MS_REDIRECT_URI": "http://localhost:8000/auth/callback",
+    "OPENAI_API_KEY": "sk-test",
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# A manual script that signs in through the device code flow, not a test
+collect_ignore = ["outlook_test.py"]
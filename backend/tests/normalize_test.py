@@ -0,0 +1,60 @@
+from src.services.llm.normalize import normalize_body, strip_signature, truncate_to_tokens
+
+
+def test_signature_after_signoff_is_stripped():
+    text = "Please quote qty 5 CESS-100200.\n\nBest regards,\nJane Doe\nPurchasing Manager\n+49 89 1234567"
+    assert strip_signature(text) == "Please quote qty 5 CESS-100200.\n\nBest regards,"
+
+
+def test_line_items_after_signoff_are_kept():
+    text = "Hi,\nThanks!\n- 5 pcs CESS-100200\n- 2 pcs LM317T"
+    assert strip_signature(text) == text
+
+
+def test_part_number_after_signoff_is_kept():
+    text = "Hi,\nThanks,\nSN74HC595N"
+    assert strip_signature(text) == text
+
+
+def test_long_block_after_signoff_is_kept():
+    text = "Hi,\nRegards,\n" + "\n".join(f"Line {i}" for i in range(12))
+    assert strip_signature(text) == text
+
+
+def test_delimiter_and_mobile_signature_are_stripped():
+    assert strip_signature("Need 3 units\n-- \nJane") == "Need 3 units"
+    assert strip_signature("Need 3 units\nSent from my iPhone") == "Need 3 units"
+
+
+def test_html_body_drops_quote_disclaimer_and_signature():
+    html = (
+        "<html><body><p>Please quote 10 pcs of CESS-100200 by Friday.</p>"
+        "<p>Kind regards,<br>Jane Doe<br>ACME Corp</p>"
+        "<p>This email is confidential and intended solely for the addressee.</p>"
+        '<div id="divRplyFwdMsg"><b>From:</b> Sales</div><div>Earlier thread</div>'
+        "</body></html>"
+    )
+    assert normalize_body(html, "html") == "Please quote 10 pcs of CESS-100200 by Friday.\n\nKind regards,"
+
+
+def test_plain_reply_drops_quoted_history():
+    text = "We need 4 more units of CESS-100200.\n\nOn Mon, 3 Jun 2024 Sales wrote:\n> Here is your quote"
+    assert normalize_body(text, "text") == "We need 4 more units of CESS-100200."
+
+
+def test_short_forward_keeps_quoted_request():
+    text = "FYI, see below\n\nOn Mon, 3 Jun 2024 Jane wrote:\n> qty 5 CESS-100200"
+    assert "qty 5 CESS-100200" in normalize_body(text, "text")
+
+
+def test_empty_body():
+    assert normalize_body(None) == ""
+    assert normalize_body("") == ""
+
+
+def test_truncate_to_tokens():
+    text = "\n".join(f"line {i:03d}" for i in range(100))
+    truncated = truncate_to_tokens(text, 20)
+    assert truncated.endswith("[... truncated]")
+    assert len(truncated) < len(text)
+    assert truncate_to_tokens("short", 20) == "short"
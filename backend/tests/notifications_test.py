@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from src.core.config import settings
+from src.services.notifications.service import NotificationService
+
+SESSION = "session-1"
+
+
+class FakeEmailService:
+    def __init__(self):
+        self.missing = set()
+
+    async def get_email(self, session_id, message_id, text_body=False):
+        if message_id in self.missing:
+            return None
+        return {"id": message_id, "subject": f"Subject {message_id}"}
+
+
+class FakeAnalysisService:
+    def __init__(self):
+        self.fail = False
+        self.analyzed = []
+
+    async def analyze_email(self, email, session_id=None):
+        if self.fail:
+            raise TimeoutError("Graph timed out")
+        self.analyzed.append(email["id"])
+        return {"is_customer_request": True}
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "NOTIFICATION_STORE_PATH", str(tmp_path / "subscriptions.db"))
+    service = NotificationService()
+    service.email_service = FakeEmailService()
+    service.analysis_service = FakeAnalysisService()
+    service.subscriptions.store.save("sub-1", SESSION, "secret", 4102444800.0)
+    return service
+
+
+def created(message_id, client_state="secret", subscription_id="sub-1"):
+    return {
+        "subscriptionId": subscription_id,
+        "clientState": client_state,
+        "changeType": "created",
+        "resourceData": {"id": message_id},
+    }
+
+
+async def deliver(service, *notifications):
+    """Hands notifications to the webhook and analyzes whatever it queued."""
+    enqueued = await service.handle_notifications({"value": list(notifications)})
+    while not service.queue.empty():
+        session_id, message_id = service.queue.get_nowait()
+        try:
+            await service._process(session_id, message_id)
+        except Exception:
+            await asyncio.to_thread(service.results.release, session_id, message_id)
+    return enqueued
+
+
+def test_bad_client_state_and_unknown_subscription_are_dropped(service):
+    enqueued = asyncio.run(deliver(
+        service, created("m1", client_state="forged"), created("m2", subscription_id="sub-unknown")
+    ))
+    assert enqueued == 0
+    assert service.recent_results(SESSION) == []
+
+
+def test_redelivery_after_success_is_dropped(service):
+    assert asyncio.run(deliver(service, created("m1"))) == 1
+    assert asyncio.run(deliver(service, created("m1"))) == 0
+    assert service.analysis_service.analyzed == ["m1"]
+    assert [r["email_id"] for r in service.recent_results(SESSION)] == ["m1"]
+
+
+def test_redelivery_while_queued_is_dropped(service):
+    async def run():
+        first = await service.handle_notifications({"value": [created("m1")]})
+        second = await service.handle_notifications({"value": [created("m1")]})
+        return first, second
+    assert asyncio.run(run()) == (1, 0)
+
+
+def test_failed_analysis_releases_claim(service):
+    async def run():
+        await service.handle_notifications({"value": [created("m1")]})
+        service.analysis_service.fail = True
+        worker = asyncio.create_task(service._worker())
+        await service.queue.join()
+        worker.cancel()
+        service.analysis_service.fail = False
+        return await deliver(service, created("m1"))
+    assert asyncio.run(run()) == 1
+    assert service.analysis_service.analyzed == ["m1"]
+
+
+def test_stale_claim_is_taken_over(service, monkeypatch):
+    # Claimed by a worker that restarted before analyzing it
+    assert service.results.claim(SESSION, "m1")
+    assert not service.results.claim(SESSION, "m1")
+    monkeypatch.setattr(settings, "NOTIFICATION_CLAIM_TIMEOUT_SECONDS", -1.0)
+    assert asyncio.run(deliver(service, created("m1"))) == 1
+    # Finished claims are never taken over
+    assert not service.results.claim(SESSION, "m1")
+
+
+def test_full_queue_releases_claim(service, monkeypatch):
+    monkeypatch.setattr(settings, "NOTIFICATION_QUEUE_MAX_SIZE", 1)
+
+    async def run():
+        first = await service.handle_notifications({"value": [created("m1"), created("m2")]})
+        service.queue.get_nowait()
+        second = await service.handle_notifications({"value": [created("m2")]})
+        return first, second
+    assert asyncio.run(run()) == (1, 1)
+
+
+def test_deleted_message_is_completed(service):
+    service.email_service.missing = {"m1"}
+    assert asyncio.run(deliver(service, created("m1"))) == 1
+    assert asyncio.run(deliver(service, created("m1"))) == 0
+    assert service.recent_results(SESSION) == []
+
+
+def test_lifecycle_event_renews_in_background(service):
+    renewed = []
+
+    async def slow_renew(subscription):
+        await asyncio.sleep(0.05)
+        renewed.append(subscription["subscription_id"])
+    service.subscriptions.renew = slow_renew
+
+    async def run():
+        enqueued = await service.handle_notifications({"value": [{
+            "subscriptionId": "sub-1", "clientState": "secret", "lifecycleEvent": "reauthorizationRequired"
+        }]})
+        answered_before_renewal = not renewed
+        await asyncio.gather(*service._renewals)
+        return enqueued, answered_before_renewal
+    assert asyncio.run(run()) == (0, True)
+    assert renewed == ["sub-1"]
+
+
+def test_results_are_shared_between_workers(service):
+    asyncio.run(deliver(service, created("m1")))
+    other_worker = NotificationService()
+    assert [r["email_id"] for r in other_worker.recent_results(SESSION)] == ["m1"]
+    assert not other_worker.results.claim(SESSION, "m1")
+    other_worker.forget_session(SESSION)
+    assert service.recent_results(SESSION) == []
@@ -0,0 +1,128 @@
+import itertools
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from src.core.config import settings
+from src.services.crm import store as store_module
+from src.services.crm.service import CRMService
+from src.services.crm.store import OpportunityStore
+from src.services.email.pagination import InvalidCursor, encode_cursor
+
+
+def opportunity(i, account="Acme"):
+    return {
+        "opportunityName": f"Quote {i}",
+        "accountName": account,
+        "keyContact": f"Buyer {i % 3}",
+        "sourceMessageId": f"msg-{i}",
+        "conversationId": f"conv-{i % 4}",
+    }
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # One second per opportunity, so created_at orders them by creation
+    clock = itertools.count(1_700_000_000)
+    monkeypatch.setattr(store_module, "time", SimpleNamespace(time=lambda: float(next(clock))))
+    return OpportunityStore(str(tmp_path / "opportunities.db"))
+
+
+@pytest.fixture
+def crm(store):
+    crm = CRMService()
+    crm.store = store
+    return crm
+
+
+def walk(store, limit, **filters):
+    names, after = [], None
+    while True:
+        page, after = store.query_page(limit=limit, after=after, **filters)
+        assert len(page) <= limit
+        names.extend(o["opportunityName"] for o in page)
+        if after is None:
+            return names
+
+
+def test_repeated_key_returns_the_first_opportunity(store):
+    [(first, created)] = store.create_many([(opportunity(1), "key-1")])
+    assert created
+    [(again, created)] = store.create_many([(opportunity(2), "key-1")])
+    assert not created
+    assert again == first
+    assert store.get(first["oid"])["opportunityName"] == "Quote 1"
+
+
+def test_repeated_key_inside_one_batch(store):
+    results = store.create_many([(opportunity(1), "key-1"), (opportunity(2), None), (opportunity(3), "key-1")])
+    assert [created for _, created in results] == [True, True, False]
+    assert results[2][0]["oid"] == results[0][0]["oid"]
+    # Without a key nothing is deduplicated
+    assert store.create_many([(opportunity(2), None)])[0][1]
+
+
+def test_failed_batch_creates_nothing(store, monkeypatch):
+    monkeypatch.setattr(store_module, "new_oid", lambda: "006-clash")
+    with pytest.raises(RuntimeError):
+        store.create_many([(opportunity(1), "key-1"), (opportunity(2), "key-2")])
+    assert store.query_page() == ([], None)
+
+
+def test_keyset_pages_cover_every_row_once(store):
+    store.create_many([(opportunity(i), f"key-{i}") for i in range(10)])
+    expected = [f"Quote {i}" for i in reversed(range(10))]
+    assert walk(store, 3) == expected
+    assert walk(store, 10) == expected
+    assert walk(store, 50) == expected
+
+
+def test_keyset_pages_with_filters(store):
+    store.create_many([(opportunity(i, "Acme" if i % 2 else "Globex"), None) for i in range(12)])
+    assert walk(store, 2, account_name="acme") == [f"Quote {i}" for i in (11, 9, 7, 5, 3, 1)]
+    assert walk(store, 2, key_contact="BUYER 0", account_name="Globex") == ["Quote 6", "Quote 0"]
+    assert walk(store, 5, conversation_id="conv-1") == ["Quote 9", "Quote 5", "Quote 1"]
+    assert walk(store, 5, created_from=1_700_000_004, created_before=1_700_000_007) == ["Quote 6", "Quote 5", "Quote 4"]
+
+
+def test_account_pages_use_the_account_index(store):
+    plan = store._db().execute(
+        "EXPLAIN QUERY PLAN SELECT created_at, oid, data FROM opportunities WHERE account_name = ? "
+        "AND (created_at, oid) < (?, ?) ORDER BY created_at DESC, oid DESC LIMIT 11",
+        ("Acme", 1_700_000_005.0, "006")
+    ).fetchall()
+    detail = " ".join(row[-1] for row in plan)
+    assert "opportunities_account" in detail
+    assert "TEMP B-TREE" not in detail
+
+
+def test_list_cursor_continues_the_same_query(crm):
+    crm.create_opportunities([(opportunity(i, "Acme" if i % 2 else "Globex"), None) for i in range(6)])
+    first = crm.list_opportunities(limit=2, account_name="Acme")
+    assert [o["opportunityName"] for o in first["opportunities"]] == ["Quote 5", "Quote 3"]
+    # Filter arguments are ignored once a cursor is given
+    rest = crm.list_opportunities(limit=2, cursor=first["next_cursor"], account_name="Globex")
+    assert [o["opportunityName"] for o in rest["opportunities"]] == ["Quote 1"]
+    assert rest["next_cursor"] is None
+
+
+def test_created_date_filters_take_naive_datetimes_as_utc(crm):
+    crm.create_opportunities([(opportunity(i), None) for i in range(3)])
+    after_first = datetime.fromtimestamp(1_700_000_001, timezone.utc).replace(tzinfo=None)
+    listed = crm.list_opportunities(created_from=after_first)
+    assert [o["opportunityName"] for o in listed["opportunities"]] == ["Quote 2", "Quote 1"]
+
+
+@pytest.mark.parametrize("state", [
+    {"query": {"account_name": "Acme", "password": "x"}, "after": [1.0, "006"]},
+    {"query": {"account_name": "Acme"}, "after": [1.0]},
+    {"query": {"account_name": "Acme"}},
+    {"query": ["account_name"], "after": [1.0, "006"]},
+    {"after": [1.0, "006"]},
+    # An email list cursor
+    {"next": settings.GRAPH_API_BASE_URL.rstrip("/") + "/me/messages?$skip=25"},
+])
+def test_forged_list_cursors_are_rejected(crm, state):
+    with pytest.raises(InvalidCursor):
+        crm.list_opportunities(cursor=encode_cursor(state))
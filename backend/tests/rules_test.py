@@ -0,0 +1,72 @@
+from src.services.llm.rules import (
+    CONFIDENCE_CESS,
+    CONFIDENCE_CESS_WITH_QTY,
+    CONFIDENCE_UNMATCHED_ITEM,
+    RuleExtractor,
+)
+
+extractor = RuleExtractor()
+
+
+def parts(result):
+    return [(p.part_number, p.quantity, p.part_number_type) for p in result.products]
+
+
+def test_quantity_before_cess_number():
+    result = extractor.extract("RFQ", "Please quote qty 5 CESS-748203-001")
+    assert parts(result) == [("CESS-748203-001", 5, "CESS")]
+    assert result.confidence == CONFIDENCE_CESS_WITH_QTY
+
+
+def test_quantity_after_parts_on_one_line():
+    result = extractor.extract("", "CESS-100200 x 2, CESS-100300 x 4")
+    assert parts(result) == [("CESS-100200", 2, "CESS"), ("CESS-100300", 4, "CESS")]
+    assert result.confidence == CONFIDENCE_CESS_WITH_QTY
+
+
+def test_subject_part_takes_body_quantity():
+    result = extractor.extract("Quote CESS-100200", "We need 10 pcs of CESS-100200")
+    assert parts(result) == [("CESS-100200", 10, "CESS")]
+    assert result.confidence == CONFIDENCE_CESS_WITH_QTY
+
+
+def test_part_without_quantity():
+    result = extractor.extract("", "Do you stock CESS-100200?")
+    assert parts(result) == [("CESS-100200", None, "CESS")]
+    assert result.confidence == CONFIDENCE_CESS
+
+
+def test_untied_number_lowers_confidence():
+    result = extractor.extract("", "qty 5 CESS-100200\nand 3 of the blue widgets")
+    assert parts(result) == [("CESS-100200", 5, "CESS")]
+    assert result.confidence == CONFIDENCE_UNMATCHED_ITEM
+
+
+def test_item_wording_without_part_lowers_confidence():
+    result = extractor.extract("", "qty 5 CESS-100200\nPlease also add the mounting kit")
+    assert result.confidence == CONFIDENCE_UNMATCHED_ITEM
+
+
+def test_dates_references_and_list_markers_are_not_items():
+    body = "Ref 44812, needed by 12 March\n1. qty 5 CESS-100200\nCall me on +49 171 5550100"
+    result = extractor.extract("", body)
+    assert parts(result) == [("CESS-100200", 5, "CESS")]
+    assert result.confidence == CONFIDENCE_CESS_WITH_QTY
+
+
+def test_part_repeated_with_other_quantity_lowers_confidence():
+    result = extractor.extract("", "CESS-100200 x 2 in red\nCESS-100200 x 3 in blue")
+    assert parts(result) == [("CESS-100200", 2, "CESS")]
+    assert result.confidence == CONFIDENCE_UNMATCHED_ITEM
+
+
+def test_no_parts():
+    result = extractor.extract("Hello", "Thanks for the meeting yesterday.")
+    assert result.products == []
+    assert result.confidence == 0.0
+    assert result.opportunity_name is None
+
+
+def test_opportunity_name():
+    result = extractor.extract("", "CESS-100200 x 2, CESS-100300 x 4")
+    assert result.opportunity_name == "Quote for 2x CESS-100200 and 1 more"
@@ -0,0 +1,144 @@
+import pytest
+
+from src.core.config import settings
+from src.services.email.pagination import InvalidCursor, decode_cursor, encode_cursor
+from src.services.email.service import EmailService
+from src.services.email.store import MessageStore
+
+SESSION = "session-1"
+FOLDER = "inbox"
+
+
+def message(i):
+    return {
+        "id": f"msg-{i:03d}",
+        # Three messages per timestamp, so pages split ties on id
+        "receivedDateTime": f"2024-06-{1 + i // 3:02d}T09:00:00Z",
+        "sentDateTime": None if i % 5 == 0 else f"2024-06-{1 + i // 3:02d}T08:59:00Z",
+        "subject": None if i % 4 == 0 else f"Subject {i % 7}",
+        "importance": "high" if i % 2 else "normal",
+        "isRead": i % 3 == 0,
+        "hasAttachments": False,
+        "from": {"emailAddress": {"address": "buyer@acme.com"}},
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MessageStore(str(tmp_path / "mail.db"))
+    store.apply_changes(SESSION, FOLDER, [message(i) for i in range(40)], [])
+    store.apply_changes("other-session", FOLDER, [message(i) for i in range(5)], [])
+    return store
+
+
+def pages(store, limit, **filters):
+    ids, after, seen_pages = [], None, 0
+    while True:
+        emails, after = store.query_page(SESSION, FOLDER, limit=limit, after=after, include_body=False, **filters)
+        ids.extend(email["id"] for email in emails)
+        seen_pages += 1
+        assert len(emails) <= limit
+        if after is None:
+            return ids, seen_pages
+
+
+@pytest.mark.parametrize("order_by, field", [
+    ("receivedDateTime desc", "receivedDateTime"),
+    ("receivedDateTime asc", "receivedDateTime"),
+    ("sentDateTime desc", "sentDateTime"),
+    ("subject asc", "subject"),
+    ("importance desc", "importance"),
+])
+def test_keyset_pages_cover_every_row_once(store, order_by, field):
+    ids, page_count = pages(store, 7, order_by=order_by)
+    reverse = order_by.endswith("desc")
+    expected = sorted(
+        (message(i) for i in range(40)),
+        key=lambda m: (m[field] or "", m["id"]),
+        reverse=reverse
+    )
+    assert ids == [m["id"] for m in expected]
+    assert page_count == 6
+
+
+def test_keyset_pages_with_filters(store):
+    ids, _ = pages(store, 4, unread_only=True, importance="high")
+    expected = [m["id"] for m in map(message, reversed(range(40))) if not m["isRead"] and m["importance"] == "high"]
+    assert ids == expected
+
+
+def test_exact_last_page_has_no_cursor(store):
+    emails, after = store.query_page(SESSION, FOLDER, limit=40, include_body=False)
+    assert len(emails) == 40
+    assert after is None
+
+
+def test_first_page_with_skip(store):
+    emails, after = store.query_page(SESSION, FOLDER, limit=5, skip=10, include_body=False)
+    assert [e["id"] for e in emails] == [f"msg-{i:03d}" for i in range(29, 24, -1)]
+    rest, _ = store.query_page(SESSION, FOLDER, limit=5, after=after, include_body=False)
+    assert rest[0]["id"] == "msg-024"
+
+
+def test_keyset_query_uses_sort_index(store):
+    plan = store._db().execute(
+        "EXPLAIN QUERY PLAN SELECT m.id FROM messages m WHERE m.session_id = ? AND m.folder = ? "
+        "AND (m.received_at, m.id) < (?, ?) ORDER BY m.received_at DESC, m.id DESC LIMIT 10",
+        (SESSION, FOLDER, "2024-06-05T09:00:00Z", "msg-012")
+    ).fetchall()
+    detail = " ".join(row[-1] for row in plan)
+    assert "messages_received_at_id" in detail
+    assert "TEMP B-TREE" not in detail
+
+
+def test_unsupported_order_by(store):
+    with pytest.raises(ValueError):
+        store.query_page(SESSION, FOLDER, order_by="from desc")
+
+
+def test_store_cursor_round_trip():
+    state = {"query": {"folder": FOLDER, "order_by": "subject asc"}, "after": ["Subject 3", "msg-010"]}
+    assert decode_cursor(encode_cursor(state)) == state
+
+
+def test_graph_cursor_must_point_to_graph():
+    base = settings.GRAPH_API_BASE_URL.rstrip("/")
+    state = {"next": f"{base}/me/messages?$skip=25", "params": {"$top": 25}}
+    assert decode_cursor(encode_cursor(state)) == state
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor({"next": "https://evil.example/me/messages"}))
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor({"next": f"{base}/me/messages", "params": {"$top": [25]}}))
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", encode_cursor({"after": ["x", "y"]})])
+def test_malformed_cursors(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def store_cursor_state(**changes):
+    query = EmailService._store_query("inbox", None, None, None, False, None, None, "receivedDateTime desc", True)
+    return {"query": {**query, **changes.pop("query", {})}, "after": ["2024-06-01T09:00:00Z", "msg-001"], **changes}
+
+
+def test_email_list_cursor_written_by_get_emails_is_accepted():
+    EmailService._check_cursor(decode_cursor(encode_cursor(store_cursor_state())))
+    EmailService._check_cursor(decode_cursor(encode_cursor({**store_cursor_state(after=None), "offset": 25})))
+
+
+@pytest.mark.parametrize("state", [
+    {"query": {"folder": "inbox"}, "after": ["a", "b"]},
+    store_cursor_state(query={"extra": 1}),
+    store_cursor_state(query={"folder": None}),
+    store_cursor_state(query={"unread_only": "yes"}),
+    store_cursor_state(query={"order_by": "from desc"}),
+    store_cursor_state(query={"fields": ["id", "password"]}),
+    store_cursor_state(after=["only-one"]),
+    store_cursor_state(after=None, offset=-1),
+    store_cursor_state(after=None, offset="25"),
+    store_cursor_state(offset=25),
+])
+def test_forged_email_list_cursors_are_rejected(state):
+    with pytest.raises(InvalidCursor):
+        EmailService._check_cursor(decode_cursor(encode_cursor(state)))
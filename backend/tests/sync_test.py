@@ -0,0 +1,189 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.core.config import settings
+from src.services.email.service import EmailService
+from src.services.email.store import MessageStore
+from src.services.email.sync import MailSyncEngine
+
+SESSION = "session-1"
+FOLDER = "inbox"
+INITIAL_URL = f"/me/mailFolders/{FOLDER}/messages/delta"
+
+
+def message(i, **changes):
+    return {
+        "id": f"msg-{i:03d}",
+        "receivedDateTime": f"2099-01-{10 + i:02d}T09:00:00Z",
+        "subject": f"Subject {i}",
+        "bodyPreview": f"Preview {i}",
+        "hasAttachments": False,
+        "isRead": False,
+        **changes,
+    }
+
+
+class FakeGraph:
+    """Answers GETs from a url -> (status, json) map and $batch body requests from `bodies`."""
+
+    def __init__(self):
+        self.pages = {}
+        self.bodies = {}
+        self.gets = []
+        self.batches = []
+
+    def url(self, path):
+        return settings.GRAPH_API_BASE_URL.rstrip("/") + path
+
+    async def get(self, url, token, params=None, headers=None):
+        self.gets.append((url, params))
+        status, data = self.pages[url]
+        return httpx.Response(status, json=data)
+
+    async def batch(self, token, requests):
+        self.batches.append(requests)
+        responses = {}
+        for request in requests:
+            email_id = request["url"].split("/")[3].split("?")[0]
+            if email_id in self.bodies:
+                responses[request["id"]] = {"status": 200, "body": {"id": email_id, "body": self.bodies[email_id]}}
+            else:
+                responses[request["id"]] = {"status": 404, "body": {}}
+        return responses
+
+
+@pytest.fixture
+def graph():
+    return FakeGraph()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MessageStore(str(tmp_path / "mail.db"))
+
+
+@pytest.fixture
+def engine(graph, store):
+    engine = MailSyncEngine()
+    engine.graph = graph
+    engine.store = store
+    return engine
+
+
+@pytest.fixture
+def service(graph, store, engine, monkeypatch):
+    monkeypatch.setattr(settings, "MAIL_SYNC_ENABLED", True)
+    service = EmailService()
+    service.graph = graph
+    service.store = store
+    service.sync = engine
+
+    async def get_token(session_id):
+        return "token"
+
+    service.get_token = get_token
+    return service
+
+
+def stored_ids(store):
+    return [email["id"] for email in store.query(SESSION, FOLDER, limit=100, include_body=False)]
+
+
+def test_initial_sync_walks_every_page_and_records_the_window(engine, graph, store):
+    graph.pages[INITIAL_URL] = (200, {"value": [message(3), message(2)], "@odata.nextLink": "page-2"})
+    graph.pages["page-2"] = (200, {"value": [message(1)], "@odata.deltaLink": "delta-1"})
+
+    stats = asyncio.run(engine.sync(SESSION, "token", FOLDER))
+
+    assert stats == {"upserted": 3, "removed": 0}
+    assert stored_ids(store) == ["msg-003", "msg-002", "msg-001"]
+    assert store.get_sync_state(SESSION, FOLDER)[0] == "delta-1"
+    assert store.get_synced_from(SESSION, FOLDER)
+    select = graph.gets[0][1]["$select"].split(",")
+    assert "bodyPreview" in select and "body" not in select
+
+
+def test_delta_applies_updates_and_removals(engine, graph, store):
+    graph.pages[INITIAL_URL] = (200, {"value": [message(2), message(1)], "@odata.deltaLink": "delta-1"})
+    asyncio.run(engine.sync(SESSION, "token", FOLDER))
+    synced_from = store.get_synced_from(SESSION, FOLDER)
+
+    graph.pages["delta-1"] = (200, {
+        "value": [message(1, isRead=True), {"id": "msg-002", "@removed": {"reason": "deleted"}}, message(4)],
+        "@odata.deltaLink": "delta-2",
+    })
+    stats = asyncio.run(engine.sync(SESSION, "token", FOLDER, force=True))
+
+    assert stats == {"upserted": 2, "removed": 1}
+    emails = store.query(SESSION, FOLDER, limit=100, include_body=False)
+    assert [(e["id"], e["isRead"]) for e in emails] == [("msg-004", False), ("msg-001", True)]
+    # The window starts where the first sync put it
+    assert store.get_sync_state(SESSION, FOLDER)[0] == "delta-2"
+    assert store.get_synced_from(SESSION, FOLDER) == synced_from
+
+
+def test_syncs_inside_the_min_interval_are_skipped(engine, graph, monkeypatch):
+    monkeypatch.setattr(settings, "MAIL_SYNC_MIN_INTERVAL_SECONDS", 60)
+    graph.pages[INITIAL_URL] = (200, {"value": [message(1)], "@odata.deltaLink": "delta-1"})
+    asyncio.run(engine.sync(SESSION, "token", FOLDER))
+    assert asyncio.run(engine.sync(SESSION, "token", FOLDER)) == {"upserted": 0, "removed": 0}
+    assert len(graph.gets) == 1
+
+
+def test_expired_delta_link_resyncs_the_folder(engine, graph, store):
+    graph.pages[INITIAL_URL] = (200, {"value": [message(2), message(1)], "@odata.deltaLink": "delta-1"})
+    asyncio.run(engine.sync(SESSION, "token", FOLDER))
+
+    graph.pages["delta-1"] = (410, {"error": {"code": "syncStateNotFound"}})
+    graph.pages[INITIAL_URL] = (200, {"value": [message(3)], "@odata.deltaLink": "delta-2"})
+    asyncio.run(engine.sync(SESSION, "token", FOLDER, force=True))
+
+    # Messages the new walk did not return are gone with the old sync state
+    assert stored_ids(store) == ["msg-003"]
+    assert store.get_sync_state(SESSION, FOLDER)[0] == "delta-2"
+
+
+def test_store_pages_fetch_bodies_only_when_asked_for(service, graph):
+    graph.pages[INITIAL_URL] = (200, {"value": [message(2), message(1)], "@odata.deltaLink": "delta-1"})
+    graph.bodies = {"msg-002": {"contentType": "html", "content": "<p>Two</p>"}}
+
+    result = asyncio.run(service.get_emails(SESSION, limit=2, date_filter="last_7_days", include_body=False))
+    assert [e["id"] for e in result["emails"]] == ["msg-002", "msg-001"]
+    assert "body" not in result["emails"][0]
+    assert graph.batches == []
+
+    result = asyncio.run(service.get_emails(SESSION, limit=2, date_filter="last_7_days", include_body=True))
+    assert result["emails"][0]["body"] == {"contentType": "html", "content": "<p>Two</p>"}
+    # Deleted in Graph since the last sync: listed without a body
+    assert "body" not in result["emails"][1]
+    assert len(graph.batches) == 1
+
+    result = asyncio.run(service.get_emails(SESSION, limit=2, date_filter="last_7_days", fields=["subject"]))
+    assert len(graph.batches) == 1
+
+
+def test_newest_first_listing_continues_in_graph_past_the_window(service, graph):
+    graph.pages[INITIAL_URL] = (200, {"value": [message(2), message(1)], "@odata.deltaLink": "delta-1"})
+    asyncio.run(service.sync.sync(SESSION, "token", FOLDER))
+    query = service._store_query(FOLDER, None, None, None, False, None, None, "receivedDateTime desc", False)
+
+    emails, next_state = asyncio.run(service._windowed_store_page(SESSION, query, 2))
+    assert [e["id"] for e in emails] == ["msg-002", "msg-001"]
+    assert next_state["next"].endswith(INITIAL_URL[:-len("/delta")])
+    synced_from = service.store.get_synced_from(SESSION, FOLDER)
+    assert f"receivedDateTime lt {synced_from}" in next_state["params"]["$filter"]
+
+    # An offset page past the stored mail comes from Graph entirely
+    assert asyncio.run(service._windowed_store_page(SESSION, query, 2, skip=2)) is None
+
+
+def test_queries_the_window_cannot_answer_go_to_graph(service, graph):
+    graph.pages[INITIAL_URL] = (200, {"value": [message(1)], "@odata.deltaLink": "delta-1"})
+    asyncio.run(service.sync.sync(SESSION, "token", FOLDER))
+
+    oldest_first = service._store_query(FOLDER, None, None, None, False, None, None, "receivedDateTime asc", False)
+    searched = service._store_query(FOLDER, "Subject", None, None, False, None, None, "receivedDateTime desc", False)
+    assert asyncio.run(service._windowed_store_page(SESSION, oldest_first, 10)) is None
+    assert asyncio.run(service._windowed_store_page(SESSION, searched, 10)) is None
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+from src.core.config import settings
+from src.services.analysis.service import AnalysisService
+from src.services.analysis.threads import ThreadStateStore, new_lines
+
+CONVERSATION = "conv-1"
+
+
+class FakeLLM:
+    """Stands in for LLMService; each step can be told to fail with its fail-safe result."""
+
+    def __init__(self):
+        self.fail = set()
+        self.calls = []
+
+    async def analyze_email_intent(self, subject, body):
+        self.calls.append(("intent", body))
+        if "intent" in self.fail:
+            return {"is_customer_request": False, "confidence": 0.0, "reasoning": "Error during analysis: timeout"}
+        return {"is_customer_request": True, "confidence": 0.9, "reasoning": "Asks for a quote"}
+
+    async def extract_product_data(self, subject, body, attachments=[]):
+        self.calls.append(("extraction", body))
+        if "extraction" in self.fail:
+            return {"products": [], "error": "timeout"}
+        return {"opportunity_name": "Quote", "products": [{"partNumber": "CESS-100200", "quantity": 5}]}
+
+    async def update_product_data(self, subject, opportunity_name, products, body, attachments=[]):
+        self.calls.append(("update", body))
+        if "update" in self.fail:
+            return {"opportunity_name": opportunity_name, "products": products, "error": "timeout"}
+        return {"opportunity_name": opportunity_name, "products": products + [{"partNumber": "CESS-100300", "quantity": 2}]}
+
+
+class FakeCRM:
+    def deduce_account_info(self, sender):
+        return "Acme", "buyer@acme.com"
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "THREAD_ANALYSIS_ENABLED", True)
+    service = AnalysisService()
+    service.llm_service = FakeLLM()
+    service.crm_service = FakeCRM()
+    service.thread_store = ThreadStateStore(str(tmp_path / "threads.db"))
+    return service
+
+
+def email(message_id, body, received="2024-06-01T09:00:00Z"):
+    return {
+        "id": message_id,
+        "conversationId": CONVERSATION,
+        "subject": "RFQ",
+        "receivedDateTime": received,
+        "body": {"contentType": "text", "content": body},
+        "from": {"emailAddress": {"address": "buyer@acme.com"}},
+    }
+
+
+FIRST = email("m1", "Please quote qty 5 CESS-100200.")
+REPLY = email("m2", "Please also add 2 pcs CESS-100300.", "2024-06-02T09:00:00Z")
+
+
+def analyze(service, message):
+    return asyncio.run(service.analyze_email(message))
+
+
+def test_first_message_then_delta(service):
+    first = analyze(service, FIRST)
+    assert (first["analysis_mode"], first["thread_messages"]) == ("full", 1)
+    reply = analyze(service, REPLY)
+    assert (reply["analysis_mode"], reply["thread_messages"]) == ("delta", 2)
+    assert [p["partNumber"] for p in reply["products"]] == ["CESS-100200", "CESS-100300"]
+    assert analyze(service, REPLY)["analysis_mode"] == "already_folded"
+
+
+def test_failed_first_message_is_not_saved(service):
+    service.llm_service.fail = {"intent"}
+    result = analyze(service, FIRST)
+    assert result["reasoning"].startswith("Error during analysis")
+    assert result["thread_messages"] == 0
+    assert service.thread_store.get("", CONVERSATION) is None
+
+    service.llm_service.fail = set()
+    retried = analyze(service, FIRST)
+    assert (retried["analysis_mode"], retried["thread_messages"]) == ("full", 1)
+    assert retried["is_customer_request"] is True
+
+
+def test_failed_extraction_is_not_kept(service):
+    service.llm_service.fail = {"extraction"}
+    result = analyze(service, FIRST)
+    assert result["error"] == "timeout"
+    assert result["products"] == []
+    assert service.thread_store.get("", CONVERSATION) is None
+
+
+def test_failed_update_keeps_products_and_resends_lines(service):
+    analyze(service, FIRST)
+    service.llm_service.fail = {"update"}
+    failed = analyze(service, REPLY)
+    assert failed["reasoning"] == "Error during analysis: timeout"
+    assert failed["analysis_mode"] == "delta"
+    assert failed["thread_messages"] == 1
+    assert [p["partNumber"] for p in failed["products"]] == ["CESS-100200"]
+    state = service.thread_store.get("", CONVERSATION)
+    assert state["message_ids"] == ["m1"]
+
+    service.llm_service.fail = set()
+    retried = analyze(service, REPLY)
+    assert (retried["analysis_mode"], retried["thread_messages"]) == ("delta", 2)
+    updates = [body for step, body in service.llm_service.calls if step == "update"]
+    assert updates == ["Please also add 2 pcs CESS-100300.", "Please also add 2 pcs CESS-100300."]
+
+
+def test_reply_repeating_earlier_lines_is_unchanged(service):
+    analyze(service, FIRST)
+    repeat = analyze(service, email("m3", "Please quote qty 5 CESS-100200.", "2024-06-03T09:00:00Z"))
+    assert (repeat["analysis_mode"], repeat["thread_messages"]) == ("unchanged", 2)
+
+
+def test_new_lines_keeps_repeated_short_lines_in_new_context():
+    _, seen = new_lines("Item: CESS-100200\nQty: 10", ())
+    delta, _ = new_lines("Item: CESS-100200\nQty: 10\n\nItem: CESS-100300\nQty: 10", seen)
+    assert delta == "Item: CESS-100300\nQty: 10"
+
+
+class FakeEmailService:
+    """Lists messages with HTML bodies, like Graph does; by id it returns the text ones asked for."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.listed_with_body = None
+
+    async def get_emails(self, session_id, include_body=True, **filters):
+        self.listed_with_body = include_body
+        emails = [dict(m, body={"contentType": "html", "content": "<p>html</p>"}) for m in self.messages]
+        return {"emails": emails if include_body else [{"id": m["id"]} for m in self.messages]}
+
+    async def get_emails_by_ids(self, session_id, email_ids, text_body=False):
+        assert text_body
+        return {m["id"]: m for m in self.messages if m["id"] in email_ids}
+
+
+async def collect(results):
+    return [item async for item in results]
+
+
+def test_batch_by_filter_analyzes_text_bodies(service):
+    service.email_service = FakeEmailService([FIRST, REPLY])
+    results = asyncio.run(collect(service.analyze_batch("session-1", filters={"folder": "inbox"})))
+    assert sorted(r["email_id"] for r in results) == ["m1", "m2"]
+    assert service.email_service.listed_with_body is False
+    assert all("<p>" not in body for _, body in service.llm_service.calls)
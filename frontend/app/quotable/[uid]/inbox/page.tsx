@@ -70,7 +70,9 @@ export default function InboxPage({ params }: InboxPageProps) {
     try {
       const params: Record<string, string> = {
         limit: ITEMS_PER_PAGE.toString(),
-        skip: skip.toString()
+        skip: skip.toString(),
+        // List rows only; the detail pane loads the body when an email is opened
+        fields: "default"
       }
       
       if (activeSearch) {
@@ -344,6 +346,8 @@ export default function InboxPage({ params }: InboxPageProps) {
                   isLoading={isAnalyzing} 
                   error={analysisError}
                   onClose={() => setShowOpportunity(false)}
+                  sourceMessageId={selectedEmail.id}
+                  conversationId={selectedEmail.conversationId}
                 />
               </div>
             )}
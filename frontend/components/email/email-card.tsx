@@ -3,6 +3,7 @@ import { cn } from "@/lib/utils"
 
 export interface Email {
   id: string
+  conversationId?: string | null
   subject: string | null
   bodyPreview?: string | null
   body_preview?: string | null
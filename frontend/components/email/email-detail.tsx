@@ -28,6 +28,8 @@ export function EmailDetail({ email, onClose, onAnalyze, isAnalyzing = false }:
   const [attachments, setAttachments] = useState<Attachment[]>([])
   const [isLoadingAttachments, setIsLoadingAttachments] = useState(false)
   const [error, setError] = useState<string | null>(null)
+  const [body, setBody] = useState<Email["body"]>(email.body)
+  const [isLoadingBody, setIsLoadingBody] = useState(false)
 
   // Determine if we need to fetch attachments
   const shouldFetchAttachments = (email.hasAttachments || email.has_attachments) && attachments.length === 0
@@ -61,6 +63,36 @@ export function EmailDetail({ email, onClose, onAnalyze, isAnalyzing = false }:
     fetchAttachments()
   }, [email.id, email.hasAttachments, email.has_attachments])
 
+  useEffect(() => {
+    // List responses carry no body; fetch the full message once it is opened
+    setBody(email.body)
+    if (!email.id || email.body) return
+
+    let cancelled = false
+    const fetchBody = async () => {
+      setIsLoadingBody(true)
+      const sessionId = localStorage.getItem("session_id")
+
+      try {
+        const response = await axios.get<Email>(`/api/email/${email.id}`, {
+          headers: {
+            "X-Session-Id": sessionId
+          }
+        })
+        if (!cancelled) setBody(response.data.body)
+      } catch (err) {
+        console.error("Error fetching email body:", err)
+      } finally {
+        if (!cancelled) setIsLoadingBody(false)
+      }
+    }
+
+    fetchBody()
+    return () => {
+      cancelled = true
+    }
+  }, [email.id, email.body])
+
   const fromField = email.from || email.from_
   const senderName = fromField?.emailAddress?.name
   const senderAddress = fromField?.emailAddress?.address
@@ -89,8 +121,8 @@ export function EmailDetail({ email, onClose, onAnalyze, isAnalyzing = false }:
   }
 
   // Handle body content - prefer HTML content if available
-  const bodyContent = email.body?.content || email.bodyPreview || email.body_preview || "No content"
-  const isHtml = email.body?.contentType === 'html'
+  const bodyContent = body?.content || email.bodyPreview || email.body_preview || "No content"
+  const isHtml = body?.contentType === 'html'
 
   return (
     <div className="h-full flex flex-col bg-white dark:bg-slate-900 overflow-hidden min-h-0">
@@ -196,6 +228,12 @@ export function EmailDetail({ email, onClose, onAnalyze, isAnalyzing = false }:
       {/* Email Body - Scrollable */}
       <div className="flex-1 overflow-y-auto min-h-0">
         <div className="p-6">
+          {isLoadingBody && (
+            <div className="flex items-center gap-2 text-xs text-muted-foreground mb-3">
+              <Loader2 className="h-3 w-3 animate-spin" />
+              Loading message...
+            </div>
+          )}
           <div className={cn("prose prose-slate dark:prose-invert max-w-none break-words")}>
              {isHtml ? (
                 <div dangerouslySetInnerHTML={{ __html: bodyContent }} />
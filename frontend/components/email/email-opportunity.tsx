@@ -32,9 +32,12 @@ interface EmailOpportunityProps {
   isLoading: boolean
   error: string | null
   onClose?: () => void
+  // Source email; creating again for the same email returns its existing opportunity
+  sourceMessageId?: string
+  conversationId?: string | null
 }
 
-export function EmailOpportunity({ result, isLoading, error, onClose }: EmailOpportunityProps) {
+export function EmailOpportunity({ result, isLoading, error, onClose, sourceMessageId, conversationId }: EmailOpportunityProps) {
   const router = useRouter()
   const params = useParams()
   const [isCreating, setIsCreating] = useState(false)
@@ -48,7 +51,9 @@ export function EmailOpportunity({ result, isLoading, error, onClose }: EmailOpp
         opportunityName: result.opportunityName,
         accountName: result.accountName,
         keyContact: result.keyContact,
-        products: result.products
+        products: result.products,
+        sourceMessageId,
+        conversationId
       }
       
       const response = await axios.post("/api/crm/opportunity", payload)